@@ -1,33 +1,10 @@
 import os
 import sys
+import multiprocessing
 
-# Set up base paths
-if getattr(sys, 'frozen', False):
-    # If running as compiled executable
-    base_path = os.path.dirname(sys.executable)
-else:
-    # If running as script
-    base_path = os.path.dirname(os.path.abspath(__file__))
+# Set up app directories and TORCH_HOME before demucs is imported
+import paths
 
-# Create _internal directory for app data
-internal_dir = os.path.join(base_path, '_internal')
-os.makedirs(internal_dir, exist_ok=True)
-
-# Create cache directory in _internal folder
-cache_dir = os.path.join(internal_dir, 'cache')
-os.makedirs(cache_dir, exist_ok=True)
-
-# Create temp directory in _internal folder
-temp_dir = os.path.join(internal_dir, 'temp')
-os.makedirs(temp_dir, exist_ok=True)
-
-# Set torch hub directory
-os.environ['TORCH_HOME'] = cache_dir
-
-# Ensure the output directory exists (keep this separate from internal files)
-os.makedirs('output', exist_ok=True)
-
-from pydub import AudioSegment
 from PyQt6.QtWidgets import (
     QApplication,
     QMainWindow,
@@ -42,16 +19,33 @@ from PyQt6.QtWidgets import (
     QFileDialog,
     QStyle,
     QSizePolicy,
+    QDialog,
+    QDialogButtonBox,
+    QFormLayout,
+    QSpinBox,
+    QDoubleSpinBox,
+    QCheckBox,
+    QComboBox,
+    QGridLayout,
 )
-from PyQt6.QtCore import Qt, QThread, pyqtSignal, QTimer, QTime, QUrl
-from PyQt6.QtGui import QIcon, QKeySequence, QShortcut, QPixmap, QImage
+from PyQt6.QtCore import Qt, QObject, QThread, pyqtSignal, QTimer, QTime, QUrl, QLineF
+from PyQt6.QtGui import QIcon, QKeySequence, QShortcut, QPixmap, QImage, QPainter, QColor, QPen
 from PyQt6.QtMultimedia import QMediaPlayer, QAudioOutput
 import resources
-import datetime
-from demucs.pretrained import get_model
-from demucs.apply import apply_model
-from demucs.audio import AudioFile
-import torchaudio
+from model_registry import DEFAULT_MODEL
+from encoder import OUTPUT_FORMATS
+from engine import load_song
+from job_queue import Job, JobQueue
+from worker_pool import SeparationPool
+from preseparation import PreSeparator
+from preview import render_preview
+from separators import BACKENDS
+from settings import PerformanceSettings, cpu_count
+from stem_export import STEM_MODES
+from utils import format_time_precise, frames_to_seconds, seconds_to_frames
+from waveform import WaveformOverview
+from vocal_detection import detect_sections
+from section_index import SectionIndex
 
 def apply_dark_mode(app):
     dark_stylesheet = """
@@ -144,20 +138,6 @@ def apply_dark_mode(app):
     )
     app.setStyleSheet(dark_stylesheet)
 
-def format_time(seconds):
-    """Helper function to format time in MM:SS format"""
-    minutes = int(seconds) // 60
-    secs = int(seconds) % 60
-    return f"{minutes:02}:{secs:02}"
-
-def format_time_precise(seconds):
-    """Helper function to format time with decimal precision"""
-    minutes = int(seconds) // 60
-    secs = seconds % 60
-    
-    # Always format with 2 decimal places, but only use 2 digits for seconds
-    return f"{minutes:02}:{secs:05.2f}"
-
 class FileLoader(QThread):
     finished = pyqtSignal(tuple)
     status_update = pyqtSignal(str)
@@ -169,165 +149,344 @@ class FileLoader(QThread):
     def run(self):
         try:
             self.status_update.emit("Loading audio file...")
-            song = AudioSegment.from_file(self.file_path)
+            song = load_song(self.file_path)
             self.finished.emit((song, self.file_path))
         except Exception as e:
             self.status_update.emit(f"Error loading file: {str(e)}")
             self.finished.emit((None, None))
 
-class AudioProcessor(QThread):
-    status_update = pyqtSignal(str)
+class WaveformView(QWidget):
+    """Waveform overview and vocal activity lane drawn behind the timeline slider
+
+    The picture is rendered into a pixmap once per size and data update,
+    so repaints while playing or dragging only copy it. It polls the
+    overview while it is still being built.
+    """
+    HEIGHT = 56
+    ACTIVITY_HEIGHT = 6
 
-    def __init__(self, song, sections, song_path):
+    def __init__(self):
         super().__init__()
-        self.song = song
-        self.sections = sections
-        self.song_path = song_path
+        self.setMinimumHeight(self.HEIGHT)
+        self.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Expanding)
+        self.overview = None
+        self.show_activity = True
+        self.pixmap = None
+        self.pixmap_key = None
+        self.poll_timer = QTimer(self)
+        self.poll_timer.timeout.connect(self.poll)
+
+    def set_overview(self, overview):
+        self.overview = overview
+        self.pixmap_key = None
+        if overview is not None:
+            self.poll_timer.start(250)
+        self.update()
+
+    def set_show_activity(self, show):
+        self.show_activity = show
+        self.update()
+
+    def poll(self):
+        if self.overview is None:
+            self.poll_timer.stop()
+            return
+        if self.overview.complete:
+            self.poll_timer.stop()
+        self.update()
+
+    def paintEvent(self, event):
+        key = (
+            self.width(), self.height(), id(self.overview),
+            self.overview.version if self.overview else None, self.show_activity,
+        )
+        if key != self.pixmap_key:
+            self.pixmap = self.render_pixmap()
+            self.pixmap_key = key
+        painter = QPainter(self)
+        painter.drawPixmap(0, 0, self.pixmap)
+        painter.end()
+
+    def render_pixmap(self):
+        width, height = self.width(), self.height()
+        pixmap = QPixmap(max(1, width), max(1, height))
+        pixmap.fill(QColor("#2E2E2E"))
+        painter = QPainter(pixmap)
+
+        lane = self.ACTIVITY_HEIGHT if self.show_activity else 0
+        middle = (height - lane) / 2
+        painter.setPen(QPen(QColor("#3E3E3E")))
+        painter.drawLine(QLineF(0, middle, width, middle))
+
+        overview = self.overview
+        total_frames = overview.total_frames if overview else 0
+        if total_frames > 0 and width > 0:
+            mins, maxs, valid = overview.peaks(0, total_frames, width)
+            scale = middle - 1
+            painter.setPen(QPen(QColor("#8A8A8A")))
+            painter.drawLines([
+                QLineF(x + 0.5, middle - maxs[x] * scale, x + 0.5, middle - mins[x] * scale)
+                for x in range(valid)
+            ])
+
+            if lane:
+                activity = overview.activity(0, total_frames, width)
+                for x in range(valid):
+                    if activity[x] > 0.05:
+                        painter.fillRect(
+                            x, height - lane, 1, lane, QColor(255, 140, 0, int(255 * min(1.0, activity[x])))
+                        )
+        painter.end()
+        return pixmap
+
+class PreviewLoader(QThread):
+    finished = pyqtSignal(object)
+
+    def __init__(self, song, song_path, start_frame, end_frame, model_name, settings,
+                 preseparator, pool):
+        super().__init__()
+        self.args = (song, song_path, start_frame, end_frame, model_name, settings, preseparator, pool)
 
     def run(self):
-        # Redirect stdout and stderr to devnull to suppress console
-        with open(os.devnull, 'w') as devnull:
-            old_stdout = sys.stdout
-            old_stderr = sys.stderr
-            sys.stdout = devnull
-            sys.stderr = devnull
+        try:
+            self.finished.emit(render_preview(*self.args))
+        except Exception as e:
+            self.finished.emit(e)
+
+class PreviewPlayer(QObject):
+    """Plays a section and its instrumental together with one of them muted
+
+    Switching between vocals and no vocals only flips which output is
+    muted, so it is instant and both versions stay in sync.
+    """
+    finished = pyqtSignal()
 
+    def __init__(self, volume=0.5):
+        super().__init__()
+        self.vocals = False
+        self.paths = []
+        self.waiting = False
+        self.outputs = [QAudioOutput(), QAudioOutput()]
+        self.players = [QMediaPlayer(), QMediaPlayer()]
+        for player, output in zip(self.players, self.outputs):
+            player.setAudioOutput(output)
+            output.setVolume(volume)
+            player.mediaStatusChanged.connect(self.on_media_status)
+        self.apply_mute()
+
+    def load(self, original_path, instrumental_path):
+        """Start playing a new preview as soon as both files are loaded"""
+        self.release()
+        self.paths = [original_path, instrumental_path]
+        self.waiting = True
+        for player, path in zip(self.players, self.paths):
+            player.setSource(QUrl.fromLocalFile(path))
+
+    def on_media_status(self, status):
+        if status == QMediaPlayer.MediaStatus.EndOfMedia and self.is_playing:
+            self.stop()
+            self.finished.emit()
+            return
+        loaded = QMediaPlayer.MediaStatus.LoadedMedia
+        if self.waiting and all(player.mediaStatus() == loaded for player in self.players):
+            self.waiting = False
+            for player in self.players:
+                player.play()
+
+    @property
+    def is_playing(self):
+        return any(
+            player.playbackState() == QMediaPlayer.PlaybackState.PlayingState
+            for player in self.players
+        )
+
+    def toggle_vocals(self):
+        self.vocals = not self.vocals
+        self.apply_mute()
+        return self.vocals
+
+    def apply_mute(self):
+        self.outputs[0].setMuted(not self.vocals)
+        self.outputs[1].setMuted(self.vocals)
+
+    def set_volume(self, volume):
+        for output in self.outputs:
+            output.setVolume(volume)
+
+    def stop(self):
+        self.waiting = False
+        for player in self.players:
+            player.stop()
+
+    def release(self):
+        """Stop and delete the current preview files"""
+        self.stop()
+        for player in self.players:
+            player.setSource(QUrl())
+        for path in self.paths:
             try:
-                # Get original filename without extension
-                base_filename = os.path.splitext(os.path.basename(self.song_path))[0]
-                # Create timestamp
-                timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-                # Combine filename and timestamp for output directory
-                output_dir = os.path.join("output", f"{base_filename}_{timestamp}")
-                os.makedirs(output_dir, exist_ok=True)
-
-                # Create info text file
-                info_path = os.path.join(output_dir, "section_info.txt")
-                with open(info_path, "w") as f:
-                    f.write("Vocal Removal Sections:\n\n")
-                    for idx, (start_time, end_time) in enumerate(self.sections, 1):
-                        f.write(f"Section {idx}: {format_time(start_time)} to {format_time(end_time)}\n")
-                    f.write(f"\nOriginal file: {os.path.basename(self.song_path)}\n")
-                    f.write(f"Processed on: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-
-                # Load the model from the correct location in packaged app
-                self.status_update.emit("Loading Demucs model...")
-                if getattr(sys, 'frozen', False):
-                    # If running as compiled executable
-                    base_path = os.path.dirname(sys.executable)
-                    model_path = os.path.join(base_path, '_internal')  # Point to PyInstaller's _internal
-                    os.environ['TORCH_HOME'] = model_path
-                    os.environ['DEMUCS_OFFLINE'] = '1'  # Prevent model download attempts
-                    
-                    # Verify model exists in PyInstaller's _internal directory
-                    expected_model_path = os.path.join(model_path, 'hub', 'checkpoints', '955717e8-8726e21a.th')
-                    if not os.path.exists(expected_model_path):
-                        self.status_update.emit(f"Error: Model file not found at expected path: {expected_model_path}")
-                        return
-                
-                model = get_model('htdemucs')
-                model.eval()
-                
-                # Sort sections by start time to ensure they are processed in order
-                self.sections.sort(key=lambda x: x[0])
-
-                combined = AudioSegment.empty()  # Start with an empty audio segment
-                last_end_time = 0  # Keep track of the last section's end time
-
-                for idx, (start_time, end_time) in enumerate(self.sections, start=1):
-                    start_formatted = format_time_precise(start_time)
-                    end_formatted = format_time_precise(end_time)
-                    self.status_update.emit(f"Section {idx} processing from {start_formatted} to {end_formatted}...")
-                    section = self.song[start_time * 1000:end_time * 1000]
-                    
-                    temp_section_path = os.path.join(temp_dir, "temp_section.wav")
-                    temp_novocals_path = os.path.join(temp_dir, "temp_section_no_vocals.wav")
-                    
-                    # Add FFmpeg parameters to increase analyzeduration and probesize
-                    section.export(
-                        temp_section_path,
-                        format="wav",
-                        parameters=[
-                            "-analyzeduration", "0",  # Disable analysis since we know it's audio
-                            "-probesize", "32",       # Minimal probe size
-                            "-loglevel", "error"      # Only show errors, not warnings
-                        ]
-                    )
-
-                    # Use AudioFile to load the audio
-                    audio_file = AudioFile(temp_section_path)
-                    wav = audio_file.read(streams=0, samplerate=model.samplerate, channels=model.audio_channels)
-                    ref = wav.mean(0)
-                    wav = (wav - ref.mean()) / ref.std()
-                    
-                    sources = apply_model(model, wav[None], device='cpu', progress=False, num_workers=1)[0]
-                    sources = sources * ref.std() + ref.mean()
-                    
-                    # Mix all stems except vocals to create instrumental
-                    # sources order is: [drums, bass, other, vocals]
-                    drums = sources[0]
-                    bass = sources[1]
-                    other = sources[2]
-                    # Combine all stems except vocals
-                    instrumental = drums + bass + other
-                    
-                    # Save audio using torchaudio
-                    torchaudio.save(
-                        temp_novocals_path,
-                        instrumental.cpu(),
-                        sample_rate=int(model.samplerate)
-                    )
-
-                    # Load the processed instrumental track
-                    instrumental = AudioSegment.from_file(temp_novocals_path)
-
-                    self.status_update.emit(f"Adding song parts for section {idx}...")
-                    # Add the part before the section if necessary
-                    if start_time > last_end_time:
-                        part_before_section = self.song[last_end_time * 1000:start_time * 1000]
-                        combined += part_before_section
-
-                    # First add the section with vocals (original)
-                    section_with_vocals = section
-                    combined += section_with_vocals
-
-                    # Then add the same section without vocals (instrumental)
-                    combined += instrumental
-
-                    last_end_time = end_time  # Update the last end time
-
-                # Add the remaining part of the song after the last section
-                if last_end_time < len(self.song) / 1000:
-                    remaining_part = self.song[last_end_time * 1000:]
-                    combined += remaining_part
-
-                self.status_update.emit("Exporting final result...")
-                # Export the final result
-                output_path = os.path.join(output_dir, "output.mp3")
-                combined.export(output_path, format="mp3")
-
-                self.status_update.emit("Cleaning up temporary files...")
-                # Clean up temporary files
-                try:
-                    if os.path.exists(temp_section_path):
-                        os.remove(temp_section_path)
-                    if os.path.exists(temp_novocals_path):
-                        os.remove(temp_novocals_path)
-                except:
-                    pass
-
-                self.status_update.emit(f"Processing complete! Output saved in: {output_dir}")
-
-            finally:
-                # Restore stdout and stderr
-                sys.stdout = old_stdout
-                sys.stderr = old_stderr
+                os.remove(path)
+            except OSError:
+                pass
+        self.paths = []
+
+class JobBridge(QObject):
+    """Forwards job queue updates from worker threads to the GUI thread"""
+    job_updated = pyqtSignal(object)
+
+class PerformanceDialog(QDialog):
+    """Dialog for the separation performance settings (0 means auto-detect)"""
+
+    def __init__(self, settings, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Performance Settings")
+        self.settings = settings
+
+        layout = QFormLayout(self)
+        cores = cpu_count()
+
+        self.threads_spin = self._auto_spin(cores * 2, settings.threads)
+        layout.addRow(f"Torch threads ({cores} cores):", self.threads_spin)
+
+        self.interop_spin = self._auto_spin(cores * 2, settings.interop_threads)
+        layout.addRow("Inter-op threads:", self.interop_spin)
+
+        self.workers_spin = self._auto_spin(cores, settings.workers)
+        layout.addRow("Segment workers:", self.workers_spin)
+
+        self.segment_spin = QDoubleSpinBox()
+        self.segment_spin.setRange(0.0, 60.0)
+        self.segment_spin.setSingleStep(0.5)
+        self.segment_spin.setSpecialValueText("Auto")
+        self.segment_spin.setValue(settings.segment or 0.0)
+        layout.addRow("Chunk size (seconds):", self.segment_spin)
+
+        self.overlap_spin = QDoubleSpinBox()
+        self.overlap_spin.setRange(0.0, 0.9)
+        self.overlap_spin.setSingleStep(0.05)
+        self.overlap_spin.setValue(settings.overlap)
+        layout.addRow("Chunk overlap:", self.overlap_spin)
+
+        self.shifts_spin = QSpinBox()
+        self.shifts_spin.setRange(0, 10)
+        self.shifts_spin.setValue(settings.shifts)
+        layout.addRow("Shifts:", self.shifts_spin)
+
+        self.context_spin = QDoubleSpinBox()
+        self.context_spin.setRange(0.0, 10.0)
+        self.context_spin.setSingleStep(0.5)
+        self.context_spin.setSuffix(" s")
+        self.context_spin.setValue(settings.context_seconds)
+        layout.addRow("Context around sections:", self.context_spin)
+
+        self.crossfade_spin = QDoubleSpinBox()
+        self.crossfade_spin.setRange(0.0, 500.0)
+        self.crossfade_spin.setSingleStep(5.0)
+        self.crossfade_spin.setSuffix(" ms")
+        self.crossfade_spin.setSpecialValueText("Off")
+        self.crossfade_spin.setValue(settings.crossfade_ms)
+        layout.addRow("Splice crossfade:", self.crossfade_spin)
+
+        self.format_combo = QComboBox()
+        self.format_combo.addItems(sorted(OUTPUT_FORMATS))
+        self.format_combo.setCurrentText(settings.output_format)
+        layout.addRow("Output format:", self.format_combo)
+
+        self.bitrate_spin = QSpinBox()
+        self.bitrate_spin.setRange(0, 512)
+        self.bitrate_spin.setSingleStep(32)
+        self.bitrate_spin.setSuffix(" kbps")
+        self.bitrate_spin.setSpecialValueText("Default")  # Shown for 0
+        self.bitrate_spin.setValue(settings.output_bitrate_kbps or 0)
+        layout.addRow("Bitrate (mp3/opus):", self.bitrate_spin)
+
+        self.stems_combo = QComboBox()
+        for mode, label in zip(STEM_MODES, ("Off", "Processed sections", "Whole song")):
+            self.stems_combo.addItem(label, mode)
+        self.stems_combo.setCurrentIndex(max(0, self.stems_combo.findData(settings.stem_export)))
+        layout.addRow("Export stems:", self.stems_combo)
+
+        self.batch_spin = QSpinBox()
+        self.batch_spin.setRange(1, 64)
+        self.batch_spin.setValue(settings.batch_size)
+        layout.addRow("Sections per batch:", self.batch_spin)
+
+        self.resident_spin = QSpinBox()
+        self.resident_spin.setRange(1, 8)
+        self.resident_spin.setValue(settings.max_resident_models)
+        layout.addRow("Resident models:", self.resident_spin)
+
+        self.cache_spin = QSpinBox()
+        self.cache_spin.setRange(0, 1024 * 1024)
+        self.cache_spin.setSingleStep(256)
+        self.cache_spin.setSuffix(" MB")
+        self.cache_spin.setSpecialValueText("Off")
+        self.cache_spin.setValue(settings.stem_cache_mb)
+        layout.addRow("Stem cache size:", self.cache_spin)
+
+        self.jobs_spin = QSpinBox()
+        self.jobs_spin.setRange(1, max(1, cores))
+        self.jobs_spin.setValue(settings.max_concurrent_jobs)
+        layout.addRow("Concurrent jobs:", self.jobs_spin)
+
+        self.processes_spin = QSpinBox()
+        self.processes_spin.setRange(1, max(1, cores))
+        self.processes_spin.setValue(settings.separation_processes)
+        layout.addRow("Separation processes:", self.processes_spin)
+
+        self.preseparate_check = QCheckBox("Separate whole song in background")
+        self.preseparate_check.setChecked(bool(settings.preseparate))
+        layout.addRow("Pre-separation:", self.preseparate_check)
+
+        self.trace_check = QCheckBox("Write trace.json with each performance report")
+        self.trace_check.setChecked(bool(settings.write_trace))
+        layout.addRow("Tracing:", self.trace_check)
+
+        self.activity_check = QCheckBox("Show vocal activity under the waveform")
+        self.activity_check.setChecked(bool(settings.vocal_activity_lane))
+        layout.addRow("Timeline:", self.activity_check)
+
+        buttons = QDialogButtonBox(
+            QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel
+        )
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addRow(buttons)
+
+    def _auto_spin(self, maximum, value):
+        spin = QSpinBox()
+        spin.setRange(0, maximum)
+        spin.setSpecialValueText("Auto")  # Shown for 0
+        spin.setValue(value or 0)
+        return spin
+
+    def accept(self):
+        self.settings.threads = self.threads_spin.value() or None
+        self.settings.interop_threads = self.interop_spin.value() or None
+        self.settings.workers = self.workers_spin.value() or None
+        self.settings.segment = self.segment_spin.value() or None
+        self.settings.overlap = self.overlap_spin.value()
+        self.settings.shifts = self.shifts_spin.value()
+        self.settings.context_seconds = self.context_spin.value()
+        self.settings.crossfade_ms = self.crossfade_spin.value()
+        self.settings.output_format = self.format_combo.currentText()
+        self.settings.output_bitrate_kbps = self.bitrate_spin.value() or None
+        self.settings.stem_export = self.stems_combo.currentData()
+        self.settings.batch_size = self.batch_spin.value()
+        self.settings.max_resident_models = self.resident_spin.value()
+        self.settings.stem_cache_mb = self.cache_spin.value()
+        self.settings.preseparate = self.preseparate_check.isChecked()
+        self.settings.write_trace = self.trace_check.isChecked()
+        self.settings.vocal_activity_lane = self.activity_check.isChecked()
+        self.settings.max_concurrent_jobs = self.jobs_spin.value()
+        self.settings.separation_processes = self.processes_spin.value()
+        super().accept()
 
 class AudioApp(QMainWindow):
     # Add constants at class level
     MIN_TOP_ROW_HEIGHT = 100      # Load song and volume controls
-    MIN_TIMELINE_HEIGHT = 180     # Timeline section
-    MIN_SECTION_HEIGHT = 250      # Section controls
+    MIN_TIMELINE_HEIGHT = 220     # Timeline section with the waveform
+    MIN_SECTION_HEIGHT = 330      # Section controls and job list
     MIN_STATUS_HEIGHT = 20        # Status bar height
     LAYOUT_SPACING = 10           # Spacing between components
     LAYOUT_MARGINS = 20           # Total vertical margins (top + bottom)
@@ -355,11 +514,32 @@ class AudioApp(QMainWindow):
         self.initUI()
         self.song = None
         self.song_path = None
-        self.sections = []
+        self.sections = SectionIndex()
         self.is_playing = False
         self.current_time = 0
         self.song_length = 0
-        self.audio_processor = None
+        self.performance_settings = PerformanceSettings.load()
+        self.preseparator = None
+        self.waveform = None
+        self.waveform_view.set_show_activity(bool(self.performance_settings.vocal_activity_lane))
+        self.songs_to_release = []
+        
+        # A/B preview of the selected section (original vs. instrumental)
+        self.preview_loader = None
+        self.preview_player = PreviewPlayer(self.audio_output.volume())
+        self.preview_player.finished.connect(lambda: self.status_label.setText("Preview finished"))
+        
+        # Separation runs in worker processes so the UI never waits on the GIL
+        self.separation_pool = SeparationPool(self.performance_settings.separation_processes)
+        
+        # Jobs run in the background; updates arrive through the bridge's signal
+        self.job_items = {}
+        self.job_bridge = JobBridge()
+        self.job_bridge.job_updated.connect(self.on_job_updated)
+        self.job_queue = JobQueue(
+            self.performance_settings.max_concurrent_jobs, self.job_bridge.job_updated.emit,
+            pool=self.separation_pool,
+        )
         self.selecting_start = False
         self.selecting_end = False
         self.current_section_start = None
@@ -407,11 +587,20 @@ class AudioApp(QMainWindow):
         self.seek_timer.timeout.connect(self.perform_seek)
         self.pending_seek_position = None
 
+        # Selecting a section previews it once the selection has settled (e.g. arrowing through the list)
+        self.preview_timer = QTimer()
+        self.preview_timer.setSingleShot(True)
+        self.preview_timer.setInterval(300)
+        self.preview_timer.timeout.connect(self.preview_selected_section)
+
         self.was_playing = False  # Add this to track playback state
 
         # Initialize time display with proper decimal places
         self.time_display.setText("00:00.00 / 00:00.00")
 
+        # Start loading the separation model so the first job doesn't wait for it
+        self.separation_pool.warm(DEFAULT_MODEL)
+
     def create_white_icon(self, standard_icon):
         # Get the icon and convert to pixmap
         icon = self.style().standardIcon(standard_icon)
@@ -568,8 +757,21 @@ class AudioApp(QMainWindow):
         # Set cursor to pointing finger when hovering over timeline
         self.timeline_slider.setCursor(Qt.CursorShape.PointingHandCursor)
         
+        # The slider covers the waveform with a see-through background, so clicks anywhere on it seek
+        self.waveform_view = WaveformView()
+        self.timeline_slider.setMinimumHeight(WaveformView.HEIGHT)
+        self.timeline_slider.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Expanding)
+        self.timeline_slider.setStyleSheet("""
+            QSlider { background: transparent; }
+            QSlider::groove:horizontal { background: transparent; height: 5px; }
+        """)
+        timeline_stack = QGridLayout()
+        timeline_stack.setContentsMargins(0, 0, 0, 0)
+        timeline_stack.addWidget(self.waveform_view, 0, 0)
+        timeline_stack.addWidget(self.timeline_slider, 0, 0)
+        
         # Add timeline slider to layout
-        timeline_layout.addWidget(self.timeline_slider)
+        timeline_layout.addLayout(timeline_stack)
         
         # Add spacing after timeline slider
         timeline_layout.addSpacing(5)
@@ -682,6 +884,12 @@ class AudioApp(QMainWindow):
         self.cancel_section_button.setEnabled(False)
         self.cancel_section_button.setFixedHeight(35)
         section_buttons_layout.addWidget(self.cancel_section_button)
+        
+        # Proposes sections from the waveform's vocal activity for review
+        self.detect_button = QPushButton("Detect Vocals")
+        self.detect_button.clicked.connect(self.detect_vocal_sections)
+        self.detect_button.setFixedHeight(35)
+        section_buttons_layout.addWidget(self.detect_button)
         top_section_layout.addLayout(section_buttons_layout)
         
         # Add the fixed-height top section
@@ -712,13 +920,49 @@ class AudioApp(QMainWindow):
         self.process_button.setObjectName("process_button")
         self.process_button.clicked.connect(self.process_sections)
         
+        self.settings_button = QPushButton("Performance")
+        self.settings_button.clicked.connect(self.open_performance_settings)
+        
+        # Quality vs. speed for the next job: Demucs or one of the DSP backends
+        self.quality_combo = QComboBox()
+        self.quality_combo.addItem(f"Best ({DEFAULT_MODEL})", DEFAULT_MODEL)
+        for name, backend in BACKENDS.items():
+            self.quality_combo.addItem(backend.description, name)
+        
+        # Preview the selected section without vocals and flip vocals on and off while it plays
+        self.preview_button = QPushButton("Preview")
+        self.preview_button.clicked.connect(self.preview_section)
+        self.vocals_button = QPushButton("Vocals: Off")
+        self.vocals_button.clicked.connect(self.toggle_preview_vocals)
+        self.section_list_widget.itemDoubleClicked.connect(self.preview_section)
+        self.section_list_widget.currentRowChanged.connect(self.on_section_selected)
+        
         bottom_layout.addWidget(self.delete_section_button)
+        bottom_layout.addWidget(self.preview_button)
+        bottom_layout.addWidget(self.vocals_button)
+        bottom_layout.addWidget(self.settings_button)
+        bottom_layout.addWidget(self.quality_combo)
         bottom_layout.addWidget(self.process_button)
         
         section_layout.addWidget(bottom_section)
         
+        # Job list with per-job progress and a cancel button
+        jobs_section = QWidget()
+        jobs_section.setFixedHeight(70)
+        jobs_layout = QHBoxLayout(jobs_section)
+        jobs_layout.setContentsMargins(0, 0, 0, 0)
+        
+        self.job_list_widget = QListWidget()
+        jobs_layout.addWidget(self.job_list_widget, stretch=1)
+        
+        self.cancel_job_button = QPushButton("Cancel Job")
+        self.cancel_job_button.clicked.connect(self.cancel_job)
+        jobs_layout.addWidget(self.cancel_job_button, alignment=Qt.AlignmentFlag.AlignTop)
+        
+        section_layout.addWidget(jobs_section)
+        
         # Remove maximum height constraint from section group
-        section_group.setMinimumHeight(250)  # Reduced from 300 to 250
+        section_group.setMinimumHeight(self.MIN_SECTION_HEIGHT)
         section_group.setSizePolicy(
             QSizePolicy.Policy.Expanding,
             QSizePolicy.Policy.Expanding
@@ -865,6 +1109,22 @@ class AudioApp(QMainWindow):
         # Stop playback
         if self.is_playing:
             self.stop_audio()
+        self.preview_player.release()
+        
+        # Stop analyzing the old song's waveform
+        if self.waveform:
+            self.waveform.stop()
+            self.waveform = None
+        self.waveform_view.set_overview(None)
+        
+        # Stop background pre-separation of the old song
+        if self.preseparator:
+            self.preseparator.stop()
+            self.preseparator = None
+        
+        # Release the decoded audio once no job is still reading it
+        self.release_song(self.song)
+        self.song = None
         
         # Clear sections
         self.sections.clear()
@@ -885,6 +1145,14 @@ class AudioApp(QMainWindow):
         self.set_button_highlight(self.mark_end_button, False)
         self.set_button_highlight(self.add_section_button, False)
 
+    def release_song(self, song):
+        if song is None:
+            return
+        if any(job.song is song for job in self.job_queue.active_jobs()):
+            self.songs_to_release.append(song)
+        else:
+            song.close()
+
     def on_file_loaded(self, result):
         song, file_path = result
         
@@ -905,7 +1173,7 @@ class AudioApp(QMainWindow):
         self.player.setSource(QUrl.fromLocalFile(file_path))
         
         # Update UI
-        self.timeline_slider.setMaximum(int(self.song_length * 100))
+        self.timeline_slider.setMaximum(int(self.song_length * 1000))
         self.update_time_display(0)
         
         # Update window title with filename
@@ -920,6 +1188,18 @@ class AudioApp(QMainWindow):
         
         self.status_label.setText("File loaded successfully")
         
+        # Build the waveform overview as the file decodes (or load it from the cache)
+        self.waveform = WaveformOverview(self.song, file_path)
+        self.waveform.start()
+        self.waveform_view.set_overview(self.waveform)
+        
+        # Optionally start separating the whole song while the user marks sections
+        if self.performance_settings.preseparate:
+            self.preseparator = PreSeparator(
+                self.song, file_path, self.performance_settings, pool=self.separation_pool
+            )
+            self.preseparator.start()
+        
         # Re-enable UI
         self.setEnabled(True)
 
@@ -933,6 +1213,7 @@ class AudioApp(QMainWindow):
             self.play_button.setIcon(self.create_white_icon(QStyle.StandardPixmap.SP_MediaPlay))
             self.is_playing = False
         else:
+            self.preview_player.stop()
             self.player.play()
             self.play_button.setIcon(self.create_white_icon(QStyle.StandardPixmap.SP_MediaPause))
             self.is_playing = True
@@ -940,15 +1221,22 @@ class AudioApp(QMainWindow):
     def on_position_changed(self, position):
         # Convert position from milliseconds to seconds with 2 decimal places
         self.current_time = position / 1000
+        if self.preseparator:
+            self.preseparator.set_focus(self.current_time)
         self.timeline_slider.blockSignals(True)
-        self.timeline_slider.setValue(int(self.current_time * 100))  # Multiply by 100 for slider
+        self.timeline_slider.setValue(position)  # The slider works in milliseconds like the player
         self.timeline_slider.blockSignals(False)
         self.update_time_display(self.current_time)
+        
+        # Select the section under the playhead while playing through it
+        section_idx = self.sections.find(self.current_frame())
+        if section_idx is not None and section_idx != self.section_list_widget.currentRow():
+            self.select_section_row(section_idx)
 
     def on_duration_changed(self, duration):
         # Convert duration from milliseconds to seconds
         self.song_length = duration / 1000
-        self.timeline_slider.setRange(0, int(self.song_length * 100))
+        self.timeline_slider.setRange(0, duration)
 
     def on_timeline_change(self):
         if not self.song:
@@ -962,8 +1250,8 @@ class AudioApp(QMainWindow):
                 self.is_playing = False
         
         # Update position without starting playback
-        position = self.timeline_slider.value() / 100.0
-        self.player.setPosition(int(position * 1000))
+        position = self.timeline_slider.value() / 1000.0
+        self.player.setPosition(self.timeline_slider.value())
         self.current_time = position
         self.update_time_display(position)
 
@@ -990,6 +1278,7 @@ class AudioApp(QMainWindow):
     def set_volume(self):
         volume = self.volume_slider.value() / 100.0  # Convert to 0-1 range
         self.audio_output.setVolume(volume)
+        self.preview_player.set_volume(volume)
         self.volume_percentage.setText(f"{int(volume * 100)}%")
 
     def update_time(self):
@@ -997,9 +1286,9 @@ class AudioApp(QMainWindow):
             current_ms = self.player.position()
             if current_ms >= 0:
                 self.current_time = current_ms / 1000.0
-                # Update slider position with 2 decimal precision
+                # Update slider position (in milliseconds)
                 self.timeline_slider.blockSignals(True)
-                self.timeline_slider.setValue(int(self.current_time * 100))
+                self.timeline_slider.setValue(current_ms)
                 self.timeline_slider.blockSignals(False)
                 self.update_time_display(self.current_time)
                 
@@ -1024,6 +1313,13 @@ class AudioApp(QMainWindow):
         total_formatted = format_time_precise(float(self.song_length))
         self.time_display.setText(f"{current_formatted} / {total_formatted}")
 
+    def current_frame(self):
+        """The playhead as a sample frame of the song; sections are kept in frames"""
+        return seconds_to_frames(self.current_time, self.song.frame_rate)
+
+    def format_frame(self, frame):
+        return format_time_precise(frames_to_seconds(frame, self.song.frame_rate))
+
     def adjust_time(self, delta):
         if not self.song:
             return
@@ -1034,8 +1330,8 @@ class AudioApp(QMainWindow):
             return
         self.last_seek_time = current_time
             
-        # Calculate new time with 2 decimal precision
-        new_time = round(self.current_time + delta, 2)  # Changed from round(..., 1)
+        # Calculate new time with millisecond precision
+        new_time = round(self.current_time + delta, 3)
         new_time = max(0, min(new_time, self.song_length))
         
         # Store current playing state but don't resume after
@@ -1048,7 +1344,7 @@ class AudioApp(QMainWindow):
         
         # Set the new position directly without using the debounce mechanism
         self.current_time = new_time
-        self.timeline_slider.setValue(int(new_time * 100))
+        self.timeline_slider.setValue(int(round(new_time * 1000)))
         if self.player.duration() > 0:
             # Just set position in milliseconds directly
             self.player.setPosition(int(new_time * 1000))
@@ -1073,6 +1369,10 @@ class AudioApp(QMainWindow):
         self.down_shortcut = QShortcut(QKeySequence(Qt.Key.Key_Down), self)
         self.down_shortcut.activated.connect(lambda: self.adjust_volume(-5))  # Decrease by 5%
         
+        # V toggles vocals in the section preview
+        self.vocals_shortcut = QShortcut(QKeySequence(Qt.Key.Key_V), self)
+        self.vocals_shortcut.activated.connect(self.toggle_preview_vocals)
+        
         # Enter key for section marking
         self.enter_shortcut = QShortcut(QKeySequence(Qt.Key.Key_Return), self)
         self.enter_shortcut.activated.connect(self.handle_enter)
@@ -1143,7 +1443,7 @@ class AudioApp(QMainWindow):
             return
         
         # Use current timeline position immediately
-        self.current_section_start = self.current_time
+        self.current_section_start = self.current_frame()
         # Update button highlighting
         self.set_button_highlight(self.mark_start_button, False)
         self.set_button_highlight(self.mark_end_button, True)
@@ -1161,8 +1461,8 @@ class AudioApp(QMainWindow):
             return
         
         # Use current timeline position immediately
-        if self.current_time > self.current_section_start:
-            self.current_section_end = self.current_time
+        if self.current_frame() > self.current_section_start:
+            self.current_section_end = self.current_frame()
             # Update button highlighting
             self.set_button_highlight(self.mark_end_button, False)
             self.set_button_highlight(self.mark_start_button, False)
@@ -1174,10 +1474,10 @@ class AudioApp(QMainWindow):
 
     def update_selection_label(self):
         if self.current_section_start is not None:
-            start_formatted = format_time_precise(self.current_section_start)
+            start_formatted = self.format_frame(self.current_section_start)
             
             if self.current_section_end is not None:
-                end_formatted = format_time_precise(self.current_section_end)
+                end_formatted = self.format_frame(self.current_section_end)
                 self.selection_label.setText(f"Selected: {start_formatted} to {end_formatted}")
             else:
                 self.selection_label.setText(f"Start: {start_formatted} - Click 'Mark End' to set end point")
@@ -1189,17 +1489,7 @@ class AudioApp(QMainWindow):
             self.status_label.setText("Error: Please select both start and end points!")
             return
             
-        self.sections.append((self.current_section_start, self.current_section_end))
-        
-        start_formatted = format_time_precise(self.current_section_start)
-        end_formatted = format_time_precise(self.current_section_end)
-        
-        self.section_list_widget.addItem(
-            f"Section {len(self.sections)}: {start_formatted} to {end_formatted}"
-        )
-        
-        # Enable process button when we have sections
-        self.process_button.setEnabled(True)
+        added = self.append_section(self.current_section_start, self.current_section_end)
         
         # Reset selection and buttons
         self.current_section_start = None
@@ -1210,39 +1500,69 @@ class AudioApp(QMainWindow):
         self.set_button_highlight(self.mark_start_button, True)
         self.set_button_highlight(self.mark_end_button, False)
         self.set_button_highlight(self.add_section_button, False)
-        self.status_label.setText(f"Section {len(self.sections)} added successfully")
+        if added is None:
+            self.status_label.setText("That range is already part of a section")
+        else:
+            self.status_label.setText(
+                f"Section {self.sections.index(added) + 1} added successfully"
+            )
+
+    def append_section(self, start_frame, end_frame):
+        """Add a section of sample frames, merging it with any it overlaps or touches
+
+        Returns the resulting section, or None if the range was already covered.
+        """
+        added = self.sections.add(start_frame, end_frame)
+        if added is not None:
+            self.refresh_section_list()
+            self.select_section_row(self.sections.index(added))
+        return added
+
+    def refresh_section_list(self):
+        """Show the sections in time order (merging can change their numbers)"""
+        # Rebuilding the list isn't a selection by the user
+        self.preview_timer.stop()
+        self.section_list_widget.blockSignals(True)
+        self.section_list_widget.clear()
+        for idx, (start_frame, end_frame) in enumerate(self.sections, start=1):
+            start_formatted = self.format_frame(start_frame)
+            end_formatted = self.format_frame(end_frame)
+            self.section_list_widget.addItem(f"Section {idx}: {start_formatted} to {end_formatted}")
+        self.section_list_widget.blockSignals(False)
+        
+        # Enable process button when we have sections
+        self.process_button.setEnabled(bool(self.sections))
+
+    def detect_vocal_sections(self):
+        if self.song is None:
+            self.status_label.setText("Error: No song loaded!")
+            return
+        if self.waveform is None or not self.waveform.complete:
+            self.status_label.setText("Still analyzing the song, try again in a moment")
+            return
+        
+        detected = detect_sections(
+            self.waveform.activity_blocks(), self.song.frame_rate, total_frames=self.waveform.frames
+        )
+        # Sections already marked are kept; overlapping detections merge into them
+        added = 0
+        for start_frame, end_frame in detected:
+            if self.append_section(start_frame, end_frame) is not None:
+                added += 1
+        
+        if added:
+            self.status_label.setText(
+                f"Added {added} detected vocal section(s), please review them before processing"
+            )
+        else:
+            self.status_label.setText("No new vocal sections detected")
 
     def delete_section(self):
-        selected_item = self.section_list_widget.currentItem()
-        if selected_item:
-            section_text = selected_item.text()
-            section_idx = int(section_text.split(":")[0].split()[1]) - 1
-            
-            # Remove the section from the list
+        section_idx = self.section_list_widget.currentRow()
+        if 0 <= section_idx < len(self.sections):
+            # Remove the section and re-number the rest
             self.sections.pop(section_idx)
-            
-            # Update the section list display
-            self.section_list_widget.takeItem(self.section_list_widget.row(selected_item))
-            
-            # Re-number the sections in the list widget with whole seconds
-            for i in range(self.section_list_widget.count()):
-                item = self.section_list_widget.item(i)
-                
-                # Format start time with whole seconds
-                start_min = int(self.sections[i][0]) // 60
-                start_sec = int(self.sections[i][0]) % 60
-                
-                # Format end time with whole seconds
-                end_min = int(self.sections[i][1]) // 60
-                end_sec = int(self.sections[i][1]) % 60
-                
-                item.setText(
-                    f"Section {i + 1}: {start_min:02}:{start_sec:02} to {end_min:02}:{end_sec:02}"
-                )
-            
-            # Disable process button if no sections remain
-            if len(self.sections) == 0:
-                self.process_button.setEnabled(False)
+            self.refresh_section_list()
             
             self.status_label.setText(f"Section {section_idx + 1} deleted.")
 
@@ -1255,9 +1575,113 @@ class AudioApp(QMainWindow):
             self.status_label.setText("Error: No song loaded!")
             return
 
-        self.audio_processor = AudioProcessor(self.song, self.sections, self.song_path)
-        self.audio_processor.status_update.connect(self.update_status)
-        self.audio_processor.start()
+        # Each job gets its own copy of the settings so later edits don't affect it
+        settings = PerformanceSettings.from_dict(self.performance_settings.to_dict())
+        job = Job(
+            self.song, self.sections, self.song_path, settings, self.preseparator,
+            model_name=self.quality_combo.currentData(),
+        )
+        self.job_queue.submit(job)
+
+    def on_job_updated(self, job):
+        text = f"Job {job.id}: {job.name} - {job.message}"
+        item = self.job_items.get(job.id)
+        if item is None:
+            self.job_list_widget.addItem(text)
+            item = self.job_list_widget.item(self.job_list_widget.count() - 1)
+            self.job_items[job.id] = item
+        else:
+            item.setText(text)
+        
+        self.set_status_style(text, is_error=job.state == Job.FAILED)
+        
+        # Close songs that were replaced while a job was still reading them
+        if job.finished:
+            active = self.job_queue.active_jobs()
+            for song in list(self.songs_to_release):
+                if not any(other.song is song for other in active):
+                    self.songs_to_release.remove(song)
+                    song.close()
+
+    def cancel_job(self):
+        selected_item = self.job_list_widget.currentItem()
+        if selected_item is None:
+            self.status_label.setText("Error: Select a job to cancel!")
+            return
+        for job_id, item in self.job_items.items():
+            if item is selected_item:
+                self.job_queue.cancel(job_id)
+                break
+
+    def select_section_row(self, row):
+        """Select a section in the list without previewing it (for the playhead and new sections)"""
+        self.section_list_widget.blockSignals(True)
+        self.section_list_widget.setCurrentRow(row)
+        self.section_list_widget.blockSignals(False)
+
+    def on_section_selected(self, row):
+        if row < 0:
+            self.preview_timer.stop()
+            return
+        # Restarted by every change, so only the section the user stops on is separated
+        self.preview_timer.start()
+
+    def preview_selected_section(self):
+        if self.preview_loader is not None and self.preview_loader.isRunning():
+            # Preview the newer selection once the current one is ready
+            self.preview_timer.start()
+            return
+        self.preview_section()
+
+    def preview_section(self):
+        row = self.section_list_widget.currentRow()
+        if self.song is None or not 0 <= row < len(self.sections):
+            self.status_label.setText("Error: Select a section to preview!")
+            return
+        if self.preview_loader is not None and self.preview_loader.isRunning():
+            return
+        
+        # Only one thing plays at a time
+        if self.is_playing:
+            self.toggle_play()
+        self.preview_player.stop()
+        
+        start_frame, end_frame = self.sections[row]
+        self.status_label.setText(f"Preparing preview of section {row + 1}...")
+        self.preview_loader = PreviewLoader(
+            self.song, self.song_path, start_frame, end_frame, self.quality_combo.currentData(),
+            self.performance_settings, self.preseparator, self.separation_pool,
+        )
+        self.preview_loader.finished.connect(
+            lambda result, section=row + 1: self.on_preview_ready(result, section)
+        )
+        self.preview_loader.start()
+
+    def on_preview_ready(self, result, section):
+        if isinstance(result, Exception):
+            self.set_status_style(f"Error preparing preview: {str(result)}", is_error=True)
+            return
+        original_path, instrumental_path, source = result
+        self.preview_player.load(original_path, instrumental_path)
+        self.status_label.setText(
+            f"Previewing section {section} ({source}). Press V to toggle vocals."
+        )
+
+    def toggle_preview_vocals(self):
+        vocals = self.preview_player.toggle_vocals()
+        self.vocals_button.setText("Vocals: On" if vocals else "Vocals: Off")
+
+    def open_performance_settings(self):
+        dialog = PerformanceDialog(self.performance_settings, self)
+        if dialog.exec():
+            self.job_queue.set_max_concurrent(self.performance_settings.max_concurrent_jobs)
+            self.separation_pool.resize(self.performance_settings.separation_processes)
+            self.waveform_view.set_show_activity(bool(self.performance_settings.vocal_activity_lane))
+            try:
+                self.performance_settings.save()
+                self.update_status("Performance settings saved")
+            except OSError as e:
+                self.update_status(f"Error saving settings: {str(e)}")
 
     def set_status_style(self, message, is_error=False):
         """Helper method to consistently style status messages"""
@@ -1314,9 +1738,19 @@ class AudioApp(QMainWindow):
         if hasattr(self, 'audio_output') and self.audio_output:
             self.audio_output = None  # No need to release, just remove reference
         
-        # Stop audio processor if running
-        if self.audio_processor and self.audio_processor.isRunning():
-            self.audio_processor.terminate()
+        self.preview_player.release()
+        if self.waveform:
+            self.waveform.stop()
+        
+        # Cancel running jobs; workers that don't stop right away are killed
+        self.job_queue.shutdown(cancel=True)
+        if self.preseparator:
+            self.preseparator.stop()
+        self.separation_pool.shutdown()
+        
+        # Stop decoding and remove the scratch PCM file
+        if self.song is not None:
+            self.song.close()
         
         # Clean up temporary file
         if hasattr(self, 'temp_file') and os.path.exists(self.temp_file):
@@ -1325,15 +1759,9 @@ class AudioApp(QMainWindow):
             except:
                 pass
         
-        # Clean up temp directory
-        try:
-            for file in os.listdir(temp_dir):
-                try:
-                    os.remove(os.path.join(temp_dir, file))
-                except:
-                    pass
-        except:
-            pass
+        # Only this window's own files are removed: the preview WAVs (release above) and
+        # the song's PCM (close above). Other processes, such as the watch folder, keep
+        # their scratch files in the same temp directory while they run
         
         # Now we can safely close the application
         QApplication.quit()
@@ -1432,9 +1860,9 @@ class AudioApp(QMainWindow):
         value = (x / width) * self.timeline_slider.maximum()
         self.timeline_slider.setValue(int(value))
         
-        # Update position
-        position = value / 100.0
-        self.player.setPosition(int(position * 1000))
+        # Update position (the slider works in milliseconds)
+        position = int(value) / 1000.0
+        self.player.setPosition(int(value))
         self.current_time = position
         self.update_time_display(position)
 
@@ -1453,9 +1881,9 @@ class AudioApp(QMainWindow):
             value = (x / width) * self.timeline_slider.maximum()
             self.timeline_slider.setValue(int(value))
             
-            # Update position
-            position = value / 100.0
-            self.player.setPosition(int(position * 1000))
+            # Update position (the slider works in milliseconds)
+            position = int(value) / 1000.0
+            self.player.setPosition(int(value))
             self.current_time = position
             self.update_time_display(position)
         else:
@@ -1513,6 +1941,15 @@ class AudioApp(QMainWindow):
             QTimer.singleShot(100, self.resume_playback)
 
 if __name__ == "__main__":
+    # Separation worker processes re-run this module in frozen builds
+    multiprocessing.freeze_support()
+    
+    # Windowed builds have no console; give stray prints somewhere harmless to go
+    if sys.stdout is None:
+        sys.stdout = open(os.devnull, 'w')
+    if sys.stderr is None:
+        sys.stderr = open(os.devnull, 'w')
+    
     app = QApplication(sys.argv)
     
     # Set application icon
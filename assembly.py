@@ -0,0 +1,145 @@
+import numpy as np
+from pydub import AudioSegment
+
+from tensor_io import SAMPLE_DTYPES, segment_to_array
+
+
+def match_format(segment, like):
+    """Convert a segment to the sample rate, channel count and width of `like`"""
+    if segment.frame_rate != like.frame_rate:
+        segment = segment.set_frame_rate(like.frame_rate)
+    if segment.channels != like.channels:
+        segment = segment.set_channels(like.channels)
+    if segment.sample_width != like.sample_width:
+        segment = segment.set_sample_width(like.sample_width)
+    return segment
+
+
+def equal_power_fades(frames):
+    """Fade-out and fade-in gains over `frames` frames whose squares sum to 1"""
+    position = (np.arange(frames) + 0.5) / frames * (np.pi / 2)
+    return np.cos(position), np.sin(position)
+
+
+def linear_fades(frames):
+    """Fade-out and fade-in gains over `frames` frames that sum to 1 (for nearly identical audio)"""
+    fade_in = (np.arange(frames) + 0.5) / frames
+    return 1.0 - fade_in, fade_in
+
+
+class OutputAssembler:
+    """Writes the output track piece by piece, in order
+
+    Pieces are either AudioSegments or (start_frame, end_frame) ranges of
+    the source song, which are copied straight out of its sample buffer.
+    Finished audio goes to `write` (e.g. a StreamingEncoder) as soon as
+    the piece after it is known; without one, build() returns the whole
+    output as an AudioSegment.
+
+    With `crossfade_frames`, every splice between pieces that don't follow
+    each other in the song gets an equal-power crossfade centered on it.
+    The outgoing piece continues past its end and the incoming one starts
+    early, using the song around a range or the extra `head`/`tail` frames
+    a segment was separated with, so the output length doesn't change.
+    `fades` gives the crossfade gains: equal-power suits splices between
+    different audio, linear ones between two takes on the same audio.
+    """
+
+    def __init__(self, song, crossfade_frames=0, write=None, fades=equal_power_fades):
+        self.song = song
+        self.crossfade_frames = crossfade_frames
+        self.fades = fades
+        self.chunks = []
+        self.write = write or self.chunks.append
+        self.source = np.frombuffer(
+            song.raw_data, dtype=SAMPLE_DTYPES[song.sample_width]
+        ).reshape(-1, song.channels)
+        # The last piece added; its frames from `written` on haven't been written yet
+        self.pending = None
+        self.written = 0
+
+    def add_range(self, start_frame, end_frame):
+        if end_frame <= start_frame:
+            return
+        # A range continuing the previous one is the same audio, so there is nothing to splice
+        if self.pending is not None and self.pending[0] == 'range' and self.pending[2] == start_frame:
+            self.pending = ('range', self.pending[1], end_frame)
+        else:
+            self._add(('range', start_frame, end_frame))
+
+    def add_segment(self, segment, head=0, tail=0):
+        """Add a segment whose first `head` and last `tail` frames are only used for crossfades"""
+        samples = segment_to_array(match_format(segment, self.song))
+        self._add(('segment', samples, head, tail))
+
+    def finish(self):
+        """Write the rest of the last piece"""
+        if self.pending is not None:
+            self._write(self._frames(self.pending, self.written, self._length(self.pending)))
+            self.pending = None
+
+    def build(self):
+        """The whole output as an AudioSegment (only without a `write` target)"""
+        self.finish()
+        return AudioSegment(
+            data=b''.join(self.chunks),
+            sample_width=self.song.sample_width,
+            frame_rate=self.song.frame_rate,
+            channels=self.song.channels,
+        )
+
+    def _add(self, piece):
+        before = self.pending
+        fade = 0
+        if before is not None:
+            fade = self._fade_frames(before, piece)
+            self._write(self._frames(before, self.written, self._length(before) - fade))
+            if fade:
+                self._write(self._crossfade(before, piece, fade))
+        self.pending = piece
+        self.written = fade
+
+    def _write(self, samples):
+        if len(samples):
+            self.write(np.ascontiguousarray(samples))
+
+    def _length(self, piece):
+        if piece[0] == 'range':
+            return piece[2] - piece[1]
+        _, samples, head, tail = piece
+        return len(samples) - head - tail
+
+    def _handles(self, piece):
+        """Frames available before and after a piece"""
+        if piece[0] == 'range':
+            return piece[1], len(self.source) - piece[2]
+        return piece[2], piece[3]
+
+    def _frames(self, piece, lo, hi):
+        """Frames lo:hi relative to the start of a piece (may reach into its handles)"""
+        if piece[0] == 'range':
+            return self.source[piece[1] + lo:piece[1] + hi]
+        _, samples, head, _ = piece
+        return samples[head + lo:head + hi]
+
+    def _fade_frames(self, before, after):
+        """Half the crossfade, limited by the audio both sides have around the splice"""
+        _, tail = self._handles(before)
+        head, _ = self._handles(after)
+        # At most half of what is left of each piece, so neighbouring fades never overlap
+        return max(0, min(
+            self.crossfade_frames // 2, tail, head,
+            (self._length(before) - self.written) // 2, self._length(after) // 2,
+        ))
+
+    def _crossfade(self, before, after, fade):
+        length = self._length(before)
+        outgoing = self._frames(before, length - fade, length + fade).astype(np.float64)
+        incoming = self._frames(after, -fade, fade).astype(np.float64)
+        fade_out, fade_in = self.fades(2 * fade)
+        mixed = outgoing * fade_out[:, None] + incoming * fade_in[:, None]
+
+        limits = np.iinfo(self.source.dtype)
+        np.rint(mixed, out=mixed)
+        np.clip(mixed, limits.min, limits.max, out=mixed)
+        return mixed.astype(self.source.dtype)
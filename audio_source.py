@@ -0,0 +1,220 @@
+import os
+import mmap
+import uuid
+import subprocess
+import threading
+
+from pydub import AudioSegment
+from pydub.exceptions import CouldntDecodeError
+from pydub.utils import mediainfo_json
+
+import paths
+
+DECODE_CHUNK_SIZE = 1024 * 1024
+
+
+class AudioSource:
+    """Audio file decoded once to raw PCM on disk and read lazily
+
+    Opening only probes the file, so the UI can use it right away. A
+    background ffmpeg process streams the decoded PCM into a scratch file,
+    and reads block only until the frames they need have been decoded. Once
+    decoding finishes the PCM is memory-mapped, so even multi-hour files are
+    not held on the Python heap. Slicing with milliseconds works like a
+    pydub AudioSegment and returns AudioSegments.
+    """
+
+    def __init__(self, file_path, scratch_dir=paths.temp_dir):
+        self.file_path = file_path
+        self.pcm_path = os.path.join(scratch_dir, f"source_{uuid.uuid4().hex}.pcm")
+
+        self._probe()
+        self.frame_width = self.channels * self.sample_width
+
+        self._condition = threading.Condition()
+        self._decoded_bytes = 0
+        self._finished = False
+        self._closed = False
+        self._error = None
+        self._process = None
+        self._reader = None
+        self._map = None
+
+        self._decoder = threading.Thread(target=self._decode, daemon=True)
+        self._decoder.start()
+
+    def _probe(self):
+        try:
+            info = mediainfo_json(self.file_path)
+        except Exception as e:
+            raise CouldntDecodeError(f"Couldn't read {self.file_path}: {e}")
+
+        audio_streams = [s for s in info.get('streams', []) if s.get('codec_type') == 'audio']
+        if not audio_streams:
+            raise CouldntDecodeError(f"No audio stream found in {self.file_path}")
+        stream = audio_streams[0]
+
+        self.frame_rate = int(stream['sample_rate'])
+        self.channels = int(stream['channels'])
+        # Keep high-resolution sources at 32 bits, everything else as 16-bit PCM
+        bits = int(stream.get('bits_per_raw_sample') or stream.get('bits_per_sample') or 16)
+        self.sample_width = 4 if bits > 16 else 2
+
+        duration = stream.get('duration') or info.get('format', {}).get('duration') or 0
+        self.estimated_frames = int(float(duration) * self.frame_rate)
+
+    def _decode(self):
+        codec = 'pcm_s32le' if self.sample_width == 4 else 'pcm_s16le'
+        command = [
+            AudioSegment.converter, '-nostdin', '-v', 'error',
+            '-i', self.file_path, '-vn',
+            '-acodec', codec, '-f', codec[4:],
+            '-ac', str(self.channels), '-ar', str(self.frame_rate),
+            '-',
+        ]
+        try:
+            self._process = subprocess.Popen(
+                command, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+            )
+            with open(self.pcm_path, 'wb') as out:
+                while not self._closed:
+                    chunk = self._process.stdout.read(DECODE_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    out.write(chunk)
+                    out.flush()
+                    with self._condition:
+                        self._decoded_bytes += len(chunk)
+                        self._condition.notify_all()
+
+            self._process.stdout.close()
+            stderr = self._process.stderr.read()
+            if self._process.wait() != 0 and not self._closed:
+                raise CouldntDecodeError(stderr.decode(errors='replace').strip())
+        except Exception as e:
+            with self._condition:
+                self._error = e
+        finally:
+            with self._condition:
+                self._finished = True
+                self._condition.notify_all()
+
+    @property
+    def is_decoded(self):
+        with self._condition:
+            return self._finished and self._error is None
+
+    @property
+    def decoded_frames(self):
+        with self._condition:
+            return self._decoded_bytes // self.frame_width
+
+    def wait(self, frames=None, timeout=None):
+        """Block until `frames` frames (or the whole file) are decoded"""
+        with self._condition:
+            done = self._condition.wait_for(
+                lambda: self._finished or (
+                    frames is not None and self._decoded_bytes >= frames * self.frame_width
+                ),
+                timeout,
+            )
+            if self._error is not None:
+                raise self._error
+            return done
+
+    def frame_count(self, ms=None):
+        """Frames for `ms` milliseconds, or the exact total once decoding finishes"""
+        if ms is not None:
+            return ms * (self.frame_rate / 1000.0)
+        self.wait()
+        return float(self._decoded_bytes // self.frame_width)
+
+    def __len__(self):
+        """Length in milliseconds (estimated from the file header until decoded)"""
+        with self._condition:
+            frames = self._decoded_bytes // self.frame_width if self._finished else self.estimated_frames
+        return round(1000 * frames / self.frame_rate)
+
+    def __bool__(self):
+        return True
+
+    def read_frames(self, start_frame, end_frame):
+        """Return the raw PCM bytes for a frame range, waiting for it to be decoded"""
+        self.wait(end_frame)
+        with self._condition:
+            available = self._decoded_bytes // self.frame_width
+            start_frame = max(0, min(start_frame, available))
+            end_frame = max(start_frame, min(end_frame, available))
+            if self._map is not None:
+                return self._map[start_frame * self.frame_width:end_frame * self.frame_width]
+            if self._reader is None:
+                self._reader = open(self.pcm_path, 'rb')
+            self._reader.seek(start_frame * self.frame_width)
+            return self._reader.read((end_frame - start_frame) * self.frame_width)
+
+    def get_frames(self, start_frame, end_frame):
+        """AudioSegment for a frame range"""
+        return self._spawn(self.read_frames(start_frame, end_frame))
+
+    def get_sample_slice(self, start_sample=None, end_sample=None):
+        """Frame-indexed slice, matching AudioSegment.get_sample_slice"""
+        start_sample = 0 if start_sample is None else start_sample
+        if end_sample is None:
+            end_sample = int(self.frame_count())
+        return self.get_frames(start_sample, end_sample)
+
+    def __getitem__(self, millisecond):
+        if not isinstance(millisecond, slice) or millisecond.step:
+            raise TypeError("AudioSource only supports [start_ms:end_ms] slicing")
+        start = millisecond.start if millisecond.start is not None else 0
+        end = millisecond.stop if millisecond.stop is not None else float('inf')
+        start_frame = int(self.frame_count(ms=start)) if start != float('inf') else int(self.frame_count())
+        end_frame = int(self.frame_count(ms=end)) if end != float('inf') else int(self.frame_count())
+        return self.get_frames(start_frame, end_frame)
+
+    @property
+    def raw_data(self):
+        """Memory-mapped view of the whole decoded PCM (waits for decoding to finish)"""
+        self.wait()
+        with self._condition:
+            if self._map is None:
+                if self._decoded_bytes == 0:
+                    return memoryview(b'')
+                if self._reader is None:
+                    self._reader = open(self.pcm_path, 'rb')
+                self._map = mmap.mmap(self._reader.fileno(), 0, access=mmap.ACCESS_READ)
+            return memoryview(self._map)
+
+    def to_segment(self):
+        """Load the whole decoded file as an in-memory AudioSegment"""
+        return self._spawn(bytes(self.raw_data))
+
+    def _spawn(self, data):
+        return AudioSegment(
+            data=data,
+            sample_width=self.sample_width,
+            frame_rate=self.frame_rate,
+            channels=self.channels,
+        )
+
+    def close(self):
+        """Stop decoding and delete the scratch PCM file"""
+        self._closed = True
+        if self._process is not None and self._process.poll() is None:
+            self._process.kill()
+        self._decoder.join(timeout=5)
+        with self._condition:
+            if self._map is not None:
+                try:
+                    self._map.close()
+                except BufferError:
+                    # Still referenced by a running job; the OS frees it at exit
+                    pass
+                self._map = None
+            if self._reader is not None:
+                self._reader.close()
+                self._reader = None
+        try:
+            os.remove(self.pcm_path)
+        except OSError:
+            pass
@@ -0,0 +1,335 @@
+"""Offline benchmark of the loading, separation, assembly and export stages
+
+Examples:
+    python benchmark.py
+    python benchmark.py --seconds 600 --channels 2 --models spectral_mask htdemucs
+    python benchmark.py --output before.json
+    python benchmark.py --compare before.json --max-regression 10
+
+The test song is synthesized (a gated harmonic "voice", a bass line and
+noise-burst drums), so nothing is downloaded and no copyrighted audio is
+needed. The "tiny" model is an untrained stand-in with the same interface
+as a Demucs model. It measures the pipeline around the network rather than
+separation quality. The DSP backends (center_cancel, spectral_mask) are
+measured too, and htdemucs is included when it can be loaded.
+
+Sections are separated with the configured context, and the output is
+built by the same streaming assembler and encoder jobs use: "assemble"
+writes it as WAV, which is mostly the assembly, and "export" writes it in
+the configured output format, assembly included.
+
+Each stage is reported as a real-time factor (RTF): seconds of processing
+per second of input audio, so lower is faster. Results are saved as JSON
+for comparing versions.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import torch
+from pydub import AudioSegment
+
+from cli import add_performance_arguments, build_settings
+from encoder import output_extension
+from engine import SongOutput, load_song, separate_instrumentals
+from model_registry import model_registry
+from settings import PerformanceSettings, cpu_count
+from tensor_io import fit_length
+from utils import seconds_to_frames
+
+BENCHMARK_FORMAT = 1
+DEFAULT_MODELS = ['tiny', 'center_cancel', 'spectral_mask', 'htdemucs']
+
+
+class TinySeparator(torch.nn.Module):
+    """Small untrained convolutional model with the interface apply_model expects"""
+
+    def __init__(self, sources=('drums', 'bass', 'other', 'vocals'), audio_channels=2,
+                 samplerate=44100, hidden=16, segment=7.8):
+        super().__init__()
+        self.sources = list(sources)
+        self.audio_channels = audio_channels
+        self.samplerate = samplerate
+        self.segment = segment
+        self.encoder = torch.nn.Conv1d(audio_channels, hidden, 8, stride=4, padding=2)
+        self.decoder = torch.nn.ConvTranspose1d(
+            hidden, audio_channels * len(self.sources), 8, stride=4, padding=2
+        )
+
+    def forward(self, mix):
+        batch, channels, length = mix.shape
+        out = fit_length(self.decoder(torch.relu(self.encoder(mix))), length)
+        return out.view(batch, len(self.sources), channels, length)
+
+
+def synthesize_song(seconds, channels=2, frame_rate=44100, seed=0):
+    """Deterministic test song as a 16-bit AudioSegment"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * frame_rate)) / frame_rate
+
+    bass = 0.2 * np.sin(2 * np.pi * 55 * t)
+    # Harmonic stack with vibrato, switched on and off every four seconds like a vocal line
+    f0 = 220 * (1 + 0.01 * np.sin(2 * np.pi * 5 * t))
+    phase = 2 * np.pi * np.cumsum(f0) / frame_rate
+    voice = sum(0.15 / k * np.sin(k * phase) for k in range(1, 6)) * (np.sin(2 * np.pi * t / 8) > 0)
+    # Decaying noise burst every half second
+    envelope = np.exp(-(t % 0.5) * 30)
+
+    mix = np.empty((len(t), channels), dtype=np.float32)
+    for channel in range(channels):
+        drums = 0.1 * rng.standard_normal(len(t)) * envelope
+        mix[:, channel] = bass + voice + drums
+    np.clip(mix, -1, 1, out=mix)
+
+    pcm = (mix * 32767).astype(np.int16)
+    return AudioSegment(data=pcm.tobytes(), sample_width=2, frame_rate=frame_rate, channels=channels)
+
+
+def make_sections(seconds, count, length, frame_rate):
+    """`count` evenly spaced sections of `length` seconds, as sample frames"""
+    spacing = seconds / count
+    length = min(length, spacing)
+    return [
+        (seconds_to_frames(idx * spacing, frame_rate), seconds_to_frames(idx * spacing + length, frame_rate))
+        for idx in range(count)
+    ]
+
+
+def section_windows(sections, context_frames, total_frames):
+    """Each section with up to `context_frames` on both sides, like jobs separate them"""
+    return [
+        (max(0, start - context_frames), min(total_frames, end + context_frames))
+        for start, end in sections
+    ]
+
+
+def render_output(song, sections, windows, instrumentals, settings, path):
+    """Assemble and encode an output the way jobs do, through SongOutput and its StreamingEncoder"""
+    output = SongOutput(song, path, settings)
+    for (start, end), (window_start, window_end), instrumental in zip(sections, windows, instrumentals):
+        output.add_section(start, end, start - window_start, window_end - end, instrumental)
+    output.close()
+
+
+def load_model(name, frame_rate, channels):
+    if name == 'tiny':
+        torch.manual_seed(0)
+        return TinySeparator(audio_channels=channels, samplerate=frame_rate)
+    return model_registry.get(name)
+
+
+def timed(runs, func):
+    """Median wall time of `runs` calls, the individual times and the last result"""
+    times = []
+    result = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), times, result
+
+
+def environment():
+    info = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': cpu_count(),
+        'torch': torch.__version__,
+        'numpy': np.__version__,
+    }
+    try:
+        info['git'] = subprocess.run(
+            ['git', 'describe', '--always', '--dirty'], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        info['git'] = None
+    return info
+
+
+def run_model_stages(model_name, args, settings, song, sections, windows, clips, scratch_dir, record):
+    model = load_model(model_name, args.frame_rate, args.channels)
+
+    # No cache keys, so every run really separates
+    median, runs, instrumentals = timed(
+        args.repeat, lambda: separate_instrumentals(model, clips, [None] * len(clips), settings)
+    )
+    record('separate', model_name, median, runs)
+
+    # WAV needs no real encoding, so this is mostly the assembly and its crossfades
+    wav_settings = PerformanceSettings.from_dict(dict(settings.to_dict(), output_format='wav'))
+    median, runs, _ = timed(args.repeat, lambda: render_output(
+        song, sections, windows, instrumentals, wav_settings, os.path.join(scratch_dir, 'assembled.wav')
+    ))
+    record('assemble', model_name, median, runs)
+
+    export_path = os.path.join(scratch_dir, f"output.{output_extension(settings.output_format)}")
+    median, runs, _ = timed(args.repeat, lambda: render_output(
+        song, sections, windows, instrumentals, settings, export_path
+    ))
+    record('export', model_name, median, runs)
+
+
+def run_benchmark(args, settings, report=print):
+    settings.apply_torch_threads()
+    results = []
+    skipped = {}
+
+    def record(stage, model, median, runs):
+        rtf = median / args.seconds
+        results.append({
+            'stage': stage,
+            'model': model,
+            'seconds': round(median, 4),
+            'runs': [round(run, 4) for run in runs],
+            'rtf': round(rtf, 5),
+        })
+        label = f"{stage} ({model})" if model else stage
+        report(f"{label:<28} {median:9.3f} s   RTF {rtf:.4f}")
+
+    scratch_dir = tempfile.mkdtemp(prefix='benchmark_')
+    try:
+        song_path = os.path.join(scratch_dir, 'signal.wav')
+        synthesize_song(args.seconds, args.channels, args.frame_rate).export(song_path, format='wav')
+        sections = make_sections(args.seconds, args.sections, args.section_seconds, args.frame_rate)
+
+        # Decode the whole file, as jobs do before assembling the output
+        songs = []
+
+        def load():
+            song = load_song(song_path)
+            songs.append(song)
+            song.wait()
+            return song
+        try:
+            median, runs, song = timed(args.repeat, load)
+            record('load', None, median, runs)
+
+            windows = section_windows(
+                sections, int(settings.context_seconds * args.frame_rate), int(song.frame_count())
+            )
+            median, runs, clips = timed(
+                args.repeat, lambda: [song.get_sample_slice(start, end) for start, end in windows]
+            )
+            record('slice', None, median, runs)
+
+            for model_name in args.models:
+                try:
+                    run_model_stages(
+                        model_name, args, settings, song, sections, windows, clips, scratch_dir, record
+                    )
+                except Exception as e:
+                    # e.g. htdemucs not downloaded, or a channel count it can't handle
+                    skipped[model_name] = f"{type(e).__name__}: {e}"
+                    report(f"Skipping {model_name}: {skipped[model_name]}")
+        finally:
+            for song in songs:
+                song.close()
+    finally:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+
+    return {
+        'benchmark': BENCHMARK_FORMAT,
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'environment': environment(),
+        'signal': {
+            'seconds': args.seconds,
+            'channels': args.channels,
+            'frame_rate': args.frame_rate,
+            'sections': args.sections,
+            'section_seconds': args.section_seconds,
+        },
+        'repeat': args.repeat,
+        'settings': settings.to_dict(),
+        'results': results,
+        'skipped': skipped,
+    }
+
+
+def compare(current, previous, max_regression=None, report=print):
+    """Print the change of each stage against an earlier run; returns the number of regressions"""
+    before = {(result['stage'], result['model']): result for result in previous['results']}
+    if current['signal'] != previous['signal']:
+        report("Warning: the runs used different test signals, RTFs are still comparable")
+
+    regressions = 0
+    for result in current['results']:
+        old = before.get((result['stage'], result['model']))
+        if old is None or not old['rtf']:
+            continue
+        change = 100.0 * (result['rtf'] - old['rtf']) / old['rtf']
+        label = f"{result['stage']} ({result['model']})" if result['model'] else result['stage']
+        flag = ""
+        if max_regression is not None and change > max_regression:
+            regressions += 1
+            flag = "  REGRESSION"
+        report(f"{label:<28} RTF {old['rtf']:.4f} -> {result['rtf']:.4f} ({change:+.1f}%){flag}")
+    return regressions
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Benchmark loading, separation, assembly and export on synthesized audio."
+    )
+    parser.add_argument("--seconds", type=float, default=120.0, help="Length of the test song")
+    parser.add_argument("--channels", type=int, default=2, help="Channels of the test song")
+    parser.add_argument("--frame-rate", type=int, default=44100, help="Sample rate of the test song")
+    parser.add_argument("--sections", type=int, default=4, help="Number of sections to separate")
+    parser.add_argument(
+        "--section-seconds", type=float, default=15.0, help="Length of each section"
+    )
+    parser.add_argument(
+        "--models", nargs="+", default=DEFAULT_MODELS,
+        help="Models to run ('tiny' is the built-in stand-in; others load like in jobs)"
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per stage (median is kept)")
+    parser.add_argument(
+        "-o", "--output",
+        help="Where to save the JSON results (default: benchmarks/benchmark_<timestamp>.json)"
+    )
+    parser.add_argument("--compare", help="Earlier results JSON to compare against")
+    parser.add_argument(
+        "--max-regression", type=float,
+        help="With --compare, exit with an error if any stage's RTF grew by more than this percent"
+    )
+    add_performance_arguments(parser)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.seconds <= 0 or args.sections < 1 or args.repeat < 1:
+        parser.error("--seconds, --sections and --repeat must be positive")
+
+    settings = build_settings(args)
+    results = run_benchmark(args, settings)
+
+    output = args.output or os.path.join(
+        'benchmarks', f"benchmark_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+        if compare(results, previous, args.max_regression):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,373 @@
+"""Headless command-line entry point for processing songs without the GUI
+
+Examples:
+    python cli.py song.mp3 -s 0:30-1:05 -s 2:10-2:45
+    python cli.py --manifest batch.json
+    python cli.py --manifest batch.csv --output renders
+    python cli.py album/*.flac --detect-vocals
+    python cli.py album/*.flac --detect-vocals --detect-only > sections.json
+    python cli.py song.mp3 -s 0:30-1:05 --format flac
+    python cli.py song.mp3 -s 0:30-1:05 --stems song
+
+A JSON manifest is a list of {"file": ..., "sections": [[start, end], ...]}
+entries. A CSV manifest has one section per row with file, start and end
+columns. Times are seconds or MM:SS / HH:MM:SS, optionally with decimals.
+
+With --detect-vocals, files given without sections (and JSON manifest
+entries without "sections") get their vocal sections detected
+automatically. --detect-only prints the detected sections as a JSON
+manifest for review instead of processing, which can be edited and passed
+back with --manifest.
+
+With --json, status messages and chunk-level progress (throughput and
+ETAs) are printed as one JSON object per line instead of plain text.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+
+import paths
+from encoder import OUTPUT_FORMATS
+from engine import load_song, process_song, process_songs
+from model_registry import DEFAULT_MODEL
+from separators import BACKENDS
+from settings import PerformanceSettings, SETTINGS_PATH
+from stem_export import STEM_MODES
+from utils import frames_to_seconds, parse_time, seconds_to_frames
+from vocal_detection import DetectionOptions, detect_song_sections
+
+
+def parse_section(text):
+    """Parse a START-END section argument into a (start, end) tuple of seconds"""
+    try:
+        start_text, end_text = text.split("-")
+        start, end = parse_time(start_text), parse_time(end_text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid section {text!r}, expected START-END")
+    if end <= start:
+        raise argparse.ArgumentTypeError(f"Invalid section {text!r}, end must be after start")
+    return (start, end)
+
+
+def section_from_values(start, end):
+    """A (start, end) section in seconds from two time values (numbers or time strings)"""
+    start = parse_time(str(start))
+    end = parse_time(str(end))
+    if end <= start:
+        raise ValueError(f"Section end must be after start: {start} to {end}")
+    return (start, end)
+
+
+def load_manifest(manifest_path):
+    """Read a JSON or CSV manifest into a list of (file, sections) jobs"""
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    jobs = {}
+
+    if manifest_path.lower().endswith(".csv"):
+        with open(manifest_path, newline="") as f:
+            for row in csv.DictReader(f):
+                jobs.setdefault(row["file"], []).append(
+                    section_from_values(row["start"], row["end"])
+                )
+    else:
+        with open(manifest_path) as f:
+            entries = json.load(f)
+        for entry in entries:
+            sections = jobs.setdefault(entry["file"], [])
+            # Entries without sections are left for --detect-vocals
+            for start, end in entry.get("sections", []):
+                sections.append(section_from_values(start, end))
+
+    # Relative song paths are resolved against the manifest's folder
+    return [
+        (file_path if os.path.isabs(file_path) else os.path.join(base_dir, file_path), sections)
+        for file_path, sections in jobs.items()
+    ]
+
+
+def build_settings(args):
+    """Load the settings file and apply any command-line overrides"""
+    settings = PerformanceSettings.load(args.config)
+    for field in PerformanceSettings.FIELDS:
+        value = getattr(args, field, None)
+        if value is not None:
+            setattr(settings, field, value)
+    return settings
+
+
+def json_reporters(file_path=None):
+    """Status and progress callbacks that print JSON lines"""
+    def emit(event):
+        if file_path is not None:
+            event['file'] = file_path
+        print(json.dumps(event), flush=True)
+
+    def report(message):
+        emit({'event': 'status', 'message': message})
+
+    def report_progress(progress):
+        emit(dict(progress, event='progress'))
+
+    return report, report_progress
+
+
+def _reporters(args, file_path=None):
+    if args.json:
+        return json_reporters(file_path)
+    if args.quiet:
+        return (lambda message: None), None
+    return print, None
+
+
+def detection_options(args):
+    return DetectionOptions(
+        merge_gap_seconds=args.merge_gap, min_length_seconds=args.min_section
+    )
+
+
+def frame_sections(song, sections):
+    """Sections given in seconds as (start, end) sample frames of the song
+
+    Times are only converted here, once the song's sample rate is known;
+    the engine works in whole frames from then on.
+    """
+    frames = [
+        (seconds_to_frames(start, song.frame_rate), seconds_to_frames(end, song.frame_rate))
+        for start, end in sections
+    ]
+    # Sections shorter than half a frame round to nothing
+    return [(start, end) for start, end in frames if end > start]
+
+
+def _sections_for(song, file_path, sections, args, report):
+    """The given sections, or detected ones when there are none and detection is on, in frames"""
+    if sections or not args.detect_vocals:
+        return frame_sections(song, sections)
+    report(f"Detecting vocal sections in {file_path}...")
+    sections = detect_song_sections(song, file_path, detection_options(args))
+    report(f"Detected {len(sections)} vocal section(s) in {file_path}")
+    return sections
+
+
+def _detect_only(jobs, args):
+    """Print a JSON manifest of the given and detected sections"""
+    report = (lambda message: None) if args.quiet else (lambda message: print(message, file=sys.stderr))
+    manifest = []
+    failures = 0
+    for file_path, sections in jobs:
+        song = None
+        try:
+            song = load_song(file_path)
+            sections = _sections_for(song, file_path, sections, args, report)
+            # Six decimals convert back to exactly the same frames
+            manifest.append({
+                'file': os.path.abspath(file_path),
+                'sections': [
+                    [round(frames_to_seconds(start, song.frame_rate), 6),
+                     round(frames_to_seconds(end, song.frame_rate), 6)]
+                    for start, end in sections
+                ],
+            })
+        except Exception as e:
+            failures += 1
+            print(f"Error analyzing {file_path}: {e}", file=sys.stderr)
+        finally:
+            if song is not None:
+                song.close()
+    print(json.dumps(manifest, indent=2))
+    return 1 if failures else 0
+
+
+def _run_batched(jobs, args, settings):
+    report, report_progress = _reporters(args)
+    loaded = []
+    failures = 0
+    for file_path, sections in jobs:
+        song = None
+        try:
+            report(f"Loading {file_path}...")
+            song = load_song(file_path)
+            sections = _sections_for(song, file_path, sections, args, report)
+        except Exception as e:
+            failures += 1
+            print(f"Error loading {file_path}: {e}", file=sys.stderr)
+            if song is not None:
+                song.close()
+            continue
+        if not sections:
+            report(f"No vocal sections found in {file_path}, skipping")
+            song.close()
+            continue
+        loaded.append((song, sections, file_path))
+
+    if loaded:
+        try:
+            process_songs(
+                loaded, report, output_root=args.output, model_name=args.model,
+                settings=settings, progress_callback=report_progress
+            )
+        except Exception as e:
+            failures += len(loaded)
+            print(f"Error processing batch: {e}", file=sys.stderr)
+        finally:
+            for song, _, _ in loaded:
+                song.close()
+
+    return 1 if failures else 0
+
+
+def add_performance_arguments(parser):
+    """Settings file and performance override options, shared with benchmark.py"""
+    parser.add_argument(
+        "--config", default=SETTINGS_PATH,
+        help="Performance settings file (the GUI saves to the same default path)"
+    )
+    performance = parser.add_argument_group("performance overrides")
+    performance.add_argument("--threads", type=int, help="Intra-op torch threads")
+    performance.add_argument("--interop-threads", type=int, help="Inter-op torch threads")
+    performance.add_argument("--workers", type=int, help="Segment-parallel worker threads")
+    performance.add_argument("--segment", type=float, help="Chunk length in seconds")
+    performance.add_argument("--overlap", type=float, help="Overlap between chunks (0-1)")
+    performance.add_argument("--shifts", type=int, help="Random shifts averaged per chunk")
+    performance.add_argument(
+        "--batch-size", type=int, help="Sections separated together in one model call"
+    )
+    performance.add_argument(
+        "--context-seconds", type=float, help="Audio separated on each side of a section for context"
+    )
+    performance.add_argument(
+        "--crossfade-ms", type=float, help="Crossfade at each splice in the output (0 for hard cuts)"
+    )
+    output = parser.add_argument_group("output")
+    output.add_argument(
+        "--format", dest="output_format", choices=sorted(OUTPUT_FORMATS),
+        help="Output file format (default: mp3)"
+    )
+    output.add_argument(
+        "--bitrate", dest="output_bitrate_kbps", type=int, metavar="KBPS",
+        help="Bitrate of mp3 and opus output (default: the encoder's)"
+    )
+    output.add_argument(
+        "--stems", dest="stem_export", choices=STEM_MODES,
+        help="Also save every separated stem with a manifest, for the sections or the whole song"
+    )
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Remove vocals from sections of songs without opening the GUI."
+    )
+    parser.add_argument(
+        "files", nargs="*", metavar="file",
+        help="Audio file(s) to process (several only with --detect-vocals)"
+    )
+    parser.add_argument(
+        "-s", "--section", action="append", type=parse_section, default=[],
+        metavar="START-END", help="Section to remove vocals from (repeatable)"
+    )
+    parser.add_argument("-m", "--manifest", help="JSON or CSV manifest covering many files")
+    parser.add_argument(
+        "-o", "--output", default=paths.output_root,
+        help="Folder that receives the <name>_<timestamp> result folders"
+    )
+    parser.add_argument(
+        "--model", default=DEFAULT_MODEL,
+        help=f"Demucs model, or a fast DSP backend: {', '.join(BACKENDS)} (default: {DEFAULT_MODEL})"
+    )
+    add_performance_arguments(parser)
+    parser.add_argument(
+        "--batch-across-files", action="store_true",
+        help="Batch sections from all files together (keeps every song in memory)"
+    )
+    parser.add_argument(
+        "--trace", dest="write_trace", action="store_true", default=None,
+        help="Also write a Chrome trace (trace.json) next to each performance report"
+    )
+    detection = parser.add_argument_group("vocal detection")
+    detection.add_argument(
+        "--detect-vocals", action="store_true",
+        help="Detect the vocal sections of files that have none given"
+    )
+    detection.add_argument(
+        "--detect-only", action="store_true",
+        help="Print the detected sections as a JSON manifest instead of processing"
+    )
+    detection.add_argument(
+        "--min-section", type=float, default=DetectionOptions().min_length_seconds,
+        help="Shortest detected section to keep, in seconds"
+    )
+    detection.add_argument(
+        "--merge-gap", type=float, default=DetectionOptions().merge_gap_seconds,
+        help="Join detected sections closer together than this many seconds"
+    )
+    parser.add_argument("-q", "--quiet", action="store_true", help="Only print errors")
+    parser.add_argument(
+        "--json", action="store_true",
+        help="Print status and progress (throughput, ETA) as JSON lines"
+    )
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    if args.detect_only:
+        args.detect_vocals = True
+
+    jobs = []
+    if args.files:
+        if args.section and len(args.files) > 1:
+            parser.error("--section can only be used with a single file")
+        if not args.section and not args.detect_vocals:
+            parser.error("at least one --section (or --detect-vocals) is required when a file is given")
+        jobs.extend((file_path, list(args.section)) for file_path in args.files)
+    if args.manifest:
+        try:
+            jobs.extend(load_manifest(args.manifest))
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            parser.error(f"could not read manifest {args.manifest}: {e}")
+    if not jobs:
+        parser.error("nothing to do, give a file with --section or a --manifest")
+    if not args.detect_vocals and any(not sections for _, sections in jobs):
+        parser.error("some files have no sections; add them or use --detect-vocals")
+
+    if args.detect_only:
+        return _detect_only(jobs, args)
+
+    os.makedirs(args.output, exist_ok=True)
+    settings = build_settings(args)
+
+    if args.batch_across_files:
+        return _run_batched(jobs, args, settings)
+
+    failures = 0
+    for file_path, sections in jobs:
+        song = None
+        report, report_progress = _reporters(args, file_path)
+        try:
+            report(f"Loading {file_path}...")
+            song = load_song(file_path)
+            sections = _sections_for(song, file_path, sections, args, report)
+            if not sections:
+                report(f"No vocal sections found in {file_path}, skipping")
+                continue
+            process_song(
+                song, sections, file_path, report,
+                output_root=args.output, model_name=args.model, settings=settings,
+                progress_callback=report_progress
+            )
+        except Exception as e:
+            failures += 1
+            print(f"Error processing {file_path}: {e}", file=sys.stderr)
+        finally:
+            if song is not None:
+                song.close()
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
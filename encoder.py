@@ -0,0 +1,125 @@
+import queue
+import threading
+import subprocess
+
+from pydub import AudioSegment
+
+# ffmpeg arguments and file extension for each output format
+OUTPUT_FORMATS = {
+    'mp3': {'extension': 'mp3', 'codec': ['-c:a', 'libmp3lame'], 'bitrate': True},
+    'opus': {
+        # libopus only runs at 48 kHz (and a few lower rates)
+        'extension': 'opus', 'codec': ['-c:a', 'libopus', '-ar', '48000'], 'bitrate': True,
+    },
+    'flac': {'extension': 'flac', 'codec': ['-c:a', 'flac'], 'bitrate': False},
+    'wav': {'extension': 'wav', 'codec': None, 'bitrate': False},
+}
+DEFAULT_FORMAT = 'mp3'
+
+# Raw PCM formats ffmpeg reads from the pipe, by sample width
+PCM_FORMATS = {2: 's16le', 4: 's32le'}
+
+# Pieces waiting for the encoder; writers block when it falls this far behind
+QUEUE_PIECES = 16
+
+
+def output_extension(output_format):
+    return OUTPUT_FORMATS[output_format]['extension']
+
+
+class EncoderError(Exception):
+    """ffmpeg failed to encode the output"""
+
+
+class StreamingEncoder:
+    """Encodes raw PCM to an audio file while it is still being produced
+
+    Pieces passed to `write` are queued and fed to an ffmpeg process by a
+    background thread, so encoding runs alongside separation instead of
+    after it. The queue is bounded, so a slow encoder holds back the
+    producer rather than letting finished audio pile up in memory.
+    `bitrate` (e.g. "192k") applies to lossy formats; None keeps ffmpeg's
+    default.
+    """
+
+    def __init__(self, path, frame_rate, channels, sample_width, output_format=DEFAULT_FORMAT,
+                 bitrate=None):
+        spec = OUTPUT_FORMATS[output_format]
+        pcm_format = PCM_FORMATS[sample_width]
+        codec = spec['codec'] or ['-c:a', f"pcm_{pcm_format}"]
+        command = [
+            AudioSegment.converter, '-nostdin', '-v', 'error', '-y',
+            '-f', pcm_format, '-ar', str(frame_rate), '-ac', str(channels), '-i', 'pipe:0',
+        ] + codec
+        if bitrate and spec['bitrate']:
+            command += ['-b:a', str(bitrate)]
+        # The container follows from the file extension
+        command.append(path)
+
+        self.path = path
+        self.frames_written = 0
+        self.frame_width = sample_width * channels
+        self._process = subprocess.Popen(
+            command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+        )
+        self._queue = queue.Queue(QUEUE_PIECES)
+        self._error = None
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+
+    def _write_loop(self):
+        while True:
+            data = self._queue.get()
+            if data is None:
+                break
+            if self._error is not None:
+                # Keep draining so producers never block on a dead encoder
+                continue
+            try:
+                self._process.stdin.write(data)
+            except (OSError, ValueError) as e:
+                self._error = e
+
+    def write(self, data):
+        """Queue a bytes-like piece of PCM in the song's format"""
+        size = memoryview(data).nbytes
+        if size == 0:
+            return
+        self.frames_written += size // self.frame_width
+        self._queue.put(data)
+
+    def close(self):
+        """Wait for everything queued to be encoded and the file to be finished"""
+        self._queue.put(None)
+        self._writer.join()
+        try:
+            self._process.stdin.close()
+        except OSError:
+            pass
+        stderr = self._process.stderr.read()
+        if self._process.wait() != 0 or self._error is not None:
+            message = stderr.decode(errors='replace').strip() or str(self._error)
+            raise EncoderError(f"Encoding {self.path} failed: {message}")
+
+    def abort(self):
+        """Stop encoding and leave the unfinished file to be deleted"""
+        self._error = self._error or EncoderError("aborted")
+        if self._process.poll() is None:
+            self._process.kill()
+        self._queue.put(None)
+        self._writer.join(timeout=5)
+        self._process.wait()
+
+
+def encode_segment(segment, path, output_format=DEFAULT_FORMAT, bitrate=None):
+    """Encode a whole AudioSegment with the same encoder settings as jobs use"""
+    encoder = StreamingEncoder(
+        path, segment.frame_rate, segment.channels, segment.sample_width, output_format, bitrate
+    )
+    try:
+        encoder.write(segment.raw_data)
+    except BaseException:
+        encoder.abort()
+        raise
+    encoder.close()
+    return path
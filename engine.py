@@ -0,0 +1,684 @@
+import os
+import shutil
+import uuid
+import datetime
+import functools
+
+import paths
+import tracing
+
+from assembly import OutputAssembler, linear_fades
+from audio_source import AudioSource
+from encoder import StreamingEncoder, output_extension
+from model_registry import model_registry, DEFAULT_MODEL
+from progress import JobProgress
+from section_index import merge_sections
+from separation import JobCancelled, check_cancelled, instrumental_from_sources, separate_batch
+from settings import load_settings
+from stem_export import StemExport
+from stem_cache import stem_cache
+from tensor_io import ModelRateSong, conversion_path, segment_to_model_input, model_output_to_segment
+from tracing import Tracer
+from utils import format_time, frames_to_seconds
+
+# Sections are separated (and cached) in chunks on a fixed grid of the song, shared
+# with the background pre-separation, so moving a section's boundary only separates
+# the chunks it didn't cover before
+CHUNK_SECONDS = 10.0
+# Neighbouring chunks are crossfaded over this much of their context, centered on the
+# boundary between them, so the model's output never jumps from one chunk to the next
+CHUNK_CROSSFADE_SECONDS = 0.5
+
+
+def load_song(file_path):
+    """Open an audio file as a lazily decoded AudioSource (call close() when done)"""
+    return AudioSource(file_path)
+
+
+def make_output_dir(song_path, output_root=paths.output_root):
+    """Create the timestamped output folder for a song"""
+    # Get original filename without extension
+    base_filename = os.path.splitext(os.path.basename(song_path))[0]
+    # Create timestamp
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    # Combine filename and timestamp for output directory
+    output_dir = os.path.join(output_root, f"{base_filename}_{timestamp}")
+    # Jobs for the same song started in the same second get their own folder
+    suffix = 2
+    while True:
+        try:
+            os.makedirs(output_dir)
+            return output_dir
+        except FileExistsError:
+            output_dir = os.path.join(output_root, f"{base_filename}_{timestamp}_{suffix}")
+            suffix += 1
+
+
+def write_section_info(output_dir, sections, song_path, frame_rate):
+    """Write the section_info.txt summary next to the output"""
+    info_path = os.path.join(output_dir, "section_info.txt")
+    with open(info_path, "w") as f:
+        f.write("Vocal Removal Sections:\n\n")
+        for idx, (start_frame, end_frame) in enumerate(sections, 1):
+            start_time = frames_to_seconds(start_frame, frame_rate)
+            end_time = frames_to_seconds(end_frame, frame_rate)
+            f.write(
+                f"Section {idx}: {format_time(start_time)} to {format_time(end_time)}"
+                f" (frames {start_frame} to {end_frame})\n"
+            )
+        f.write(f"\nOriginal file: {os.path.basename(song_path)}\n")
+        f.write(f"Processed on: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+    return info_path
+
+
+def separate_sources(model, clips, keys, settings, status_callback=None, cancel_event=None,
+                     pool=None, progress_callback=None, model_inputs=None):
+    """Model-rate sources for each clip, separating only those missing from the stem cache
+
+    With a SeparationPool, `model` is its ModelInfo and separation runs in
+    a worker process. `model_inputs` can give a function per clip that
+    returns its model input ready-made (e.g. a ModelRateSong window);
+    clips without one are converted here.
+    """
+    report = status_callback or (lambda message: None)
+
+    with tracing.stage('cache_lookup', sections=len(keys)):
+        results = [stem_cache.get(key) if key else None for key in keys]
+    missing = [idx for idx, sources in enumerate(results) if sources is None]
+    if len(missing) < len(clips):
+        report(f"Reusing {len(clips) - len(missing)} cached sections...")
+
+    if missing:
+        # Convert the pydub samples straight to model-rate tensors (no temp files or ffmpeg)
+        with tracing.stage('model_input', sections=len(missing)):
+            wavs = [
+                model_inputs[idx]() if model_inputs and model_inputs[idx]
+                else segment_to_model_input(clips[idx], model)
+                for idx in missing
+            ]
+        if pool is not None:
+            separated = pool.separate(
+                model, wavs, settings, settings.batch_size, report, cancel_event, progress_callback
+            )
+        else:
+            with tracing.stage('separate', sections=len(wavs)):
+                separated = separate_batch(
+                    model, wavs, settings.batch_size, report, cancel_event, progress_callback,
+                    **settings.apply_model_kwargs(model)
+                )
+        with tracing.stage('cache_store', sections=len(missing)):
+            for idx, sources in zip(missing, separated):
+                if keys[idx]:
+                    stem_cache.put(keys[idx], sources)
+                results[idx] = sources
+
+    return results
+
+
+def separate_instrumentals(model, clips, keys, settings, status_callback=None, cancel_event=None,
+                           pool=None, progress_callback=None, model_inputs=None):
+    """Return an instrumental AudioSegment for each clip"""
+    separated = separate_sources(
+        model, clips, keys, settings, status_callback, cancel_event, pool, progress_callback,
+        model_inputs
+    )
+
+    # Convert back to each clip's own format and length so concatenation needs no resync
+    with tracing.stage('model_output', sections=len(clips)):
+        return [
+            model_output_to_segment(
+                instrumental_from_sources(sources, model), model, clip, int(clip.frame_count())
+            )
+            for sources, clip in zip(separated, clips)
+        ]
+
+
+def separate_stems(model, clips, keys, settings, status_callback=None, cancel_event=None,
+                   pool=None, progress_callback=None, model_inputs=None):
+    """Return (instrumental, {source name: stem}) AudioSegments for each clip from one separation"""
+    separated = separate_sources(
+        model, clips, keys, settings, status_callback, cancel_event, pool, progress_callback,
+        model_inputs
+    )
+
+    with tracing.stage('model_output', sections=len(clips), stems=True):
+        results = []
+        for sources, clip in zip(separated, clips):
+            frames = int(clip.frame_count())
+            instrumental = model_output_to_segment(
+                instrumental_from_sources(sources, model), model, clip, frames
+            )
+            stems = {
+                name: model_output_to_segment(sources[..., idx, :, :], model, clip, frames)
+                for idx, name in enumerate(model.sources)
+            }
+            results.append((instrumental, stems))
+        return results
+
+
+def describe_conversion(song, model):
+    """The conversion path between a song and the model, for the performance report"""
+    path = conversion_path(song.frame_rate, song.channels, model)
+    return {
+        'path': path,
+        'song_rate': song.frame_rate,
+        'model_rate': model.samplerate,
+        'song_channels': song.channels,
+        'model_channels': model.audio_channels,
+        # Whole-song resampling happens once per file; results are converted back per section
+        'resampled': 'once per file' if path == 'resample' else 'never',
+    }
+
+
+def trim_segment(segment, start_frame, end_frame):
+    """Frames start:end of a segment, without copying when that is all of it"""
+    if start_frame == 0 and end_frame == int(segment.frame_count()):
+        return segment
+    return segment.get_sample_slice(start_frame, end_frame)
+
+
+def grid_chunk(song, index, chunk_frames, context_frames):
+    """One chunk of a song's separation grid, with up to `context_frames` of context on each side
+
+    Returns the padded clip and its (padded start, chunk start, chunk end)
+    frames, clamped to the song, or None if the chunk starts past its end.
+    """
+    chunk_start = index * chunk_frames
+    padded_start = max(0, chunk_start - context_frames)
+    clip = song.get_sample_slice(padded_start, chunk_start + chunk_frames + context_frames)
+    padded_end = padded_start + int(clip.frame_count())
+    if padded_end <= chunk_start:
+        return None
+    return clip, padded_start, chunk_start, min(chunk_start + chunk_frames, padded_end)
+
+
+def chunk_piece(segment, clip_start, piece_start, piece_end, head=0, tail=0):
+    """Song frames piece_start:piece_end of a separated clip that starts at clip_start
+
+    Up to `head` and `tail` frames of the clip around them come along
+    for crossfading into the neighbouring chunks. Returns the segment and
+    the head and tail frames it actually has, for join_chunks.
+    """
+    lo = piece_start - clip_start
+    hi = piece_end - clip_start
+    head = max(0, min(head, lo))
+    tail = max(0, min(tail, int(segment.frame_count()) - hi))
+    return trim_segment(segment, lo - head, hi + tail), head, tail
+
+
+def join_chunks(pieces, crossfade_frames):
+    """Join consecutive pieces of grid chunks (see chunk_piece) into one AudioSegment
+
+    Each boundary between two chunks gets a linear crossfade centered on
+    it, made from their handles, so the result is exactly as long as the
+    pieces without them. Both chunks estimate the same audio there, so
+    their gains sum to 1 rather than keeping their power.
+    """
+    if len(pieces) == 1:
+        segment, head, tail = pieces[0]
+        return trim_segment(segment, head, int(segment.frame_count()) - tail)
+    assembler = OutputAssembler(pieces[0][0], crossfade_frames, fades=linear_fades)
+    for segment, head, tail in pieces:
+        assembler.add_segment(segment, head, tail)
+    return assembler.build()
+
+
+def add_section(assembler, last_end_frame, start_frame, end_frame, instrumental, head=0, tail=0):
+    """Add the song up to a section, the section with vocals, then its instrumental"""
+    # Add the part before the section if necessary
+    if start_frame > last_end_frame:
+        assembler.add_range(last_end_frame, start_frame)
+
+    # First add the section with vocals (original)
+    assembler.add_range(start_frame, end_frame)
+
+    # Then add the same section without vocals (instrumental)
+    assembler.add_segment(instrumental, head, tail)
+
+
+def output_frame_count(sections, total_frames):
+    """Exact length of an output: the whole song plus every section once more"""
+    return total_frames + sum(end - start for start, end in sections)
+
+
+class SongOutput:
+    """A song's output file, encoded section by section as instrumentals become ready
+
+    Sections are added in song order: once the instrumentals of the next
+    sections are known, flush() hands everything up to them to a
+    StreamingEncoder, so encoding overlaps with the separation of later
+    sections and finished audio doesn't stay in memory. The file is
+    written to `scratch_path` until close() finishes it.
+    """
+
+    def __init__(self, song, scratch_path, settings):
+        self.song = song
+        self.scratch_path = scratch_path
+        self.settings = settings
+        # (start_frame, end_frame, head, tail) of each section, and its instrumental once separated
+        self.sections = []
+        self.instrumentals = []
+        self.next_section = 0
+        self.last_end_frame = 0
+        self.encoder = None
+        self.assembler = None
+        self.finished = False
+
+    def add_section(self, start_frame, end_frame, head, tail, instrumental=None):
+        self.sections.append((start_frame, end_frame, head, tail))
+        self.instrumentals.append(instrumental)
+        return len(self.sections) - 1
+
+    def set_instrumental(self, idx, instrumental):
+        self.instrumentals[idx] = instrumental
+
+    def flush(self):
+        """Encode every section whose instrumental (and all before it) is ready"""
+        if self.finished:
+            return
+        if self.next_section < len(self.sections) and self.instrumentals[self.next_section] is None:
+            return
+        if self.encoder is None:
+            song = self.song
+            self.encoder = StreamingEncoder(
+                self.scratch_path, song.frame_rate, song.channels, song.sample_width,
+                self.settings.output_format, self.settings.encoder_bitrate()
+            )
+            crossfade_frames = int(self.settings.crossfade_ms * song.frame_rate / 1000)
+            # Copies straight out of the decoded song, so this waits for decoding to finish
+            self.assembler = OutputAssembler(song, crossfade_frames, write=self.encoder.write)
+
+        while self.next_section < len(self.sections):
+            instrumental = self.instrumentals[self.next_section]
+            if instrumental is None:
+                return
+            start_frame, end_frame, head, tail = self.sections[self.next_section]
+            add_section(
+                self.assembler, self.last_end_frame, start_frame, end_frame, instrumental, head, tail
+            )
+            # The assembler has its own copy of the samples
+            self.instrumentals[self.next_section] = None
+            self.last_end_frame = end_frame
+            self.next_section += 1
+
+        # Add the remaining part of the song after the last section
+        self.assembler.add_range(self.last_end_frame, int(self.song.frame_count()))
+        self.assembler.finish()
+        self.finished = True
+
+    def close(self):
+        """Wait for the encoder to finish the file"""
+        self.flush()
+        expected = output_frame_count(
+            [(start, end) for start, end, _, _ in self.sections], int(self.song.frame_count())
+        )
+        if self.encoder.frames_written != expected:
+            raise RuntimeError(
+                f"Output has {self.encoder.frames_written} frames, expected {expected}"
+            )
+        self.encoder.close()
+
+    def abort(self):
+        if self.encoder is not None:
+            self.encoder.abort()
+        try:
+            os.remove(self.scratch_path)
+        except OSError:
+            pass
+
+
+def write_performance_report(output_dir, song_path, sections, model_name, settings, conversion=None,
+                             batch_songs=1):
+    """Write the active tracer's stage timings (and optional Chrome trace) next to the output
+
+    `conversion` describes how the song was brought to the model's rate
+    and channels (see describe_conversion). When `batch_songs` songs were
+    processed together, the report has this song's own stages plus the
+    shared ones (model loading and separation), which cover the whole batch.
+    """
+    tracer = tracing.current()
+    if tracer is None:
+        return
+    tracer.write_report(
+        output_dir,
+        song_path,
+        song=os.path.basename(song_path),
+        sections=len(sections),
+        batch_songs=batch_songs,
+        model=model_name,
+        settings=settings.to_dict(),
+        conversion=conversion,
+    )
+    if settings.write_trace:
+        tracer.write_chrome_trace(output_dir, song_path)
+
+
+def window_cache_key(content_hash, song, window_start, window_end, model_name, params):
+    """Stem cache key for a separation window, or None when the song has no content hash"""
+    if content_hash is None:
+        return None
+    return stem_cache.make_key(content_hash, window_start, window_end, song.frame_rate, model_name, params)
+
+
+def chunk_cache_key(content_hash, song, padded_start, padded_end, model_name, params):
+    """Stem cache key for a padded chunk of the separation grid (see grid_chunk)"""
+    return window_cache_key(
+        content_hash, song, padded_start, padded_end, model_name, dict(params, context=True)
+    )
+
+
+def process_song(song, sections, song_path, status_callback=None,
+                 output_root=paths.output_root, model_name=DEFAULT_MODEL, settings=None,
+                 preseparator=None, cancel_event=None, scratch_dir=None, pool=None,
+                 progress_callback=None):
+    """Remove vocals from each section of a song and export the result
+
+    `sections` are (start, end) sample frames. Each section is played
+    twice in the output: first with vocals, then as an instrumental.
+    Returns the output directory.
+    """
+    preseparators = {song_path: preseparator} if preseparator else None
+    return process_songs(
+        [(song, sections, song_path)], status_callback, output_root, model_name, settings,
+        preseparators, cancel_event, scratch_dir, pool, progress_callback
+    )[0]
+
+
+def process_songs(jobs, status_callback=None, output_root=paths.output_root,
+                  model_name=DEFAULT_MODEL, settings=None, preseparators=None,
+                  cancel_event=None, scratch_dir=None, pool=None, progress_callback=None):
+    """Process several (song, sections, song_path) jobs, batching all their sections together
+
+    Sections are (start, end) sample frames of their song, so every splice
+    falls on an exact sample and the output length is known in advance
+    (see output_frame_count).
+
+    Performance settings default to the saved config file. `preseparators`
+    maps song paths to PreSeparators whose finished chunks are spliced in
+    instead of separating again. Setting `cancel_event` stops the work at
+    the next checkpoint with JobCancelled. Unfinished output folders are
+    removed when the job is cancelled or fails. Files are rendered in `scratch_dir` (default: the shared temp
+    folder) and moved into place when complete. With a SeparationPool
+    the model runs in its worker processes instead of this one.
+    `progress_callback` receives chunk-level progress dicts with
+    throughput and ETAs while sections are separated. Stage timings and
+    memory use are written to performance.json in each output folder
+    (plus a Chrome trace when the settings ask for one). With
+    `settings.stem_export`, every stem of the separation is also saved
+    under stems/ with a manifest. Returns the output directory of each job.
+    """
+    preseparators = preseparators or {}
+    created_dirs = []
+    for preseparator in preseparators.values():
+        preseparator.pause()
+    try:
+        with Tracer().activate():
+            return _process_songs(
+                jobs, status_callback, output_root, model_name, settings, preseparators,
+                cancel_event, scratch_dir or paths.temp_dir, created_dirs, pool, progress_callback
+            )
+    except BaseException:
+        # Cancelled or failed: only finished outputs are kept
+        for output_dir, complete in created_dirs:
+            if not complete:
+                shutil.rmtree(output_dir, ignore_errors=True)
+        raise
+    finally:
+        for preseparator in preseparators.values():
+            preseparator.resume()
+
+
+def _process_songs(jobs, status_callback, output_root, model_name, settings, preseparators,
+                   cancel_event, scratch_dir, created_dirs, pool, progress_callback):
+    report = status_callback or (lambda message: None)
+    settings = settings or load_settings()
+    settings.apply_torch_threads()
+    model_registry.set_max_resident(settings.max_resident_models)
+    stem_cache.max_bytes = int(settings.stem_cache_mb) * 1024 * 1024
+
+    # Reuse the resident model (warmed in the background by the GUI)
+    report("Loading Demucs model...")
+    with tracing.stage('load_model', model=model_name):
+        if pool is not None:
+            # The weights live in the worker processes; only the metadata is needed here
+            model = pool.model_info(model_name, cancel_event)
+        else:
+            model = model_registry.get(model_name)
+
+    cache_params = settings.cache_params(model)
+    extension = output_extension(settings.output_format)
+    stem_mode = settings.stem_export
+    outputs = []
+    # For each clip that still needs separating (a grid chunk, or a whole song for
+    # song stems): its song's output, the (section index, start, end, window start,
+    # window end) frames of the sections it covers, where their stems go, the frame
+    # the clip starts at and the (start, end) frames of the part it contributes
+    pending = []
+    clips = []
+    keys = []
+    model_inputs = []
+    # (output, section index) -> [clips left, instrumental pieces, {source: stem pieces}]
+    assembling = {}
+    preseparated = 0
+    try:
+        for song, sections, song_path in jobs:
+            preseparator = preseparators.get(song_path)
+            check_cancelled(cancel_event)
+            # Sorted, with overlapping and touching sections merged, so each sample is separated once
+            sections = merge_sections(sections)
+            output_dir = make_output_dir(song_path, output_root)
+            created_dirs.append((output_dir, False))
+
+            # Previously separated ranges of the same audio are reused from the stem cache
+            try:
+                with tracing.song(song_path), tracing.stage('content_hash'):
+                    content_hash = stem_cache.file_digest(song_path) if stem_cache.enabled else None
+            except OSError:
+                content_hash = None
+
+            # Encode into the job's scratch folder and move it into place once complete
+            scratch_path = os.path.join(scratch_dir, f"output_{uuid.uuid4().hex}.{extension}")
+            output = SongOutput(song, scratch_path, settings)
+            stems = None
+            if stem_mode != 'off':
+                stems = StemExport(output_dir, song, song_path, model_name, model.sources, settings)
+            conversion = describe_conversion(song, model)
+            outputs.append((output, sections, output_dir, song_path, stems, conversion))
+
+            # Songs at another sample rate are resampled for the model in song-aligned blocks,
+            # each frame once, and only where a window actually gets separated
+            model_rate = ModelRateSong(song, model) if conversion['path'] == 'resample' else None
+
+            # Each section is separated with some context on both sides, which
+            # the assembler trims off again (and uses for crossfading the splices)
+            context_frames = int(settings.context_seconds * song.frame_rate)
+            chunk_frames = int(CHUNK_SECONDS * song.frame_rate)
+            # Pending index of each of this song's grid chunks; neighbouring sections share chunks
+            song_chunks = {}
+            # Slicing waits for the decoder to reach each section
+            with tracing.song(song_path), tracing.stage('slice_sections'):
+                song_clip = None
+                if stem_mode == 'song':
+                    # One separation of the whole song gives its stems and every section's instrumental
+                    song_clip = song.get_sample_slice()
+                    song_frames = int(song_clip.frame_count())
+                    song_clip_sections = []
+
+                for start_frame, end_frame in sections:
+                    window_start = max(0, start_frame - context_frames)
+                    window_end = end_frame + context_frames
+
+                    # Splice in the background pre-separation when it already covers the window with
+                    # this model (it keeps only the instrumental, so not when stems are exported)
+                    ready = None
+                    if preseparator is not None and preseparator.model_name == model_name and stems is None:
+                        ready = preseparator.instrumental(window_start, window_end)
+                    chunk_indices = []
+                    if song_clip is not None:
+                        window_end = min(song_frames, window_end)
+                    elif ready is not None:
+                        window_end = window_start + int(ready.frame_count())
+                        preseparated += 1
+                    else:
+                        last_chunk = (window_end - 1) // chunk_frames
+                        for index in range(window_start // chunk_frames, last_chunk + 1):
+                            if index not in song_chunks:
+                                chunk = grid_chunk(song, index, chunk_frames, context_frames)
+                                if chunk is None:
+                                    break
+                                clip, padded_start, chunk_start, chunk_end = chunk
+                                padded_end = padded_start + int(clip.frame_count())
+                                song_chunks[index] = len(pending)
+                                pending.append((output, [], stems, padded_start, chunk_start, chunk_end))
+                                clips.append(clip)
+                                keys.append(chunk_cache_key(
+                                    content_hash, song, padded_start, padded_end, model_name, cache_params
+                                ))
+                                model_inputs.append(
+                                    functools.partial(model_rate.window, padded_start, padded_end)
+                                    if model_rate else None
+                                )
+                            chunk_indices.append(song_chunks[index])
+                        if chunk_indices:
+                            # The last chunk stops where the song does
+                            window_end = max(window_start, min(window_end, pending[chunk_indices[-1]][5]))
+                        else:
+                            # The section starts past the end of the song
+                            window_end = window_start
+                            ready = song.get_sample_slice(window_start, window_start)
+                    # Sections reaching past the end of the song stop where it does
+                    end_frame = min(end_frame, window_end)
+                    start_frame = min(start_frame, end_frame)
+                    idx = output.add_section(
+                        start_frame, end_frame, start_frame - window_start, window_end - end_frame, ready
+                    )
+                    clip_section = (idx, start_frame, end_frame, window_start, window_end)
+                    if song_clip is not None:
+                        song_clip_sections.append(clip_section)
+                        assembling[(output, idx)] = [1, [], {}]
+                    elif ready is None:
+                        assembling[(output, idx)] = [len(chunk_indices), [], {}]
+                        for pending_idx in chunk_indices:
+                            pending[pending_idx][1].append(clip_section)
+
+                # The sections as processed: merged, and stopping where the song does
+                write_section_info(
+                    output_dir, [(start, end) for start, end, _, _ in output.sections], song_path,
+                    song.frame_rate
+                )
+                if song_clip is not None:
+                    pending.append((output, song_clip_sections, stems, 0, 0, song_frames))
+                    clips.append(song_clip)
+                    keys.append(window_cache_key(
+                        content_hash, song, 0, song_frames, model_name, cache_params
+                    ))
+                    model_inputs.append(
+                        functools.partial(model_rate.window, 0, song_frames) if model_rate else None
+                    )
+
+        if preseparated:
+            report(f"Using {preseparated} pre-separated sections...")
+
+        # Separate one batch at a time, in song order, so the finished start of each
+        # output is encoded while the sections after it are still separating
+        if pending:
+            report(f"Separating {len(assembling)} sections in {len(pending)} chunks..." if stem_mode != 'song'
+                   else f"Separating {len(pending)} songs into stems...")
+        wave_size = max(1, int(settings.batch_size))
+        waves = [range(start, min(start + wave_size, len(pending)))
+                 for start in range(0, len(pending), wave_size)]
+        job_progress = JobProgress(
+            progress_callback, sum(clip.duration_seconds for clip in clips), len(waves)
+        )
+        for wave in waves:
+            wave_clips = [clips[idx] for idx in wave]
+            wave_keys = [keys[idx] for idx in wave]
+            wave_inputs = [model_inputs[idx] for idx in wave]
+            wave_progress = job_progress.part(sum(clip.duration_seconds for clip in wave_clips))
+            if stem_mode != 'off':
+                separated = separate_stems(
+                    model, wave_clips, wave_keys, settings, report, cancel_event, pool, wave_progress,
+                    wave_inputs
+                )
+            else:
+                separated = [
+                    (instrumental, None) for instrumental in separate_instrumentals(
+                        model, wave_clips, wave_keys, settings, report, cancel_event, pool, wave_progress,
+                        wave_inputs
+                    )
+                ]
+
+            for idx, (instrumental, clip_stems) in zip(wave, separated):
+                output, clip_sections, stems, clip_start, chunk_start, chunk_end = pending[idx]
+                if stem_mode == 'song':
+                    with tracing.song(stems.song_path):
+                        with tracing.stage('export_stems', sources=len(clip_stems)):
+                            stems.add('song', 0, int(clips[idx].frame_count()), clip_stems)
+                # Half of each chunk crossfade comes from either side of the boundary
+                chunk_fade = int(CHUNK_CROSSFADE_SECONDS * instrumental.frame_rate)
+                for section_idx, start_frame, end_frame, window_start, window_end in clip_sections:
+                    # The part of the section's window (and of the section, for its stems) in this clip,
+                    # with handles at the chunk boundaries inside it
+                    piece_start = max(window_start, chunk_start)
+                    piece_end = max(piece_start, min(window_end, chunk_end))
+                    parts = assembling[(output, section_idx)]
+                    parts[0] -= 1
+                    parts[1].append(chunk_piece(
+                        instrumental, clip_start, piece_start, piece_end,
+                        chunk_fade // 2 if piece_start > window_start else 0,
+                        chunk_fade // 2 if piece_end < window_end else 0,
+                    ))
+                    if stem_mode == 'sections':
+                        stem_start = max(start_frame, chunk_start)
+                        stem_end = max(stem_start, min(end_frame, chunk_end))
+                        for name, stem in clip_stems.items():
+                            parts[2].setdefault(name, []).append(chunk_piece(
+                                stem, clip_start, stem_start, stem_end,
+                                chunk_fade // 2 if stem_start > start_frame else 0,
+                                chunk_fade // 2 if stem_end < end_frame else 0,
+                            ))
+                    if parts[0]:
+                        continue
+                    # Every chunk of the section is separated
+                    del assembling[(output, section_idx)]
+                    output.set_instrumental(section_idx, join_chunks(parts[1], chunk_fade))
+                    if stem_mode == 'sections':
+                        with tracing.song(stems.song_path):
+                            with tracing.stage('export_stems', sources=len(parts[2])):
+                                stems.add(f"section_{section_idx + 1:02d}", start_frame, end_frame, {
+                                    name: join_chunks(pieces, chunk_fade) for name, pieces in parts[2].items()
+                                })
+                clips[idx] = None  # Originals are copied straight from each song's buffer
+                # The song's last resampled blocks are freed once none of its windows are left
+                model_inputs[idx] = None
+            for output, _, _, song_path, _, _ in outputs:
+                with tracing.song(song_path), tracing.stage('assemble'):
+                    output.flush()
+
+        output_dirs = []
+        for song_idx, (output, sections, output_dir, song_path, stems, conversion) in enumerate(outputs):
+            check_cancelled(cancel_event)
+            report("Finishing the output file...")
+            with tracing.song(song_path):
+                with tracing.stage('encode', format=settings.output_format):
+                    output.close()
+                with tracing.stage('move_output'):
+                    shutil.move(output.scratch_path, os.path.join(output_dir, f"output.{extension}"))
+            if stems is not None:
+                stems.write_manifest()
+            write_performance_report(
+                output_dir, song_path, sections, model_name, settings, conversion, len(outputs)
+            )
+            created_dirs[song_idx] = (output_dir, True)
+            output_dirs.append(output_dir)
+
+            report(f"Processing complete! Output saved in: {output_dir}")
+    except BaseException:
+        for output, _, _, _, _, _ in outputs:
+            output.abort()
+        raise
+
+    # Keep the model resident for the next job unless memory is tight
+    model_registry.relieve_memory_pressure()
+
+    return output_dirs
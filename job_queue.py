@@ -0,0 +1,185 @@
+import os
+import queue
+import shutil
+import tempfile
+import itertools
+import threading
+import contextlib
+
+import paths
+from engine import process_song
+from model_registry import DEFAULT_MODEL
+from progress import describe_progress
+from separation import JobCancelled
+
+
+class Job:
+    """A song and its sections waiting in (or running from) a JobQueue"""
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+
+    _ids = itertools.count(1)
+
+    def __init__(self, song, sections, song_path, settings=None, preseparator=None,
+                 output_root=paths.output_root, model_name=DEFAULT_MODEL):
+        self.id = next(Job._ids)
+        self.song = song
+        self.sections = list(sections)
+        self.song_path = song_path
+        self.settings = settings
+        self.preseparator = preseparator
+        self.output_root = output_root
+        self.model_name = model_name
+
+        self.state = Job.QUEUED
+        self.message = "Queued"
+        self.progress = None
+        self.output_dir = None
+        self.error = None
+        self.cancel_event = threading.Event()
+        self.done_event = threading.Event()
+
+    @property
+    def name(self):
+        return os.path.basename(self.song_path)
+
+    @property
+    def finished(self):
+        return self.state in (Job.DONE, Job.FAILED, Job.CANCELLED)
+
+    def cancel(self):
+        """Ask the job to stop; queued jobs never start, running ones stop at the next checkpoint"""
+        self.cancel_event.set()
+
+    def wait(self, timeout=None):
+        return self.done_event.wait(timeout)
+
+
+class JobQueue:
+    """Runs queued jobs on a bounded number of worker threads
+
+    Every job gets its own scratch folder under the temp directory, which
+    is removed when the job ends. `on_update(job)` is called from the
+    worker threads whenever a job's state or message changes. With a
+    SeparationPool the jobs' separation runs in its worker processes, and
+    its background work (the pre-separation) waits while any job runs.
+    """
+
+    def __init__(self, max_concurrent=1, on_update=None, scratch_root=paths.temp_dir, pool=None):
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.on_update = on_update or (lambda job: None)
+        self.scratch_root = scratch_root
+        self.pool = pool
+
+        self._pending = queue.Queue()
+        self._jobs = []
+        self._lock = threading.Lock()
+        self._workers = 0
+        self._closed = False
+        self._ensure_workers()
+
+    def submit(self, job):
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Job queue has been shut down")
+            self._jobs.append(job)
+        self._pending.put(job)
+        self.on_update(job)
+        return job
+
+    def jobs(self):
+        with self._lock:
+            return list(self._jobs)
+
+    def active_jobs(self):
+        return [job for job in self.jobs() if not job.finished]
+
+    def cancel(self, job_id=None):
+        """Cancel one job, or every unfinished job when no id is given"""
+        for job in self.jobs():
+            if job_id is None or job.id == job_id:
+                job.cancel()
+                if job.state == Job.QUEUED:
+                    self._update(job, message="Cancelling...")
+
+    def set_max_concurrent(self, max_concurrent):
+        """Change how many jobs run at once; extra workers exit after their current job"""
+        with self._lock:
+            self.max_concurrent = max(1, int(max_concurrent))
+        self._ensure_workers()
+
+    def shutdown(self, cancel=True):
+        """Stop accepting jobs and let the workers exit"""
+        with self._lock:
+            self._closed = True
+            workers = self._workers
+        if cancel:
+            self.cancel()
+        for _ in range(workers):
+            self._pending.put(None)
+
+    def _ensure_workers(self):
+        with self._lock:
+            missing = max(0, self.max_concurrent - self._workers)
+            self._workers += missing
+        for _ in range(missing):
+            threading.Thread(target=self._worker, daemon=True).start()
+
+    def _worker(self):
+        while True:
+            job = self._pending.get()
+            if job is None:
+                break
+            self._run(job)
+            with self._lock:
+                if self._workers > self.max_concurrent:
+                    self._workers -= 1
+                    return
+        with self._lock:
+            self._workers -= 1
+
+    def _update(self, job, state=None, message=None, progress=None):
+        if state is not None:
+            job.state = state
+        if message is not None:
+            job.message = message
+        if progress is not None:
+            job.progress = progress
+        self.on_update(job)
+
+    def _run(self, job):
+        if job.cancel_event.is_set():
+            self._update(job, Job.CANCELLED, "Cancelled")
+            job.done_event.set()
+            return
+
+        # Unique across processes: the app and the watch folder share the temp directory
+        os.makedirs(self.scratch_root, exist_ok=True)
+        scratch_dir = tempfile.mkdtemp(prefix=f"job_{job.id}_", dir=self.scratch_root)
+        self._update(job, Job.RUNNING, "Starting...")
+        foreground = self.pool.foreground() if self.pool is not None else contextlib.nullcontext()
+        try:
+            with foreground:
+                job.output_dir = process_song(
+                    job.song, job.sections, job.song_path,
+                    lambda message: self._update(job, message=message),
+                    output_root=job.output_root, model_name=job.model_name, settings=job.settings,
+                    preseparator=job.preseparator, cancel_event=job.cancel_event,
+                    scratch_dir=scratch_dir, pool=self.pool,
+                    progress_callback=lambda progress: self._update(
+                        job, message=describe_progress(progress), progress=progress
+                    ),
+                )
+            self._update(job, Job.DONE, f"Processing complete! Output saved in: {job.output_dir}")
+        except JobCancelled:
+            self._update(job, Job.CANCELLED, "Cancelled")
+        except Exception as e:
+            job.error = e
+            self._update(job, Job.FAILED, f"Error processing sections: {str(e)}")
+        finally:
+            shutil.rmtree(scratch_dir, ignore_errors=True)
+            job.done_event.set()
@@ -0,0 +1,152 @@
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+from demucs.pretrained import get_model
+
+import separators
+
+try:
+    import psutil
+except ImportError:  # Memory pressure checks are skipped without psutil
+    psutil = None
+
+DEFAULT_MODEL = 'htdemucs'
+
+# Checkpoint shipped with the packaged app for the default model
+FROZEN_CHECKPOINTS = {
+    'htdemucs': '955717e8-8726e21a.th',
+}
+
+
+def prepare_model_environment(name):
+    """Point demucs at the bundled checkpoints when running as a compiled executable"""
+    if not getattr(sys, 'frozen', False):
+        return
+
+    base_path = os.path.dirname(sys.executable)
+    model_path = os.path.join(base_path, '_internal')  # Point to PyInstaller's _internal
+    os.environ['TORCH_HOME'] = model_path
+    os.environ['DEMUCS_OFFLINE'] = '1'  # Prevent model download attempts
+
+    # Verify model exists in PyInstaller's _internal directory
+    checkpoint = FROZEN_CHECKPOINTS.get(name)
+    if checkpoint:
+        expected_model_path = os.path.join(model_path, 'hub', 'checkpoints', checkpoint)
+        if not os.path.exists(expected_model_path):
+            raise FileNotFoundError(f"Model file not found at expected path: {expected_model_path}")
+
+
+class ModelRegistry:
+    """Process-wide cache of loaded Demucs models, least recently used first"""
+
+    def __init__(self, max_resident=1, min_available_mb=1024):
+        self.max_resident = max(1, int(max_resident))
+        self.min_available_mb = min_available_mb
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self._warm_threads = {}
+
+    def get(self, name=DEFAULT_MODEL):
+        """Return a resident model, loading it on first use"""
+        if separators.is_backend(name):
+            # DSP backends have no weights, so they don't take a resident slot
+            return separators.create(name)
+
+        with self._lock:
+            if name in self._models:
+                self._models.move_to_end(name)
+                return self._models[name]
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+
+        # Only one thread loads a given model; others wait and reuse it
+        with load_lock:
+            with self._lock:
+                if name in self._models:
+                    self._models.move_to_end(name)
+                    return self._models[name]
+
+            prepare_model_environment(name)
+            model = get_model(name)
+            model.eval()
+
+            with self._lock:
+                self._models[name] = model
+                self._models.move_to_end(name)
+                self._enforce_limits(keep=name)
+            return model
+
+    def warm(self, name=DEFAULT_MODEL):
+        """Load a model in a background thread so the first job doesn't wait for it"""
+        with self._lock:
+            if name in self._models:
+                return None
+            thread = self._warm_threads.get(name)
+            if thread is not None and thread.is_alive():
+                return thread
+            thread = threading.Thread(target=self._warm, args=(name,), daemon=True)
+            self._warm_threads[name] = thread
+        thread.start()
+        return thread
+
+    def _warm(self, name):
+        try:
+            self.get(name)
+        except Exception:
+            # Errors are reported by the job that actually needs the model
+            pass
+
+    def is_loaded(self, name=DEFAULT_MODEL):
+        with self._lock:
+            return name in self._models
+
+    def loaded_models(self):
+        with self._lock:
+            return list(self._models)
+
+    def set_max_resident(self, max_resident):
+        """Change how many models stay resident, evicting extras immediately"""
+        with self._lock:
+            self.max_resident = max(1, int(max_resident))
+            self._enforce_limits()
+
+    def evict(self, name=None):
+        """Drop one model (or all of them when no name is given)"""
+        with self._lock:
+            if name is None:
+                self._models.clear()
+            else:
+                self._models.pop(name, None)
+
+    def relieve_memory_pressure(self):
+        """Evict least recently used models while available memory is low"""
+        with self._lock:
+            self._enforce_limits()
+
+    def _enforce_limits(self, keep=None):
+        # Caller must hold self._lock
+        while len(self._models) > self.max_resident:
+            self._evict_oldest(keep)
+
+        while self._models and self._memory_is_low():
+            if not self._evict_oldest(keep):
+                break
+
+    def _evict_oldest(self, keep=None):
+        for name in self._models:
+            if name != keep:
+                del self._models[name]
+                return True
+        return False
+
+    def _memory_is_low(self):
+        if psutil is None:
+            return False
+        available_mb = psutil.virtual_memory().available / (1024 * 1024)
+        return available_mb < self.min_available_mb
+
+
+# Shared by every job in this process
+model_registry = ModelRegistry()
@@ -0,0 +1,29 @@
+import os
+import sys
+
+# Set up base paths
+if getattr(sys, 'frozen', False):
+    # If running as compiled executable
+    base_path = os.path.dirname(sys.executable)
+else:
+    # If running as script
+    base_path = os.path.dirname(os.path.abspath(__file__))
+
+# Create _internal directory for app data
+internal_dir = os.path.join(base_path, '_internal')
+os.makedirs(internal_dir, exist_ok=True)
+
+# Create cache directory in _internal folder
+cache_dir = os.path.join(internal_dir, 'cache')
+os.makedirs(cache_dir, exist_ok=True)
+
+# Create temp directory in _internal folder
+temp_dir = os.path.join(internal_dir, 'temp')
+os.makedirs(temp_dir, exist_ok=True)
+
+# Set torch hub directory
+os.environ['TORCH_HOME'] = cache_dir
+
+# Ensure the output directory exists (keep this separate from internal files)
+output_root = 'output'
+os.makedirs(output_root, exist_ok=True)
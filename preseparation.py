@@ -0,0 +1,204 @@
+import threading
+
+from engine import (
+    CHUNK_CROSSFADE_SECONDS, CHUNK_SECONDS, chunk_cache_key, chunk_piece, grid_chunk, join_chunks
+)
+from model_registry import model_registry, DEFAULT_MODEL
+from separation import instrumental_from_sources, separate_batch
+from stem_cache import stem_cache
+from tensor_io import ModelRateSong, conversion_path, segment_to_model_input, model_output_to_segment
+
+
+class PreSeparator:
+    """Separates a whole song in the background so sections can be spliced instantly
+
+    The song is split into the chunks of the jobs' separation grid, which
+    are separated one at a time, nearest to the focus position (usually
+    the playhead) first. Each chunk is separated with the jobs' context on
+    both sides, converted back to the song's format and trimmed to the
+    chunk plus the handles jobs crossfade neighbouring chunks with, so
+    chunks line up sample for sample and join like they do in jobs. Songs at another sample rate reach the
+    model through the same song-aligned block resampling as in jobs, so a
+    cached chunk is the same whichever of them separated it. Separated
+    sources go to the stem cache
+    under the same keys jobs use, so jobs reuse them too, and reopening
+    the same file picks up where the last session stopped.
+
+    With a SeparationPool, chunks run in its low priority background
+    worker and only while no job is running. Without one, they run in this
+    process on one worker, and jobs given this pre-separator pause it.
+    """
+
+    def __init__(self, song, song_path, settings, model_name=DEFAULT_MODEL, pool=None):
+        self.song = song
+        self.song_path = song_path
+        self.settings = settings
+        self.model_name = model_name
+        self.pool = pool
+
+        self.chunk_frames = int(CHUNK_SECONDS * song.frame_rate)
+        self.context_frames = int(settings.context_seconds * song.frame_rate)
+        self.chunk_fade = int(CHUNK_CROSSFADE_SECONDS * song.frame_rate)
+        self.total_frames = None
+        self.focus_frame = 0
+
+        self._instrumentals = {}
+        # Block resampler for songs at another rate than the model, and the last frame asked of it
+        self._model_rate = None
+        self._model_rate_frame = 0
+        self._lock = threading.Lock()
+        self._resume = threading.Event()
+        self._resume.set()
+        # Number of jobs that have paused it
+        self._pauses = 0
+        self._stopped = False
+        self._cancel = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped = True
+        # Also interrupts a chunk running in a worker process
+        self._cancel.set()
+        self._resume.set()
+
+    def pause(self):
+        """Yield to a foreground job after the current chunk; each pause needs its own resume"""
+        with self._lock:
+            self._pauses += 1
+            self._resume.clear()
+
+    def resume(self):
+        with self._lock:
+            self._pauses = max(0, self._pauses - 1)
+            if not self._pauses:
+                self._resume.set()
+
+    def set_focus(self, seconds):
+        """Prioritize chunks around this position"""
+        self.focus_frame = int(seconds * self.song.frame_rate)
+
+    @property
+    def chunk_count(self):
+        if self.total_frames is None:
+            return None
+        return (self.total_frames + self.chunk_frames - 1) // self.chunk_frames
+
+    def progress(self):
+        """Fraction of the song separated so far"""
+        count = self.chunk_count
+        if not count:
+            return 0.0
+        with self._lock:
+            return len(self._instrumentals) / count
+
+    def chunk_bounds(self, idx):
+        start = idx * self.chunk_frames
+        return start, min(start + self.chunk_frames, self.total_frames)
+
+    def _next_chunk(self):
+        focus_chunk = min(self.focus_frame // self.chunk_frames, self.chunk_count - 1)
+        with self._lock:
+            pending = [idx for idx in range(self.chunk_count) if idx not in self._instrumentals]
+        if not pending:
+            return None
+        return min(pending, key=lambda idx: abs(idx - focus_chunk))
+
+    def _run(self):
+        try:
+            # Waits for the decoder to reach the end of the file
+            self.total_frames = int(self.song.frame_count())
+            if self.pool is not None:
+                model = self.pool.model_info(self.model_name, self._cancel)
+            else:
+                model = model_registry.get(self.model_name)
+            content_hash = stem_cache.file_digest(self.song_path) if stem_cache.enabled else None
+        except Exception:
+            return
+
+        while not self._stopped:
+            self._resume.wait()
+            if self._stopped:
+                break
+            idx = self._next_chunk()
+            if idx is None:
+                break
+            try:
+                self._separate_chunk(model, idx, content_hash)
+            except Exception:
+                # Leave the chunk to the foreground job
+                break
+
+    def _separate_chunk(self, model, idx, content_hash):
+        padded, padded_start, start, end = grid_chunk(self.song, idx, self.chunk_frames, self.context_frames)
+        padded_end = padded_start + int(padded.frame_count())
+
+        key = None
+        if content_hash is not None:
+            key = chunk_cache_key(
+                content_hash, self.song, padded_start, padded_end, self.model_name,
+                self.settings.cache_params(model)
+            )
+        sources = stem_cache.get(key) if key else None
+        if sources is None:
+            wav = self._model_input(model, padded, padded_start, padded_end)
+            # One worker keeps most of the machine free for playback and foreground jobs
+            if self.pool is not None:
+                sources = self.pool.separate(
+                    model, [wav], self.settings, 1, cancel_event=self._cancel, background=True,
+                    num_workers=1
+                )[0]
+            else:
+                kwargs = dict(self.settings.apply_model_kwargs(model), num_workers=1)
+                sources = separate_batch(model, [wav], 1, cancel_event=self._cancel, **kwargs)[0]
+            if key:
+                stem_cache.put(key, sources)
+
+        instrumental = model_output_to_segment(
+            instrumental_from_sources(sources, model), model, self.song, padded_end - padded_start
+        )
+        # The chunk and its crossfade handles; `instrumental` returns pieces of it
+        handle = self.chunk_fade // 2
+        kept, head, _ = chunk_piece(instrumental, padded_start, start, end, handle, handle)
+        with self._lock:
+            self._instrumentals[idx] = (kept, start - head)
+
+    def _model_input(self, model, padded, padded_start, padded_end):
+        if conversion_path(self.song.frame_rate, self.song.channels, model) != 'resample':
+            return segment_to_model_input(padded, model)
+        # Chunks run outward from the focus, but the resampler frees blocks in song
+        # order only; starting over when going back keeps just a few blocks in memory
+        if self._model_rate is None or padded_start < self._model_rate_frame:
+            self._model_rate = ModelRateSong(self.song, model)
+        self._model_rate_frame = padded_start
+        return self._model_rate.window(padded_start, padded_end)
+
+    def instrumental(self, start_frame, end_frame):
+        """Instrumental for a frame range, or None if part of it isn't separated yet"""
+        if self.total_frames is None:
+            return None
+        end_frame = min(end_frame, self.total_frames)
+        if end_frame <= start_frame:
+            return None
+
+        first = start_frame // self.chunk_frames
+        last = (end_frame - 1) // self.chunk_frames
+        handle = self.chunk_fade // 2
+        pieces = []
+        with self._lock:
+            for idx in range(first, last + 1):
+                kept = self._instrumentals.get(idx)
+                if kept is None:
+                    return None
+                segment, kept_start = kept
+                chunk_start, chunk_end = self.chunk_bounds(idx)
+                piece_start = max(start_frame, chunk_start)
+                piece_end = min(end_frame, chunk_end)
+                pieces.append(chunk_piece(
+                    segment, kept_start, piece_start, piece_end,
+                    handle if piece_start > start_frame else 0, handle if piece_end < end_frame else 0,
+                ))
+        return join_chunks(pieces, self.chunk_fade)
@@ -0,0 +1,116 @@
+import os
+import uuid
+
+import paths
+import separators
+from engine import (
+    CHUNK_CROSSFADE_SECONDS, CHUNK_SECONDS, chunk_cache_key, chunk_piece, grid_chunk, join_chunks
+)
+from model_registry import model_registry
+from separation import instrumental_from_sources
+from stem_cache import stem_cache
+from tensor_io import segment_to_model_input, model_output_to_segment
+
+# Used for previews when the job's model has nothing ready for the section
+FAST_PREVIEW_BACKEND = 'spectral_mask'
+
+
+def _resident_model(model_name, pool=None):
+    """A loaded model (or its metadata) if one is available without waiting, else None"""
+    if pool is not None:
+        return pool.cached_model_info(model_name)
+    if model_registry.is_loaded(model_name):
+        return model_registry.get(model_name)
+    return None
+
+
+def _cached_instrumental(song, song_path, start_frame, end_frame, model_name, settings, pool):
+    if not stem_cache.enabled:
+        return None
+    model = _resident_model(model_name, pool)
+    if model is None:
+        return None
+    try:
+        content_hash = stem_cache.file_digest(song_path)
+    except OSError:
+        return None
+    # Jobs cache the chunks of a fixed grid, so every chunk the section touches is needed
+    chunk_frames = int(CHUNK_SECONDS * song.frame_rate)
+    context_frames = int(settings.context_seconds * song.frame_rate)
+    chunk_fade = int(CHUNK_CROSSFADE_SECONDS * song.frame_rate)
+    params = settings.cache_params(model)
+    pieces = []
+    for index in range(start_frame // chunk_frames, (end_frame - 1) // chunk_frames + 1):
+        chunk = grid_chunk(song, index, chunk_frames, context_frames)
+        if chunk is None:
+            break
+        clip, padded_start, chunk_start, chunk_end = chunk
+        padded_frames = int(clip.frame_count())
+        sources = stem_cache.get(chunk_cache_key(
+            content_hash, song, padded_start, padded_start + padded_frames, model_name, params
+        ))
+        if sources is None:
+            return None
+        instrumental = model_output_to_segment(
+            instrumental_from_sources(sources, model), model, clip, padded_frames
+        )
+        # Crossfaded into the neighbouring chunks like in jobs
+        piece_start = max(start_frame, chunk_start)
+        piece_end = max(piece_start, min(end_frame, chunk_end))
+        pieces.append(chunk_piece(
+            instrumental, padded_start, piece_start, piece_end,
+            chunk_fade // 2 if piece_start > start_frame else 0,
+            chunk_fade // 2 if piece_end < end_frame else 0,
+        ))
+    return join_chunks(pieces, chunk_fade) if pieces else None
+
+
+def preview_instrumental(song, song_path, start_frame, end_frame, model_name, settings,
+                         preseparator=None, pool=None):
+    """Instrumental for a section (in sample frames) from the quickest source available
+
+    In order: the background pre-separation, the stem cache (both only
+    for `model_name`), then a DSP backend run right here. Returns the
+    AudioSegment and a short description of where it came from.
+    """
+    clip = song.get_sample_slice(start_frame, end_frame)
+
+    if preseparator is not None and preseparator.model_name == model_name:
+        ready = preseparator.instrumental(start_frame, end_frame)
+        if ready is not None:
+            return ready, "pre-separated"
+
+    if not separators.is_backend(model_name):
+        cached = _cached_instrumental(
+            song, song_path, start_frame, end_frame, model_name, settings, pool
+        )
+        if cached is not None:
+            return cached, f"cached {model_name}"
+
+    # DSP backends take a fraction of the section's length even in this process
+    backend = separators.create(model_name if separators.is_backend(model_name) else FAST_PREVIEW_BACKEND)
+    sources = backend.separate(segment_to_model_input(clip, backend))
+    instrumental = model_output_to_segment(
+        instrumental_from_sources(sources, backend), backend, clip, int(clip.frame_count())
+    )
+    return instrumental, f"fast preview ({backend.name})"
+
+
+def render_preview(song, song_path, start_frame, end_frame, model_name, settings,
+                   preseparator=None, pool=None, scratch_dir=paths.temp_dir):
+    """Write the section and its instrumental to WAV files for A/B playback
+
+    Returns (original_path, instrumental_path, source description).
+    """
+    instrumental, source = preview_instrumental(
+        song, song_path, start_frame, end_frame, model_name, settings, preseparator, pool
+    )
+    original = song.get_sample_slice(start_frame, end_frame)
+
+    token = uuid.uuid4().hex
+    original_path = os.path.join(scratch_dir, f"preview_{token}_original.wav")
+    instrumental_path = os.path.join(scratch_dir, f"preview_{token}_instrumental.wav")
+    # WAV needs no encoder, so both are written in a few milliseconds
+    original.export(original_path, format="wav")
+    instrumental.export(instrumental_path, format="wav")
+    return original_path, instrumental_path, source
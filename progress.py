@@ -0,0 +1,163 @@
+import math
+import time
+
+from utils import format_time
+
+
+def chunk_segments(model, segment=None):
+    """Chunk length in seconds apply_model uses for each network (one per model in a bag)"""
+    networks = getattr(model, 'models', None) or [model]
+    return [float(segment or network.segment) for network in networks]
+
+
+def expected_chunks(model, frames, apply_kwargs):
+    """How many chunks apply_model will run on `frames` frames (approximate with shifts)"""
+    shifts = int(apply_kwargs.get('shifts', 1))
+    overlap = float(apply_kwargs.get('overlap', 0.25))
+    if shifts:
+        # Each shift adds a random amount of up to half a second of padding
+        frames += int(0.5 * model.samplerate) // 2
+
+    total = 0
+    for segment in chunk_segments(model, apply_kwargs.get('segment')):
+        segment_length = int(model.samplerate * segment)
+        stride = max(1, int((1 - overlap) * segment_length))
+        total += math.ceil(frames / stride)
+    return total * max(1, shifts)
+
+
+class SeparationProgress:
+    """Chunk-level progress of a separate_batch call, with throughput and ETAs
+
+    Every update is passed to `callback` as a plain dict (so it can cross
+    process boundaries and be written as JSON). Throughput is seconds of
+    audio separated per second of wall time. The sections of a batch are
+    separated together, so the section ETA is the current batch's ETA.
+    """
+
+    def __init__(self, callback, seconds_total, batches, clock=time.monotonic):
+        self.callback = callback or (lambda progress: None)
+        self.seconds_total = seconds_total
+        self.batches = batches
+        self.clock = clock
+
+        self.started = clock()
+        self.seconds_before = 0.0
+        self.batch = 0
+        self.batch_sections = 0
+        self.batch_seconds = 0.0
+        self.chunks_done = 0
+        self.chunks_total = 1
+
+    def start_batch(self, batch, sections, seconds, chunks_total):
+        self.batch = batch
+        self.batch_sections = sections
+        self.batch_seconds = seconds
+        self.chunks_done = 0
+        self.chunks_total = max(1, chunks_total)
+        self._emit()
+
+    def chunk_done(self):
+        self.chunks_done += 1
+        # The estimate can be one short per shift; never report more than 100%
+        self.chunks_total = max(self.chunks_total, self.chunks_done + 1)
+        self._emit()
+
+    def end_batch(self):
+        self.chunks_total = self.chunks_done = max(self.chunks_done, 1)
+        self._emit()
+        self.seconds_before += self.batch_seconds
+
+    def _emit(self):
+        fraction = self.chunks_done / self.chunks_total
+        batch_seconds_done = fraction * self.batch_seconds
+        seconds_done = self.seconds_before + batch_seconds_done
+        elapsed = self.clock() - self.started
+
+        throughput = seconds_done / elapsed if seconds_done > 0 and elapsed > 0 else None
+        section_eta = job_eta = None
+        if throughput:
+            section_eta = (self.batch_seconds - batch_seconds_done) / throughput
+            job_eta = (self.seconds_total - seconds_done) / throughput
+
+        self.callback({
+            'batch': self.batch,
+            'batches': self.batches,
+            'batch_sections': self.batch_sections,
+            'batch_seconds': round(self.batch_seconds, 2),
+            'chunks_done': self.chunks_done,
+            'chunks_total': self.chunks_total,
+            'seconds_done': round(seconds_done, 2),
+            'seconds_total': round(self.seconds_total, 2),
+            'elapsed': round(elapsed, 2),
+            'throughput': round(throughput, 3) if throughput else None,
+            'section_eta': round(section_eta, 1) if section_eta is not None else None,
+            'job_eta': round(job_eta, 1) if job_eta is not None else None,
+        })
+
+
+class JobProgress:
+    """Progress across several consecutive separations that make up one job
+
+    Jobs separate their sections in waves (so the output can be encoded
+    while later waves run); each wave's progress dicts are rewritten so
+    batches, seconds done, throughput and the job ETA cover the whole job.
+    """
+
+    def __init__(self, callback, seconds_total, waves, clock=time.monotonic):
+        self.callback = callback
+        self.seconds_total = seconds_total
+        self.waves = waves
+        self.clock = clock
+
+        self.started = clock()
+        self.seconds_before = 0.0
+        self.wave = 0
+
+    def part(self, seconds):
+        """Progress callback for the next wave, which covers `seconds` of audio"""
+        if self.callback is None:
+            return None
+        self.wave += 1
+        wave, seconds_before = self.wave, self.seconds_before
+        self.seconds_before += seconds
+
+        def report(progress):
+            seconds_done = seconds_before + progress['seconds_done']
+            elapsed = self.clock() - self.started
+            throughput = seconds_done / elapsed if seconds_done > 0 and elapsed > 0 else None
+            section_eta = job_eta = None
+            if throughput:
+                # The wave's own ETA is based on its throughput alone, which is None at its start
+                batch_left = progress['batch_seconds'] * (1 - progress['chunks_done'] / progress['chunks_total'])
+                section_eta = batch_left / throughput
+                job_eta = (self.seconds_total - seconds_done) / throughput
+            self.callback(dict(
+                progress,
+                batch=wave,
+                batches=self.waves,
+                seconds_done=round(seconds_done, 2),
+                seconds_total=round(self.seconds_total, 2),
+                elapsed=round(elapsed, 2),
+                throughput=round(throughput, 3) if throughput else None,
+                section_eta=round(section_eta, 1) if section_eta is not None else None,
+                job_eta=round(job_eta, 1) if job_eta is not None else None,
+            ))
+        return report
+
+
+def describe_progress(progress):
+    """One-line summary of a progress dict for status labels"""
+    percent = 100.0 * progress['seconds_done'] / progress['seconds_total'] if progress['seconds_total'] else 0.0
+    text = (
+        f"Separating batch {progress['batch']} of {progress['batches']}: "
+        f"chunk {progress['chunks_done']}/{progress['chunks_total']}, {percent:.0f}% of job"
+    )
+    if progress['throughput']:
+        details = [f"{progress['throughput']:.1f}x realtime"]
+        if progress['section_eta'] is not None:
+            details.append(f"section ETA {format_time(progress['section_eta'])}")
+        if progress['job_eta'] is not None:
+            details.append(f"job ETA {format_time(progress['job_eta'])}")
+        text += f" ({', '.join(details)})"
+    return text
@@ -0,0 +1,84 @@
+import bisect
+
+
+def merge_sections(sections):
+    """Sorted sections with overlapping and touching ones merged into one
+
+    This is the processing plan: every part of the song is separated at
+    most once, and the output timeline never goes backwards.
+    """
+    merged = []
+    for start, end in sorted(sections):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+class SectionIndex:
+    """Sorted, non-overlapping (start, end) sections
+
+    Adding a section that overlaps or touches existing ones merges them
+    into one; adding one that is already fully covered changes nothing.
+    Lookups by position are binary searches. Iterating, indexing and
+    len() work like the list of tuples it replaces.
+    """
+
+    def __init__(self, sections=()):
+        self._sections = merge_sections(sections)
+        self._starts = [start for start, _ in self._sections]
+
+    def add(self, start, end):
+        """Insert a section, returning the (possibly merged) section it ended up in
+
+        Returns None if the range was already covered by a single section.
+        """
+        if end <= start:
+            raise ValueError(f"Section end must be after start: {start} to {end}")
+        # First section that could touch the new one: the last one starting at or before it
+        first = max(0, bisect.bisect_right(self._starts, start) - 1)
+        if first < len(self._sections) and self._sections[first][1] < start:
+            first += 1
+        # Sections starting at or before the new end all touch it
+        last = bisect.bisect_right(self._starts, end)
+
+        touching = self._sections[first:last]
+        if len(touching) == 1 and touching[0][0] <= start and end <= touching[0][1]:
+            return None
+        if touching:
+            start = min(start, touching[0][0])
+            end = max(end, touching[-1][1])
+        self._sections[first:last] = [(start, end)]
+        self._starts[first:last] = [start]
+        return (start, end)
+
+    def find(self, position):
+        """Index of the section containing `position`, or None"""
+        idx = bisect.bisect_right(self._starts, position) - 1
+        if idx >= 0 and position < self._sections[idx][1]:
+            return idx
+        return None
+
+    def index(self, section):
+        return self._sections.index(section)
+
+    def pop(self, idx=-1):
+        self._starts.pop(idx)
+        return self._sections.pop(idx)
+
+    def clear(self):
+        self._sections.clear()
+        self._starts.clear()
+
+    def __getitem__(self, idx):
+        return self._sections[idx]
+
+    def __len__(self):
+        return len(self._sections)
+
+    def __iter__(self):
+        return iter(self._sections)
+
+    def __bool__(self):
+        return bool(self._sections)
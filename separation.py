@@ -0,0 +1,152 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+from demucs.apply import apply_model
+
+import tracing
+from progress import SeparationProgress, expected_chunks
+from separators import Separator
+
+# Sections separated together in one apply_model call
+DEFAULT_BATCH_SIZE = 4
+
+
+class JobCancelled(Exception):
+    """Raised at the next checkpoint after a job's cancel event is set"""
+
+
+def check_cancelled(cancel_event):
+    if cancel_event is not None and cancel_event.is_set():
+        raise JobCancelled()
+
+
+class _DeferredResult:
+    """Runs a chunk when its result is asked for, like demucs' DummyPoolExecutor"""
+
+    def __init__(self, run):
+        self._run = run
+
+    def result(self):
+        return self._run()
+
+
+class ChunkPool:
+    """Executor handed to apply_model as its `pool`, counting chunks as they finish
+
+    apply_model submits every model chunk through its pool, so this sees
+    progress that apply_model itself only shows as a tqdm bar. Chunks also
+    check for cancellation before they start.
+    """
+
+    def __init__(self, num_workers=0, on_chunk=None, cancel_event=None):
+        self.on_chunk = on_chunk or (lambda: None)
+        self.cancel_event = cancel_event
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(num_workers) if num_workers > 0 else None
+
+    def submit(self, func, *args, **kwargs):
+        def run():
+            check_cancelled(self.cancel_event)
+            result = func(*args, **kwargs)
+            with self._lock:
+                self.on_chunk()
+            return result
+
+        if self._executor is None:
+            return _DeferredResult(run)
+        return self._executor.submit(run)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+def instrumental_from_sources(sources, model):
+    """Mix every stem except vocals into an instrumental"""
+    # htdemucs sources order is: [drums, bass, other, vocals]
+    keep = [idx for idx, name in enumerate(model.sources) if name != 'vocals']
+    return sources[..., keep, :, :].sum(dim=-3)
+
+
+def plan_batches(lengths, batch_size=DEFAULT_BATCH_SIZE):
+    """Group item indices into batches of similar length to keep padding small"""
+    batch_size = max(1, int(batch_size))
+    order = sorted(range(len(lengths)), key=lambda idx: lengths[idx])
+    return [order[start:start + batch_size] for start in range(0, len(order), batch_size)]
+
+
+def separate_batch(model, wavs, batch_size=DEFAULT_BATCH_SIZE, status_callback=None,
+                   cancel_event=None, progress_callback=None, **apply_kwargs):
+    """Separate several (channels, frames) tensors with padded, batched apply_model calls
+
+    Each item is normalized on its own, as when separated individually.
+    `progress_callback` receives a SeparationProgress dict after every
+    model chunk. Returns one (sources, channels, frames) tensor per input,
+    in input order.
+    """
+    report = status_callback or (lambda message: None)
+    if isinstance(model, Separator):
+        return _separate_with_backend(model, wavs, report, cancel_event, progress_callback)
+
+    apply_kwargs.setdefault('device', 'cpu')
+    apply_kwargs.setdefault('progress', False)
+    num_workers = apply_kwargs.pop('num_workers', 0)
+
+    results = [None] * len(wavs)
+    batches = plan_batches([wav.shape[-1] for wav in wavs], batch_size)
+    progress = SeparationProgress(
+        progress_callback, sum(wav.shape[-1] for wav in wavs) / model.samplerate, len(batches)
+    )
+    # apply_model runs every chunk through this pool, which reports progress and checks for cancellation
+    pool = ChunkPool(num_workers, progress.chunk_done, cancel_event)
+    try:
+        for batch_idx, indices in enumerate(batches, start=1):
+            check_cancelled(cancel_event)
+            report(f"Separating batch {batch_idx} of {len(batches)} ({len(indices)} sections)...")
+            longest = max(wavs[idx].shape[-1] for idx in indices)
+            channels = wavs[indices[0]].shape[0]
+
+            # Zero padding past each item's end matches how apply_model pads the last chunk
+            batch = torch.zeros(len(indices), channels, longest)
+            stats = []
+            for row, idx in enumerate(indices):
+                wav = wavs[idx]
+                ref = wav.mean(0)
+                mean, std = ref.mean(), ref.std().clamp_min(1e-8)
+                batch[row, :, :wav.shape[-1]] = (wav - mean) / std
+                stats.append((mean, std))
+
+            progress.start_batch(
+                batch_idx, len(indices),
+                sum(wavs[idx].shape[-1] for idx in indices) / model.samplerate,
+                expected_chunks(model, longest, apply_kwargs),
+            )
+            with tracing.stage('apply_model', batch=batch_idx, sections=len(indices), frames=longest):
+                sources = apply_model(model, batch, pool=pool, **apply_kwargs)
+            progress.end_batch()
+
+            for row, idx in enumerate(indices):
+                mean, std = stats[row]
+                length = wavs[idx].shape[-1]
+                results[idx] = sources[row, ..., :length] * std + mean
+    finally:
+        pool.shutdown()
+
+    return results
+
+
+def _separate_with_backend(model, wavs, report, cancel_event, progress_callback):
+    """Run a DSP backend one section at a time (batching buys nothing without a network)"""
+    progress = SeparationProgress(
+        progress_callback, sum(wav.shape[-1] for wav in wavs) / model.samplerate, len(wavs)
+    )
+    results = []
+    for idx, wav in enumerate(wavs, start=1):
+        check_cancelled(cancel_event)
+        report(f"Separating section {idx} of {len(wavs)} ({model.name})...")
+        progress.start_batch(idx, 1, wav.shape[-1] / model.samplerate, 1)
+        with tracing.stage('backend_separate', backend=model.name, frames=wav.shape[-1]):
+            results.append(model.separate(wav))
+        progress.end_batch()
+    return results
@@ -0,0 +1,116 @@
+import torch
+
+# Frequencies outside this band are never treated as vocals by the DSP backends
+VOCAL_BAND_HZ = (120.0, 8000.0)
+
+
+class Separator:
+    """Model-free separation backend that stands in for a Demucs model
+
+    Backends expose the attributes the pipeline reads from a Demucs model
+    (samplerate, audio_channels, sources), so they go through the same
+    resampling, stem cache and worker processes. separate_batch calls
+    `separate` on each section instead of apply_model.
+    """
+
+    name = None
+    description = ""
+    samplerate = 44100
+    audio_channels = 2
+    sources = ['other', 'vocals']
+
+    def separate(self, mix):
+        """Split a (channels, frames) tensor into a (sources, channels, frames) tensor"""
+        raise NotImplementedError
+
+    def eval(self):
+        return self
+
+
+def _band_mask(frequencies, low, high):
+    return ((frequencies >= low) & (frequencies <= high)).to(torch.float32)
+
+
+class CenterCancelSeparator(Separator):
+    """Mid/side karaoke trick: removes everything panned to the center above the bass
+
+    Anything mixed identically into both channels (usually the lead vocal)
+    cancels out, while the low end of the center is kept so kick and bass
+    survive. Mono material has no side signal, so only its bass remains.
+    """
+
+    name = 'center_cancel'
+    description = "Fastest (center channel cancellation)"
+
+    def separate(self, mix):
+        left, right = mix[0], mix[1]
+        mid = (left + right) / 2
+        side = (left - right) / 2
+
+        # Keep the center below the vocal band (FFT brick-wall over the whole section)
+        spectrum = torch.fft.rfft(mid)
+        frequencies = torch.fft.rfftfreq(mid.shape[-1], 1.0 / self.samplerate)
+        bass = torch.fft.irfft(spectrum * (frequencies < VOCAL_BAND_HZ[0]), n=mid.shape[-1])
+
+        instrumental = torch.stack([bass + side, bass - side])
+        return torch.stack([instrumental, mix - instrumental])
+
+
+class SpectralMaskSeparator(Separator):
+    """STFT center extraction: masks time-frequency bins that are identical in both channels
+
+    For every bin the inter-channel similarity 2|L R*| / (|L|^2 + |R|^2) is
+    1 for center-panned sound and falls towards 0 for sound panned to one
+    side. Raised to `sharpness` and limited to the vocal band, it becomes
+    a soft mask for the center (vocal) component, which is subtracted from
+    both channels. Everything is computed for all frames and bins at once.
+    """
+
+    name = 'spectral_mask'
+    description = "Fast (spectral center mask)"
+
+    def __init__(self, n_fft=2048, hop_length=512, sharpness=6.0):
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.sharpness = sharpness
+        self.window = torch.hann_window(n_fft)
+
+    def separate(self, mix):
+        frames = mix.shape[-1]
+        if frames < self.n_fft:
+            # Too short for an STFT frame; pad and trim afterwards
+            mix = torch.nn.functional.pad(mix, (0, self.n_fft - frames))
+
+        spec = torch.stft(
+            mix, self.n_fft, self.hop_length, window=self.window, return_complex=True
+        )
+        left, right = spec[0], spec[1]
+        power = left.abs() ** 2 + right.abs() ** 2
+        similarity = 2 * (left * right.conj()).abs() / power.clamp_min(1e-10)
+
+        frequencies = torch.fft.rfftfreq(self.n_fft, 1.0 / self.samplerate)
+        mask = similarity ** self.sharpness * _band_mask(frequencies, *VOCAL_BAND_HZ)[:, None]
+        center = mask * (left + right) / 2
+
+        vocal = torch.istft(
+            center, self.n_fft, self.hop_length, window=self.window, length=mix.shape[-1]
+        )
+        vocals = torch.stack([vocal, vocal])[..., :frames]
+        mix = mix[..., :frames]
+        return torch.stack([mix - vocals, vocals])
+
+
+BACKENDS = {
+    backend.name: backend
+    for backend in (SpectralMaskSeparator, CenterCancelSeparator)
+}
+
+
+def is_backend(name):
+    return name in BACKENDS
+
+
+def create(name):
+    """Instantiate a DSP backend by name"""
+    return BACKENDS[name]()
+
@@ -0,0 +1,140 @@
+import os
+import json
+
+import torch
+
+import paths
+from separation import DEFAULT_BATCH_SIZE
+
+SETTINGS_PATH = os.path.join(paths.internal_dir, 'settings.json')
+
+
+def cpu_count():
+    return max(1, os.cpu_count() or 1)
+
+
+class PerformanceSettings:
+    """Separation performance knobs, saved to _internal/settings.json
+
+    A value of None (shown as "Auto" in the GUI) is filled in from the
+    machine's core count when the settings are applied.
+    """
+
+    FIELDS = (
+        'threads',           # intra-op torch threads
+        'interop_threads',   # inter-op torch threads
+        'workers',           # segment-parallel worker pool used by apply_model
+        'segment',           # chunk length in seconds (None keeps the model default)
+        'overlap',           # overlap between chunks, 0-1
+        'shifts',            # random time shifts averaged per chunk
+        'batch_size',        # sections separated per apply_model call
+        'max_resident_models',
+        'stem_cache_mb',     # size cap of the separated stem cache (0 disables it)
+        'preseparate',       # separate whole songs in the background after loading
+        'max_concurrent_jobs',
+        'separation_processes',  # worker processes the app separates in
+        'write_trace',       # write a Chrome trace next to each performance report
+        'vocal_activity_lane',  # draw the vocal activity lane under the timeline waveform
+        'context_seconds',   # audio separated on each side of a section and trimmed off again
+        'crossfade_ms',      # equal-power crossfade at each splice in the output (0 for hard cuts)
+        'output_format',     # wav, flac, mp3 or opus
+        'output_bitrate_kbps',  # bitrate of lossy output formats (None keeps the encoder default)
+        'stem_export',       # also save every separated stem: off, sections or song
+    )
+
+    def __init__(self, threads=None, interop_threads=None, workers=None, segment=None,
+                 overlap=0.25, shifts=1, batch_size=DEFAULT_BATCH_SIZE, max_resident_models=1,
+                 stem_cache_mb=2048, preseparate=False, max_concurrent_jobs=1, separation_processes=1,
+                 write_trace=False, vocal_activity_lane=True, context_seconds=1.0, crossfade_ms=20.0,
+                 output_format='mp3', output_bitrate_kbps=None, stem_export='off'):
+        self.threads = threads
+        self.interop_threads = interop_threads
+        self.workers = workers
+        self.segment = segment
+        self.overlap = overlap
+        self.shifts = shifts
+        self.batch_size = batch_size
+        self.max_resident_models = max_resident_models
+        self.stem_cache_mb = stem_cache_mb
+        self.preseparate = preseparate
+        self.max_concurrent_jobs = max_concurrent_jobs
+        self.separation_processes = separation_processes
+        self.write_trace = write_trace
+        self.vocal_activity_lane = vocal_activity_lane
+        self.context_seconds = context_seconds
+        self.crossfade_ms = crossfade_ms
+        self.output_format = output_format
+        self.output_bitrate_kbps = output_bitrate_kbps
+        self.stem_export = stem_export
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**{key: data[key] for key in cls.FIELDS if key in data})
+
+    def to_dict(self):
+        return {key: getattr(self, key) for key in self.FIELDS}
+
+    @classmethod
+    def load(cls, path=SETTINGS_PATH):
+        """Read settings from disk, falling back to defaults if the file is missing or broken"""
+        try:
+            with open(path) as f:
+                return cls.from_dict(json.load(f))
+        except (OSError, ValueError, TypeError):
+            return cls()
+
+    def save(self, path=SETTINGS_PATH):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def resolved_workers(self):
+        if self.workers:
+            return self.workers
+        # A few chunk workers, each with a share of the cores, keeps big boxes busy
+        return max(1, min(4, cpu_count() // 4))
+
+    def resolved_threads(self):
+        if self.threads:
+            return self.threads
+        return max(1, cpu_count() // self.resolved_workers())
+
+    def resolved_interop_threads(self):
+        if self.interop_threads:
+            return self.interop_threads
+        return max(1, min(4, cpu_count()))
+
+    def apply_torch_threads(self):
+        """Configure torch's thread pools for this process"""
+        torch.set_num_threads(self.resolved_threads())
+        try:
+            torch.set_num_interop_threads(self.resolved_interop_threads())
+        except RuntimeError:
+            # Inter-op threads can only be set once, before any parallel work has started
+            pass
+
+    def apply_model_kwargs(self, model):
+        """Keyword arguments for apply_model based on these settings"""
+        kwargs = {
+            'num_workers': self.resolved_workers(),
+            'overlap': float(self.overlap),
+            'shifts': int(self.shifts),
+        }
+        if self.segment:
+            # Transformer models can't run on chunks longer than they were trained on
+            max_segment = getattr(model, 'max_allowed_segment', None)
+            kwargs['segment'] = min(float(self.segment), max_segment) if max_segment else float(self.segment)
+        return kwargs
+
+    def encoder_bitrate(self):
+        """ffmpeg bitrate for lossy output formats, or None for the encoder's default"""
+        return f"{int(self.output_bitrate_kbps)}k" if self.output_bitrate_kbps else None
+
+    def cache_params(self, model):
+        """The apply_model arguments that change separated output, for cache keys"""
+        kwargs = self.apply_model_kwargs(model)
+        kwargs.pop('num_workers')
+        return kwargs
+
+
+def load_settings():
+    return PerformanceSettings.load()
@@ -0,0 +1,135 @@
+import os
+import json
+import hashlib
+import threading
+import uuid
+
+import numpy as np
+import torch
+
+import paths
+
+STEM_CACHE_DIR = os.path.join(paths.cache_dir, 'stems')
+HASH_CHUNK_SIZE = 4 * 1024 * 1024
+
+
+class StemCache:
+    """Content-addressed on-disk cache of separated stems
+
+    Entries are keyed by the audio file's content hash, the frame range,
+    the model and the separation parameters that change its output. Each
+    entry holds every source the model produced at the model's sample
+    rate. The least recently used entries are evicted once the cache
+    grows past its size cap.
+    """
+
+    def __init__(self, cache_dir=STEM_CACHE_DIR, max_bytes=2 * 1024 ** 3):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._digests = {}
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def file_digest(self, file_path):
+        """Content hash of a file, memoized on its size and modification time"""
+        stat = os.stat(file_path)
+        memo_key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            if memo_key in self._digests:
+                return self._digests[memo_key]
+
+        digest = hashlib.blake2b(digest_size=20)
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+                digest.update(chunk)
+        result = digest.hexdigest()
+
+        with self._lock:
+            self._digests[memo_key] = result
+        return result
+
+    def make_key(self, content_hash, start_frame, end_frame, frame_rate, model_name, params):
+        """Cache key for one separated range"""
+        description = json.dumps({
+            'content': content_hash,
+            'range': [int(start_frame), int(end_frame)],
+            'frame_rate': int(frame_rate),
+            'model': model_name,
+            'params': params,
+        }, sort_keys=True)
+        return hashlib.blake2b(description.encode(), digest_size=20).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npy")
+
+    def get(self, key):
+        """Cached sources tensor for a key, or None"""
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        try:
+            sources = np.load(path)
+            # Touch the entry so eviction sees it as recently used
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return torch.from_numpy(sources)
+
+    def put(self, key, sources):
+        """Store a sources tensor and evict old entries past the size cap"""
+        if not self.enabled:
+            return
+        path = self._path(key)
+        temp_path = os.path.join(self.cache_dir, f".{uuid.uuid4().hex}.tmp")
+        try:
+            with open(temp_path, 'wb') as f:
+                np.save(f, sources.detach().cpu().numpy().astype(np.float32, copy=False))
+            # Atomic so concurrent readers never see a partial entry
+            os.replace(temp_path, path)
+        except OSError:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            return
+        self.evict()
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits its cap"""
+        with self._lock:
+            entries = []
+            total = 0
+            try:
+                for entry in os.scandir(self.cache_dir):
+                    if entry.name.endswith('.npy'):
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+                        total += stat.st_size
+            except OSError:
+                return
+
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+
+    def clear(self):
+        with self._lock:
+            for entry in os.scandir(self.cache_dir):
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+
+
+# Shared by every job in this process
+stem_cache = StemCache()
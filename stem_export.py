@@ -0,0 +1,69 @@
+import os
+import json
+import datetime
+
+from encoder import encode_segment, output_extension
+
+# 'sections' writes the stems of each processed section, 'song' those of the whole song
+STEM_MODES = ('off', 'sections', 'song')
+STEMS_DIR = 'stems'
+MANIFEST_NAME = 'manifest.json'
+
+
+class StemExport:
+    """Writes the separated stems of a job into its output folder, with a manifest
+
+    Every stem the model produces (e.g. drums, bass, other and vocals) is
+    saved in the job's output format under stems/, named after the range
+    it covers. stems/manifest.json lists each range with its position in
+    the song, in seconds and in frames, and the file of every stem, so
+    other tools can use them without separating the song again.
+    """
+
+    def __init__(self, output_dir, song, song_path, model_name, sources, settings):
+        self.stems_dir = os.path.join(output_dir, STEMS_DIR)
+        self.song = song
+        self.song_path = song_path
+        self.model_name = model_name
+        self.sources = list(sources)
+        self.settings = settings
+        self.ranges = []
+        os.makedirs(self.stems_dir, exist_ok=True)
+
+    def add(self, name, start_frame, end_frame, stems):
+        """Encode the stems of one range; `stems` maps source names to AudioSegments"""
+        extension = output_extension(self.settings.output_format)
+        files = {}
+        for source, stem in stems.items():
+            file_name = f"{name}_{source}.{extension}"
+            encode_segment(
+                stem, os.path.join(self.stems_dir, file_name),
+                self.settings.output_format, self.settings.encoder_bitrate()
+            )
+            files[source] = file_name
+        frame_rate = float(self.song.frame_rate)
+        self.ranges.append({
+            'name': name,
+            'start': round(start_frame / frame_rate, 6),
+            'end': round(end_frame / frame_rate, 6),
+            'start_frame': start_frame,
+            'end_frame': end_frame,
+            'files': files,
+        })
+
+    def write_manifest(self):
+        manifest = {
+            'song': os.path.basename(self.song_path),
+            'model': self.model_name,
+            'sources': self.sources,
+            'scope': self.settings.stem_export,
+            'format': self.settings.output_format,
+            'frame_rate': self.song.frame_rate,
+            'channels': self.song.channels,
+            'created': datetime.datetime.now().isoformat(timespec='seconds'),
+            'ranges': self.ranges,
+        }
+        path = os.path.join(self.stems_dir, MANIFEST_NAME)
+        with open(path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        return path
@@ -0,0 +1,191 @@
+import math
+import functools
+
+import numpy as np
+import torch
+from julius import ResampleFrac
+from pydub import AudioSegment
+from demucs.audio import convert_audio_channels
+
+# numpy dtypes for the sample widths pydub keeps in memory (8-bit data is stored signed)
+SAMPLE_DTYPES = {
+    1: np.int8,
+    2: np.int16,
+    4: np.int32,
+}
+
+
+def _full_scale(sample_width):
+    return float(2 ** (8 * sample_width - 1))
+
+
+def segment_to_array(segment):
+    """View a pydub AudioSegment's raw buffer as a (frames, channels) integer array without copying"""
+    if segment.sample_width not in SAMPLE_DTYPES:
+        segment = segment.set_sample_width(2)
+    dtype = SAMPLE_DTYPES[segment.sample_width]
+    samples = np.frombuffer(segment.raw_data, dtype=dtype)
+    return samples.reshape(-1, segment.channels)
+
+
+def segment_to_tensor(segment):
+    """Convert a pydub AudioSegment to a float32 tensor shaped (channels, frames) in [-1, 1]"""
+    samples = segment_to_array(segment)
+    # Single copy: integer view -> float32 channels-first buffer that torch shares
+    wav = np.empty((samples.shape[1], samples.shape[0]), dtype=np.float32)
+    np.multiply(samples.T, 1.0 / _full_scale(samples.itemsize), out=wav, casting='unsafe')
+    return torch.from_numpy(wav)
+
+
+def tensor_to_segment(wav, frame_rate, sample_width=2):
+    """Convert a float tensor shaped (channels, frames) back into a pydub AudioSegment"""
+    if sample_width not in SAMPLE_DTYPES:
+        sample_width = 2
+    dtype = SAMPLE_DTYPES[sample_width]
+    full_scale = _full_scale(sample_width)
+
+    samples = wav.detach().cpu().numpy()
+    # float32 can't hold 2**31 - 1 (it rounds up to 2**31, which wraps to the most
+    # negative int32), so 32-bit samples are scaled and clipped in float64
+    work_dtype = np.float64 if sample_width == 4 else np.float32
+    # Interleave channels while scaling, then clip and quantize in place
+    scaled = np.multiply(samples.T, full_scale, dtype=work_dtype)
+    np.clip(scaled, -full_scale, full_scale - 1, out=scaled)
+    np.rint(scaled, out=scaled)
+    pcm = scaled.astype(dtype)
+
+    return AudioSegment(
+        data=pcm.tobytes(),
+        sample_width=sample_width,
+        frame_rate=int(frame_rate),
+        channels=samples.shape[0],
+    )
+
+
+def fit_length(wav, frames):
+    """Trim or zero-pad the last dimension to exactly `frames` (resampling can be off by one)"""
+    length = wav.shape[-1]
+    if length > frames:
+        return wav[..., :frames]
+    if length < frames:
+        return torch.nn.functional.pad(wav, (0, frames - length))
+    return wav
+
+
+@functools.lru_cache(maxsize=8)
+def resampler(from_rate, to_rate):
+    """Sinc resampler between two rates, whose filter bank is built once and then reused
+
+    julius.resample_frac (what demucs' convert_audio uses) rebuilds the
+    filters on every call, which costs more than resampling a short section.
+    """
+    return ResampleFrac(int(from_rate), int(to_rate))
+
+
+def resampled_length(frames, from_rate, to_rate):
+    """Frames `frames` input frames become at another rate (rounded down, like julius)"""
+    return frames * int(to_rate) // int(from_rate)
+
+
+def convert_rate(wav, from_rate, to_rate, channels, frames=None):
+    """Convert a (channels, frames) tensor to another channel count and sample rate
+
+    When `frames` is given the result is made exactly that many frames long.
+    """
+    wav = convert_audio_channels(wav, channels)
+    if from_rate != to_rate:
+        with torch.no_grad():
+            wav = resampler(from_rate, to_rate)(wav)
+    if frames is not None:
+        wav = fit_length(wav, frames)
+    return wav
+
+
+def conversion_path(frame_rate, channels, model):
+    """How audio reaches the model: 'native' (as is), 'channels' (only remixed) or 'resample'"""
+    if frame_rate != model.samplerate:
+        return 'resample'
+    if channels != model.audio_channels:
+        return 'channels'
+    return 'native'
+
+
+def segment_to_model_input(segment, model):
+    """Convert a section to the model's sample rate and channel count, all in memory"""
+    wav = segment_to_tensor(segment)
+    return convert_rate(wav, segment.frame_rate, model.samplerate, model.audio_channels)
+
+
+def model_output_to_segment(wav, model, like, frames=None):
+    """Convert a model output back to the sample rate, channels and width of `like`
+
+    When `frames` is given the result is made exactly that many frames long.
+    """
+    wav = convert_rate(wav, model.samplerate, like.frame_rate, like.channels, frames)
+    return tensor_to_segment(wav, like.frame_rate, like.sample_width)
+
+
+class ModelRateSong:
+    """A song converted to the model's sample rate and channels block by block, then cut into windows
+
+    Resampling each section's window on its own converts the overlapping
+    context twice and puts filter edge effects inside every window. This
+    converts the song in fixed blocks on a grid aligned to the song, each
+    with a little of its neighbours as filter padding, so every frame is
+    resampled once and windows match a whole-song resample. Only blocks a
+    window touches are converted, and windows must be asked for in song
+    order: blocks before the latest window are freed, so a short section
+    of a long mix never converts or holds the whole song. Windows are
+    given in the song's frames and returned as model-rate copies (so
+    sending one to a worker process doesn't share the whole song).
+    """
+
+    BLOCK_SECONDS = 30.0
+    # Far more than the sinc filter of any rate pair needs on either side
+    PAD_SECONDS = 0.1
+
+    def __init__(self, song, model):
+        self.song = song
+        self.model = model
+        rate, model_rate = int(song.frame_rate), int(model.samplerate)
+        divisor = math.gcd(rate, model_rate)
+        # Multiples of this many song frames land on whole model-rate frames
+        self._step = rate // divisor
+        self._model_step = model_rate // divisor
+        self._block = self._frames_on_grid(self.BLOCK_SECONDS)
+        self._pad = self._frames_on_grid(self.PAD_SECONDS)
+        self._blocks = {}
+
+    def _frames_on_grid(self, seconds):
+        return self._step * max(1, math.ceil(seconds * self.song.frame_rate / self._step))
+
+    def _converted_block(self, index):
+        wav = self._blocks.get(index)
+        if wav is None:
+            start = index * self._block
+            pad_start = max(0, start - self._pad)
+            # Slices stop at the end of the song, and only wait for the decoder to get this far
+            clip = self.song.get_sample_slice(pad_start, start + self._block + self._pad)
+            end = max(start, min(start + self._block, pad_start + int(clip.frame_count())))
+            padded = segment_to_model_input(clip, self.model)
+            rate, model_rate = self.song.frame_rate, self.model.samplerate
+            offset = resampled_length(start - pad_start, rate, model_rate)
+            length = resampled_length(end - start, rate, model_rate)
+            wav = self._blocks[index] = padded[..., offset:offset + length].clone()
+        return wav
+
+    def window(self, start_frame, end_frame):
+        """Model input for song frames start_frame:end_frame"""
+        rate, model_rate = self.song.frame_rate, self.model.samplerate
+        start = resampled_length(start_frame, rate, model_rate)
+        length = resampled_length(end_frame - start_frame, rate, model_rate)
+        model_block = self._block // self._step * self._model_step
+
+        first = start_frame // self._block
+        last = max(first, (end_frame - 1) // self._block)
+        # Earlier blocks are never needed again
+        for index in [index for index in self._blocks if index < first]:
+            del self._blocks[index]
+        wav = torch.cat([self._converted_block(index) for index in range(first, last + 1)], dim=-1)
+        offset = start - first * model_block
+        return fit_length(wav[..., offset:offset + length], length).clone()
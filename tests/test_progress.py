@@ -0,0 +1,42 @@
+from progress import JobProgress, SeparationProgress, describe_progress
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_job_progress_over_two_waves():
+    clock = FakeClock()
+    updates = []
+    job = JobProgress(updates.append, seconds_total=20.0, waves=2, clock=clock)
+
+    for wave in range(2):
+        separation = SeparationProgress(job.part(10.0), 10.0, 1, clock=clock)
+        separation.start_batch(1, 2, 10.0, 4)
+        for _ in range(4):
+            clock.now += 1.0
+            separation.chunk_done()
+        separation.end_batch()
+
+    # The second wave starts with the throughput of the first, but none of its own
+    second_start = updates[len(updates) // 2]
+    assert second_start['batch'] == 2
+    assert second_start['seconds_done'] == 10.0
+    assert second_start['throughput'] is not None
+    assert second_start['section_eta'] is not None
+    assert updates[-1]['seconds_done'] == 20.0
+    assert updates[-1]['job_eta'] == 0.0
+    for progress in updates:
+        describe_progress(progress)
+
+
+def test_describe_progress_without_etas():
+    progress = {
+        'batch': 1, 'batches': 2, 'chunks_done': 0, 'chunks_total': 4, 'seconds_done': 5.0,
+        'seconds_total': 10.0, 'throughput': 2.0, 'section_eta': None, 'job_eta': None,
+    }
+    assert describe_progress(progress).endswith("(2.0x realtime)")
@@ -0,0 +1,281 @@
+import os
+import sys
+import json
+import time
+import datetime
+import threading
+from contextlib import contextmanager
+
+try:
+    import psutil
+except ImportError:  # Current RSS is only reported with psutil
+    psutil = None
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+REPORT_NAME = "performance.json"
+TRACE_NAME = "trace.json"
+# How often RSS is sampled while stages run
+SAMPLE_SECONDS = 0.02
+
+_local = threading.local()
+
+
+def rss_mb():
+    """Current resident set size in MB, or None without psutil"""
+    if psutil is None:
+        return None
+    return psutil.Process().memory_info().rss / (1024 * 1024)
+
+
+def process_peak_rss_mb():
+    """Highest resident set size this process has reached in its lifetime, in MB"""
+    if psutil is not None and sys.platform == 'win32':
+        return psutil.Process().memory_info().peak_wset / (1024 * 1024)
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes, macOS bytes
+        return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+    return None
+
+
+class _RssSampler:
+    """Samples this process's RSS in a background thread while any stage is running
+
+    Every running stage gets a record whose peak is raised by each
+    sample, so a stage reports the most memory used while it ran rather
+    than the process's lifetime high-water mark.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # By id: records of stages at the same RSS compare equal
+        self._records = {}
+        self._thread = None
+
+    @contextmanager
+    def track(self):
+        """Yields a dict whose 'peak' holds the highest RSS (MB) seen so far, or None without psutil"""
+        record = {'peak': rss_mb()}
+        if record['peak'] is None:
+            yield record
+            return
+        with self._lock:
+            self._records[id(record)] = record
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='rss sampler', daemon=True)
+                self._thread.start()
+        try:
+            yield record
+        finally:
+            with self._lock:
+                del self._records[id(record)]
+            # One last sample, so short stages still see their end
+            current = rss_mb()
+            record['peak'] = max(record['peak'], current)
+
+    def _run(self):
+        while True:
+            time.sleep(SAMPLE_SECONDS)
+            current = rss_mb()
+            with self._lock:
+                if not self._records:
+                    self._thread = None
+                    return
+                for record in self._records.values():
+                    record['peak'] = max(record['peak'], current)
+
+
+_sampler = _RssSampler()
+
+
+def _round(value, digits=3):
+    return None if value is None else round(value, digits)
+
+
+class Tracer:
+    """Records wall time, CPU time and memory for each stage of a job
+
+    Stages are timed with the `stage` context manager, either on a tracer
+    directly or through the module-level `stage` function, which uses the
+    tracer activated on the current thread (and does nothing without one).
+    CPU time is for the whole process, so it includes other threads
+    working at the same time. Each stage's peak RSS is sampled while it
+    runs (with psutil), so it includes memory used by other threads at the
+    same time but not by earlier stages. Stages started inside
+    `song(path)` are tagged with that song, so one tracer can cover a batch
+    of songs and still write a report per song (see `events_for`).
+    """
+
+    def __init__(self, process='main'):
+        self.process = process
+        self.started = time.time()
+        self.events = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name, **args):
+        start = time.time()
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        rss_start = rss_mb()
+        song_path = getattr(_local, 'song', None)
+        rss = {'peak': None}
+        try:
+            with _sampler.track() as rss:
+                yield
+        finally:
+            self.add({
+                'name': name,
+                'song': song_path,
+                'process': self.process,
+                'thread': threading.current_thread().name,
+                'start': start - self.started,
+                'wall': time.perf_counter() - wall_start,
+                'cpu': time.process_time() - cpu_start,
+                'rss_start_mb': _round(rss_start, 1),
+                'rss_end_mb': _round(rss_mb(), 1),
+                'peak_rss_mb': _round(rss['peak'], 1),
+                'args': args,
+            })
+
+    def add(self, event):
+        with self._lock:
+            self.events.append(event)
+
+    def merge(self, events, started):
+        """Add events recorded by another tracer (e.g. in a worker process) that began at `started`"""
+        offset = started - self.started
+        for event in events:
+            self.add(dict(event, start=event['start'] + offset))
+
+    @contextmanager
+    def activate(self):
+        """Make this the tracer used by `stage` on the current thread"""
+        previous = getattr(_local, 'tracer', None)
+        _local.tracer = self
+        try:
+            yield self
+        finally:
+            _local.tracer = previous
+
+    def events_for(self, song_path=None):
+        """Events sorted by start; for one song, its own and those shared by the whole batch"""
+        with self._lock:
+            events = sorted(self.events, key=lambda event: event['start'])
+        if song_path is None:
+            return events
+        return [event for event in events if event.get('song') in (None, song_path)]
+
+    def summary(self, song_path=None):
+        """Totals per stage name, in the order the stages first started"""
+        events = self.events_for(song_path)
+        stages = {}
+        for event in events:
+            totals = stages.setdefault(event['name'], {
+                'count': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'peak_rss_mb': None,
+            })
+            totals['count'] += 1
+            totals['wall_seconds'] += event['wall']
+            totals['cpu_seconds'] += event['cpu']
+            if event['peak_rss_mb'] is not None:
+                totals['peak_rss_mb'] = max(totals['peak_rss_mb'] or 0.0, event['peak_rss_mb'])
+        for totals in stages.values():
+            totals['wall_seconds'] = _round(totals['wall_seconds'])
+            totals['cpu_seconds'] = _round(totals['cpu_seconds'])
+        return stages
+
+    def report(self, song_path=None, **info):
+        """Report of every event, or of one song's events and the ones shared with its batch
+
+        For one song, wall_seconds runs until its last own stage ended
+        (usually when its output was moved into place).
+        """
+        events = self.events_for(song_path)
+        peaks = [event['peak_rss_mb'] for event in events if event['peak_rss_mb'] is not None]
+        own_ends = [event['start'] + event['wall'] for event in events if event.get('song') is not None]
+        if song_path is not None and own_ends:
+            wall_seconds = max(own_ends)
+        else:
+            wall_seconds = time.time() - self.started
+        return dict(
+            info,
+            started=datetime.datetime.fromtimestamp(self.started).isoformat(timespec='seconds'),
+            wall_seconds=_round(wall_seconds),
+            peak_rss_mb=max(peaks) if peaks else None,
+            process_peak_rss_mb=_round(process_peak_rss_mb(), 1),
+            stages=self.summary(song_path),
+            events=[
+                dict(event, start=_round(event['start']), wall=_round(event['wall']),
+                     cpu=_round(event['cpu']))
+                for event in events
+            ],
+        )
+
+    def write_report(self, output_dir, song_path=None, **info):
+        """Write performance.json into the output folder"""
+        report_path = os.path.join(output_dir, REPORT_NAME)
+        with open(report_path, 'w') as f:
+            json.dump(self.report(song_path, **info), f, indent=2)
+        return report_path
+
+    def write_chrome_trace(self, output_dir, song_path=None):
+        """Write trace.json for chrome://tracing or ui.perfetto.dev"""
+        processes = {}
+        threads = {}
+        trace_events = []
+        for event in self.events_for(song_path):
+            pid = processes.setdefault(event['process'], len(processes) + 1)
+            tid = threads.setdefault((event['process'], event['thread']), len(threads) + 1)
+            trace_events.append({
+                'name': event['name'],
+                'ph': 'X',
+                'ts': int(event['start'] * 1e6),
+                'dur': int(event['wall'] * 1e6),
+                'pid': pid,
+                'tid': tid,
+                'args': dict(event['args'], cpu=event['cpu'], peak_rss_mb=event['peak_rss_mb']),
+            })
+        # Name the tracks after the process and thread they came from
+        for name, pid in processes.items():
+            trace_events.append({'name': 'process_name', 'ph': 'M', 'pid': pid, 'args': {'name': name}})
+        for (process, thread), tid in threads.items():
+            trace_events.append({
+                'name': 'thread_name', 'ph': 'M', 'pid': processes[process], 'tid': tid,
+                'args': {'name': thread},
+            })
+
+        trace_path = os.path.join(output_dir, TRACE_NAME)
+        with open(trace_path, 'w') as f:
+            json.dump({'traceEvents': trace_events, 'displayTimeUnit': 'ms'}, f)
+        return trace_path
+
+
+@contextmanager
+def song(song_path):
+    """Tag the stages started inside (on this thread) with the song they work on"""
+    previous = getattr(_local, 'song', None)
+    _local.song = song_path
+    try:
+        yield
+    finally:
+        _local.song = previous
+
+
+def current():
+    """The tracer active on this thread, or None"""
+    return getattr(_local, 'tracer', None)
+
+
+@contextmanager
+def stage(name, **args):
+    """Time a stage with the active tracer, if there is one"""
+    tracer = current()
+    if tracer is None:
+        yield
+        return
+    with tracer.stage(name, **args):
+        yield
@@ -0,0 +1,34 @@
+def format_time(seconds):
+    """Helper function to format time in MM:SS format"""
+    minutes = int(seconds) // 60
+    secs = int(seconds) % 60
+    return f"{minutes:02}:{secs:02}"
+
+def format_time_precise(seconds):
+    """Helper function to format time with decimal precision"""
+    minutes = int(seconds) // 60
+    secs = seconds % 60
+    
+    # Always format with 2 decimal places, but only use 2 digits for seconds
+    return f"{minutes:02}:{secs:05.2f}"
+
+def parse_time(text):
+    """Helper function to parse SS, MM:SS or HH:MM:SS (with optional decimals) into seconds"""
+    parts = text.strip().split(":")
+    if not parts or len(parts) > 3:
+        raise ValueError(f"Invalid time: {text!r}")
+
+    seconds = 0.0
+    for part in parts:
+        seconds = seconds * 60 + float(part)
+    if seconds < 0:
+        raise ValueError(f"Invalid time: {text!r}")
+    return seconds
+
+def seconds_to_frames(seconds, frame_rate):
+    """Nearest sample frame to a time in seconds (times only become frames at the UI edge)"""
+    return int(round(float(seconds) * frame_rate))
+
+def frames_to_seconds(frames, frame_rate):
+    """Time in seconds of a sample frame, for display"""
+    return frames / float(frame_rate)
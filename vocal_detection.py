@@ -0,0 +1,125 @@
+import numpy as np
+
+from waveform import ACTIVITY_BLOCK_FRAMES, WaveformOverview
+
+# Smoothed activity is rescaled so these song percentiles map to 0 and 1, which
+# adapts the thresholds to how center-heavy each mix is
+FLOOR_PERCENTILE = 10
+CEILING_PERCENTILE = 95
+
+
+class DetectionOptions:
+    """Parameters of the vocal section detector, all times in seconds"""
+
+    def __init__(self, on_threshold=0.6, off_threshold=0.4, smooth_seconds=0.5,
+                 merge_gap_seconds=1.5, min_length_seconds=2.0, pad_seconds=0.25):
+        # A section starts when the scaled activity rises above on_threshold and
+        # only ends once it falls below off_threshold (hysteresis)
+        self.on_threshold = on_threshold
+        self.off_threshold = off_threshold
+        self.smooth_seconds = smooth_seconds
+        self.merge_gap_seconds = merge_gap_seconds
+        self.min_length_seconds = min_length_seconds
+        self.pad_seconds = pad_seconds
+
+
+def _smooth(activity, blocks):
+    if blocks <= 1:
+        return activity
+    kernel = np.ones(blocks, dtype=np.float32) / blocks
+    return np.convolve(activity, kernel, mode='same')
+
+
+def _rescale(activity):
+    """Map the song's own activity range to 0-1, ignoring silent blocks"""
+    audible = activity[activity > 0]
+    if len(audible) == 0:
+        return np.zeros_like(activity)
+    floor, ceiling = np.percentile(audible, [FLOOR_PERCENTILE, CEILING_PERCENTILE])
+    if ceiling - floor < 1e-6:
+        # Flat activity (e.g. a constant tone) gives no contrast to detect against
+        return np.zeros_like(activity)
+    return np.clip((activity - floor) / (ceiling - floor), 0.0, 1.0)
+
+
+def hysteresis(values, on_threshold, off_threshold):
+    """Boolean state that turns on above on_threshold and off below off_threshold
+
+    Vectorized: each block takes the decision of the last block that was
+    above on_threshold or below off_threshold; blocks in between keep it.
+    """
+    decided = (values >= on_threshold) | (values <= off_threshold)
+    last_decided = np.maximum.accumulate(np.where(decided, np.arange(len(values)), -1))
+    state = values[np.maximum(last_decided, 0)] >= on_threshold
+    # Blocks before the first decision start off
+    return state & (last_decided >= 0)
+
+
+def _runs(state):
+    """(start, end) block indices of each run of True values"""
+    edges = np.diff(np.concatenate([[0], state.astype(np.int8), [0]]))
+    return list(zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)))
+
+
+def detect_sections(activity, frame_rate, options=None, block_frames=ACTIVITY_BLOCK_FRAMES,
+                    total_frames=None):
+    """Vocal sections as sorted (start, end) sample frames from a per-block activity envelope
+
+    The envelope is smoothed, rescaled to the song's own range and turned
+    into on/off regions with hysteresis. Regions separated by less than
+    merge_gap_seconds are joined, regions shorter than min_length_seconds
+    are dropped, and the rest are padded on both sides.
+    """
+    options = options or DetectionOptions()
+    activity = np.asarray(activity, dtype=np.float32)
+    if len(activity) == 0:
+        return []
+    if total_frames is None:
+        total_frames = len(activity) * block_frames
+    block_seconds = block_frames / float(frame_rate)
+    # The options are in seconds; everything below works in whole frames
+    merge_gap = options.merge_gap_seconds * frame_rate
+    min_length = options.min_length_seconds * frame_rate
+    pad = int(round(options.pad_seconds * frame_rate))
+
+    smoothed = _smooth(activity, int(round(options.smooth_seconds / block_seconds)))
+    state = hysteresis(_rescale(smoothed), options.on_threshold, options.off_threshold)
+
+    sections = []
+    for start, end in _runs(state):
+        start_frame, end_frame = int(start) * block_frames, int(end) * block_frames
+        if sections and start_frame - sections[-1][1] < merge_gap:
+            sections[-1] = (sections[-1][0], end_frame)
+        else:
+            sections.append((start_frame, end_frame))
+
+    padded = []
+    for start_frame, end_frame in sections:
+        if end_frame - start_frame < min_length:
+            continue
+        start_frame = max(0, start_frame - pad)
+        end_frame = min(total_frames, end_frame + pad)
+        # Padding can make neighbours touch; keep them as one section
+        if padded and start_frame <= padded[-1][1]:
+            padded[-1] = (padded[-1][0], end_frame)
+        else:
+            padded.append((start_frame, end_frame))
+    return padded
+
+
+def detect_song_sections(song, song_path, options=None, overview=None):
+    """Detect vocal sections of a whole song, as (start, end) sample frames
+
+    Uses the song's waveform overview (built here if none is given, and
+    cached, so the GUI shows it instantly afterwards).
+    """
+    if overview is None:
+        overview = WaveformOverview(song, song_path)
+        overview.build()
+    if not overview.complete:
+        # Raises the decoding error, if that is what stopped the analysis
+        song.wait()
+        raise RuntimeError(f"Could not analyze {song_path}")
+    return detect_sections(
+        overview.activity_blocks(), song.frame_rate, options, total_frames=overview.frames
+    )
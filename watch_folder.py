@@ -0,0 +1,399 @@
+"""Watch-folder service that processes audio files dropped into a folder, without the GUI
+
+Examples:
+    python watch_folder.py inbox
+    python watch_folder.py inbox --output renders --jobs 2
+    python watch_folder.py inbox --detect-vocals --quarantine /srv/failed
+
+Every audio file needs a sections file next to it with the same name:
+song.json holds {"sections": [[start, end], ...]} (or just the list), and
+song.csv has start and end columns with one section per row. Times use
+the same formats as cli.py. With --detect-vocals, files without a
+sections file get their vocal sections detected instead.
+
+A file is picked up once neither it nor its sections file has changed
+for --settle seconds, so files still being copied are left alone.
+Results go to the usual <name>_<timestamp> folders under --output.
+Processed inputs are moved to the done/ subfolder. Inputs that fail
+(twice, counting crashes of the service) are moved to the quarantine
+folder with an .error.txt note. What was started and finished is kept
+in a state file, so a restarted service retries interrupted files and
+never processes a finished one again.
+"""
+import argparse
+import csv
+import datetime
+import json
+import os
+import shutil
+import signal
+import sys
+import threading
+import time
+import uuid
+
+import paths
+from cli import add_performance_arguments, build_settings, frame_sections, section_from_values
+from engine import load_song
+from job_queue import Job, JobQueue
+from model_registry import DEFAULT_MODEL, model_registry
+from separators import BACKENDS
+from stem_cache import stem_cache
+from vocal_detection import detect_song_sections
+
+AUDIO_EXTENSIONS = ('.mp3', '.wav', '.flac', '.ogg', '.opus', '.m4a', '.aac', '.aiff', '.wma')
+SIDECAR_EXTENSIONS = ('.json', '.csv')
+STATE_NAME = '.watch_state.json'
+DONE_DIR = 'done'
+QUARANTINE_DIR = 'quarantine'
+
+DEFAULT_SETTLE_SECONDS = 5.0
+DEFAULT_POLL_SECONDS = 2.0
+# How long an audio file waits for its sections file before it is quarantined
+DEFAULT_SIDECAR_WAIT_SECONDS = 120.0
+# Attempts per file, including ones cut short by a crash, before it is quarantined
+MAX_ATTEMPTS = 2
+
+
+def read_sidecar(path):
+    """Sections in seconds from a song's .json or .csv sections file"""
+    if path.lower().endswith('.csv'):
+        with open(path, newline='') as f:
+            return [section_from_values(row['start'], row['end']) for row in csv.DictReader(f)]
+    with open(path) as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data['sections']
+    return [section_from_values(start, end) for start, end in data]
+
+
+def move_into(folder, path):
+    """Move a file into a folder, renaming it if the name is taken; returns the new path"""
+    os.makedirs(folder, exist_ok=True)
+    base, extension = os.path.splitext(os.path.basename(path))
+    target = os.path.join(folder, base + extension)
+    suffix = 2
+    while os.path.exists(target):
+        target = os.path.join(folder, f"{base}_{suffix}{extension}")
+        suffix += 1
+    # Renames on the same drive, copies across drives
+    shutil.move(path, target)
+    return target
+
+
+class WatchState:
+    """Restart-safe record of the files the service has started and finished
+
+    Entries are keyed by the content hash of the audio file and its
+    sections file, so a file that is dropped again after being processed
+    is recognized, and a renamed copy of new audio is not. The file is
+    rewritten atomically after every change.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path) as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def get(self, key):
+        with self._lock:
+            return dict(self.entries.get(key) or {})
+
+    def update(self, key, **fields):
+        with self._lock:
+            entry = self.entries.setdefault(key, {})
+            entry.update(fields, updated=datetime.datetime.now().isoformat(timespec='seconds'))
+            self._save()
+
+    def forget(self, key):
+        with self._lock:
+            if self.entries.pop(key, None) is not None:
+                self._save()
+
+    def _save(self):
+        temp_path = f"{self.path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(self.entries, f, indent=2)
+        os.replace(temp_path, self.path)
+
+
+class FolderWatcher:
+    """Polls an input folder and runs the files that have settled through a JobQueue
+
+    At most `max_jobs` jobs run at once, and only one more is loaded and
+    waiting, so a big drop doesn't open every file at once. The model is
+    loaded before the first file arrives and stays resident between jobs.
+    """
+
+    def __init__(self, input_dir, settings, output_root=paths.output_root, model_name=DEFAULT_MODEL,
+                 quarantine_dir=None, state_path=None, settle_seconds=DEFAULT_SETTLE_SECONDS,
+                 poll_seconds=DEFAULT_POLL_SECONDS, sidecar_wait_seconds=DEFAULT_SIDECAR_WAIT_SECONDS,
+                 detect_vocals=False, max_jobs=1, report=print):
+        self.input_dir = input_dir
+        self.settings = settings
+        self.output_root = output_root
+        self.model_name = model_name
+        self.done_dir = os.path.join(input_dir, DONE_DIR)
+        self.quarantine_dir = quarantine_dir or os.path.join(input_dir, QUARANTINE_DIR)
+        self.state = WatchState(state_path or os.path.join(input_dir, STATE_NAME))
+        self.settle_seconds = settle_seconds
+        self.poll_seconds = poll_seconds
+        self.sidecar_wait_seconds = sidecar_wait_seconds
+        self.detect_vocals = detect_vocals
+        self.max_jobs = max(1, int(max_jobs))
+        self.report = report
+
+        # path -> (size, mtime_ns of the file and its sidecar) and when that was first seen;
+        # only the polling thread uses it, never the job callbacks
+        self._seen = {}
+        # path -> the Job processing it
+        self._active = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.queue = JobQueue(self.max_jobs, on_update=self._on_job_update)
+
+    def warm_up(self):
+        """Load the model now, so the first file doesn't wait for it"""
+        if self.model_name in BACKENDS:
+            return
+        self.report(f"Loading model {self.model_name}...")
+        self.settings.apply_torch_threads()
+        model_registry.get(self.model_name)
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self):
+        """Watch until stop() is called; running jobs are cancelled and retried on the next start"""
+        os.makedirs(self.input_dir, exist_ok=True)
+        self.warm_up()
+        self.report(f"Watching {os.path.abspath(self.input_dir)} for audio files...")
+        try:
+            while not self._stop.is_set():
+                self.poll()
+                self._stop.wait(self.poll_seconds)
+        finally:
+            self.queue.shutdown(cancel=True)
+            with self._lock:
+                active = list(self._active.values())
+            for job in active:
+                job.wait()
+
+    def poll(self):
+        """Start every settled file there is room for"""
+        now = time.monotonic()
+        for path in self._candidates():
+            with self._lock:
+                if path in self._active:
+                    continue
+                if len(self._active) > self.max_jobs:
+                    return
+            sidecar = self._sidecar(path)
+            signature = self._signature(path, sidecar)
+            if signature is None:
+                continue
+            seen = self._seen.get(path)
+            if seen is None or seen[0] != signature:
+                # New or still changing; wait until it has been quiet for a while
+                self._seen[path] = (signature, now)
+                continue
+            quiet_for = now - seen[1]
+            if quiet_for < self.settle_seconds:
+                continue
+            if sidecar is None and not self.detect_vocals:
+                if quiet_for >= self.sidecar_wait_seconds:
+                    self._seen.pop(path, None)
+                    self._quarantine(path, None, None, "No sections file (.json or .csv) next to it")
+                continue
+            self._seen.pop(path, None)
+            self._start(path, sidecar)
+
+        # Forget files that disappeared before they settled
+        for path in list(self._seen):
+            if not os.path.exists(path):
+                self._seen.pop(path, None)
+
+    def _candidates(self):
+        try:
+            names = sorted(os.listdir(self.input_dir))
+        except OSError:
+            return []
+        return [
+            os.path.join(self.input_dir, name) for name in names
+            if not name.startswith('.') and os.path.splitext(name)[1].lower() in AUDIO_EXTENSIONS
+            and os.path.isfile(os.path.join(self.input_dir, name))
+        ]
+
+    def _sidecar(self, path):
+        base = os.path.splitext(path)[0]
+        for extension in SIDECAR_EXTENSIONS:
+            if os.path.isfile(base + extension):
+                return base + extension
+        return None
+
+    def _signature(self, path, sidecar):
+        try:
+            stats = [os.stat(path)] + ([os.stat(sidecar)] if sidecar else [])
+        except OSError:
+            return None
+        return tuple((stat.st_size, stat.st_mtime_ns) for stat in stats)
+
+    def _key(self, path, sidecar):
+        key = stem_cache.file_digest(path)
+        if sidecar is not None:
+            key += '+' + stem_cache.file_digest(sidecar)
+        return key
+
+    def _start(self, path, sidecar):
+        name = os.path.basename(path)
+        try:
+            key = self._key(path, sidecar)
+        except OSError:
+            return
+        entry = self.state.get(key)
+        if entry.get('status') == 'done':
+            # Finished before a restart, but not moved out of the way yet
+            self.report(f"{name} was already processed into {entry.get('output_dir')}")
+            self._move_inputs(self.done_dir, path, sidecar)
+            return
+        attempts = entry.get('attempts', 0)
+        if attempts >= MAX_ATTEMPTS:
+            self._quarantine(path, sidecar, key, entry.get('error') or "Interrupted too many times")
+            return
+        self.state.update(key, status='running', file=name, attempts=attempts + 1)
+
+        song = None
+        try:
+            song = load_song(path)
+            if sidecar is not None:
+                sections = frame_sections(song, read_sidecar(sidecar))
+            else:
+                self.report(f"Detecting vocal sections in {name}...")
+                sections = detect_song_sections(song, path)
+            if not sections:
+                raise ValueError("No sections to process")
+        except Exception as e:
+            if song is not None:
+                song.close()
+            self._quarantine(path, sidecar, key, f"Could not read {name}: {e}")
+            return
+
+        job = Job(
+            song, sections, path, self.settings, output_root=self.output_root,
+            model_name=self.model_name,
+        )
+        job.watch = (key, sidecar)
+        with self._lock:
+            self._active[path] = job
+        self.report(f"Processing {name} ({len(sections)} sections)")
+        self.queue.submit(job)
+
+    def _on_job_update(self, job):
+        if not job.finished or not hasattr(job, 'watch'):
+            return
+        key, sidecar = job.watch
+        job.song.close()
+        path = job.song_path
+        if job.state == Job.DONE:
+            self.state.update(key, status='done', output_dir=job.output_dir)
+            self._move_inputs(self.done_dir, path, sidecar)
+            self.report(f"Finished {job.name}: {job.output_dir}")
+        elif job.state == Job.CANCELLED:
+            # Shutting down; the next start tries again without counting this attempt
+            entry = self.state.get(key)
+            self.state.update(key, status='interrupted', attempts=max(0, entry.get('attempts', 1) - 1))
+        else:
+            self._quarantine(path, sidecar, key, str(job.error))
+        with self._lock:
+            self._active.pop(path, None)
+
+    def _move_inputs(self, folder, path, sidecar):
+        for file_path in (path, sidecar):
+            if file_path is not None and os.path.exists(file_path):
+                try:
+                    move_into(folder, file_path)
+                except OSError as e:
+                    self.report(f"Could not move {file_path}: {e}")
+
+    def _quarantine(self, path, sidecar, key, error):
+        self.report(f"Quarantining {os.path.basename(path)}: {error}")
+        if key is not None:
+            self.state.update(key, status='failed', error=error)
+        os.makedirs(self.quarantine_dir, exist_ok=True)
+        self._move_inputs(self.quarantine_dir, path, sidecar)
+        note_path = os.path.join(self.quarantine_dir, os.path.basename(path) + '.error.txt')
+        try:
+            with open(note_path, 'w') as f:
+                f.write(f"{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n{error}\n")
+        except OSError:
+            pass
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Process audio files dropped into a folder, with sections from sidecar files."
+    )
+    parser.add_argument("input", help="Folder to watch for audio files and their sections files")
+    parser.add_argument(
+        "-o", "--output", default=paths.output_root,
+        help="Folder that receives the <name>_<timestamp> result folders"
+    )
+    parser.add_argument(
+        "--quarantine", help=f"Folder for files that failed (default: <input>/{QUARANTINE_DIR})"
+    )
+    parser.add_argument("--state", help=f"State file (default: <input>/{STATE_NAME})")
+    parser.add_argument(
+        "--model", default=DEFAULT_MODEL,
+        help=f"Demucs model, or a fast DSP backend: {', '.join(BACKENDS)} (default: {DEFAULT_MODEL})"
+    )
+    parser.add_argument(
+        "--jobs", type=int, help="Files processed at once (default: the concurrent jobs setting)"
+    )
+    parser.add_argument(
+        "--settle", type=float, default=DEFAULT_SETTLE_SECONDS,
+        help="Seconds a file must stay unchanged before it is picked up"
+    )
+    parser.add_argument(
+        "--poll", type=float, default=DEFAULT_POLL_SECONDS, help="Seconds between folder scans"
+    )
+    parser.add_argument(
+        "--sidecar-wait", type=float, default=DEFAULT_SIDECAR_WAIT_SECONDS,
+        help="Seconds an audio file waits for its sections file before it is quarantined"
+    )
+    parser.add_argument(
+        "--detect-vocals", action="store_true",
+        help="Detect the vocal sections of files that have no sections file"
+    )
+    add_performance_arguments(parser)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    settings = build_settings(args)
+    os.makedirs(args.output, exist_ok=True)
+
+    def report(message):
+        print(f"[{datetime.datetime.now().strftime('%H:%M:%S')}] {message}", flush=True)
+
+    watcher = FolderWatcher(
+        args.input, settings, output_root=args.output, model_name=args.model,
+        quarantine_dir=args.quarantine, state_path=args.state, settle_seconds=args.settle,
+        poll_seconds=args.poll, sidecar_wait_seconds=args.sidecar_wait,
+        detect_vocals=args.detect_vocals, max_jobs=args.jobs or settings.max_concurrent_jobs,
+        report=report,
+    )
+    # Stop cleanly on Ctrl+C and on service manager shutdowns
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: watcher.stop())
+    watcher.run()
+    report("Stopped")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,273 @@
+import os
+import uuid
+import threading
+
+import numpy as np
+
+import paths
+from separators import VOCAL_BAND_HZ
+from stem_cache import stem_cache
+
+WAVEFORM_CACHE_DIR = os.path.join(paths.cache_dir, 'waveforms')
+WAVEFORM_FORMAT = 1
+
+# Frames per min/max pair at the finest level; each level above halves the resolution
+PEAK_BLOCK_FRAMES = 256
+PEAK_LEVELS = 13
+# Frames per vocal activity value (about 90 ms at 44.1 kHz)
+ACTIVITY_BLOCK_FRAMES = 4096
+# Decoded audio is analyzed this many frames at a time; a multiple of both block sizes
+# and of 2 ** (PEAK_LEVELS - 1), so every level gets whole blocks from each chunk
+READ_CHUNK_FRAMES = 1024 * 1024
+# Blocks quieter than this never count as vocal
+ACTIVITY_GATE_DB = -45.0
+
+
+def read_samples(data, sample_width, channels):
+    """Float32 (frames, channels) array in [-1, 1) from raw 16 or 32-bit PCM"""
+    dtype = np.int32 if sample_width == 4 else np.int16
+    samples = np.frombuffer(data, dtype=dtype).reshape(-1, channels)
+    return samples.astype(np.float32) / float(np.iinfo(dtype).max + 1)
+
+
+def block_peaks(samples, block_frames=PEAK_BLOCK_FRAMES):
+    """Min and max over all channels of each block of frames, as int16"""
+    frames = samples.shape[0]
+    padded = -(-frames // block_frames) * block_frames
+    if padded != frames:
+        # Repeat the last frame, which leaves the last block's min and max unchanged
+        samples = np.concatenate([samples, np.repeat(samples[-1:], padded - frames, axis=0)])
+    blocks = samples.reshape(-1, block_frames * samples.shape[1])
+    return _to_int16(blocks.min(axis=1)), _to_int16(blocks.max(axis=1))
+
+
+def _to_int16(values):
+    return np.clip(np.round(values * 32767), -32768, 32767).astype(np.int16)
+
+
+def vocal_activity(samples, frame_rate, block_frames=ACTIVITY_BLOCK_FRAMES):
+    """How vocal-like each block of frames sounds, from 0 to 1
+
+    A cheap detector rather than a separation: the share of each block's
+    energy that lies in the vocal band and, for stereo, is identical in
+    both channels (where lead vocals are usually mixed). Computed for all
+    blocks at once with one FFT per block. Silent blocks score 0.
+    """
+    frames, channels = samples.shape
+    count = -(-frames // block_frames)
+    if count == 0:
+        return np.zeros(0, dtype=np.float32)
+    if count * block_frames != frames:
+        samples = np.concatenate([samples, np.zeros((count * block_frames - frames, channels), np.float32)])
+    blocks = samples.reshape(count, block_frames, channels)
+
+    window = np.hanning(block_frames).astype(np.float32)[None, :, None]
+    spectrum = np.fft.rfft(blocks * window, axis=1)
+    frequencies = np.fft.rfftfreq(block_frames, 1.0 / frame_rate)
+    band = (frequencies >= VOCAL_BAND_HZ[0]) & (frequencies <= VOCAL_BAND_HZ[1])
+
+    if channels >= 2:
+        left, right = spectrum[..., 0], spectrum[..., 1]
+        center = 2 * np.abs(left * np.conj(right))
+        total = np.abs(left) ** 2 + np.abs(right) ** 2
+    else:
+        center = total = np.abs(spectrum[..., 0]) ** 2
+    activity = center[:, band].sum(axis=1) / np.maximum(total.sum(axis=1), 1e-12)
+
+    rms = np.sqrt(np.mean(blocks ** 2, axis=(1, 2)))
+    activity[rms < 10 ** (ACTIVITY_GATE_DB / 20)] = 0.0
+    return activity.astype(np.float32)
+
+
+def _halve(mins, maxs):
+    """Next coarser level: pairs of blocks merged into one"""
+    if len(mins) % 2:
+        mins = np.append(mins, mins[-1])
+        maxs = np.append(maxs, maxs[-1])
+    return mins.reshape(-1, 2).min(axis=1), maxs.reshape(-1, 2).max(axis=1)
+
+
+def _reduce_columns(values, block_frames, start_frame, end_frame, width, ufunc):
+    """Reduce per-block values to `width` columns spanning a frame range
+
+    Returns the column values and how many columns (from the left) are
+    covered by analyzed audio.
+    """
+    result = np.zeros(width, dtype=np.float32)
+    edges = np.linspace(start_frame, end_frame, width + 1) / block_frames
+    starts = np.floor(edges[:-1]).astype(np.int64)
+    valid = int(np.searchsorted(starts, len(values)))
+    if valid == 0:
+        return result, 0
+    starts = starts[:valid]
+    stop = min(len(values), max(int(np.ceil(edges[valid])), int(starts[-1]) + 1))
+    result[:valid] = ufunc.reduceat(values[:stop], starts)
+    return result, valid
+
+
+class WaveformOverview:
+    """Min/max peak pyramid and vocal activity of a song, built as it decodes
+
+    A background thread analyzes the decoded PCM chunk by chunk, so the
+    overview fills in from the start while ffmpeg is still running. Level
+    k of the pyramid holds one min/max pair per PEAK_BLOCK_FRAMES * 2**k
+    frames; drawing picks the coarsest level that still has a block per
+    pixel, so the cost depends on the view's width and not on the song's
+    length. Finished overviews are saved under the file's content hash
+    and loaded instantly when the same audio is opened again.
+    """
+
+    def __init__(self, song, song_path, cache_dir=WAVEFORM_CACHE_DIR):
+        self.song = song
+        self.song_path = song_path
+        self.cache_dir = cache_dir
+
+        self.frames = 0
+        self.complete = False
+        # Bumped whenever new data arrives, so views know when to redraw
+        self.version = 0
+
+        self._levels = [([], []) for _ in range(PEAK_LEVELS)]
+        self._joined = {}
+        self._activity = []
+        self._lock = threading.Lock()
+        self._stopped = False
+        self._thread = None
+
+    @property
+    def total_frames(self):
+        """Exact once decoding has finished, estimated from the header before"""
+        if self.complete:
+            return self.frames
+        return max(self.frames, int(len(self.song) * self.song.frame_rate / 1000))
+
+    def start(self):
+        self._thread = threading.Thread(target=self.build, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped = True
+
+    def _cache_path(self, content_hash):
+        return os.path.join(self.cache_dir, f"{content_hash}.npz")
+
+    def build(self):
+        """Analyze the whole song (or load it from the cache); start() runs this in the background"""
+        try:
+            content_hash = stem_cache.file_digest(self.song_path)
+        except OSError:
+            content_hash = None
+        if content_hash is not None and self._load(self._cache_path(content_hash)):
+            return
+
+        try:
+            position = 0
+            while not self._stopped:
+                # Blocks until the decoder has reached the end of this chunk (or the file)
+                data = self.song.read_frames(position, position + READ_CHUNK_FRAMES)
+                if not data:
+                    break
+                samples = read_samples(data, self.song.sample_width, self.song.channels)
+                self._append(samples)
+                position += len(samples)
+                if len(samples) < READ_CHUNK_FRAMES:
+                    break
+        except Exception:
+            # Decoding failed or the song was closed; keep what was drawn so far
+            return
+
+        if self._stopped:
+            return
+        with self._lock:
+            self.complete = True
+            self.version += 1
+        if content_hash is not None:
+            self._save(self._cache_path(content_hash))
+
+    def _append(self, samples):
+        mins, maxs = block_peaks(samples)
+        activity = vocal_activity(samples, self.song.frame_rate)
+        with self._lock:
+            for level_mins, level_maxs in self._levels:
+                level_mins.append(mins)
+                level_maxs.append(maxs)
+                mins, maxs = _halve(mins, maxs)
+            self._activity.append(activity)
+            self._joined.clear()
+            self.frames += len(samples)
+            self.version += 1
+
+    def _joined_array(self, key, parts):
+        """Concatenated level, cached until the next chunk arrives (call with the lock held)"""
+        if key not in self._joined:
+            self._joined[key] = np.concatenate(parts) if parts else np.zeros(0, np.float32)
+        return self._joined[key]
+
+    def peaks(self, start_frame, end_frame, width):
+        """Min and max (in [-1, 1]) for `width` pixel columns, and how many columns are analyzed"""
+        frames_per_column = (end_frame - start_frame) / max(1, width)
+        level = int(np.clip(np.floor(np.log2(max(frames_per_column, 1) / PEAK_BLOCK_FRAMES)), 0, PEAK_LEVELS - 1))
+        with self._lock:
+            level_mins, level_maxs = self._levels[level]
+            mins = self._joined_array(('min', level), level_mins)
+            maxs = self._joined_array(('max', level), level_maxs)
+        block_frames = PEAK_BLOCK_FRAMES << level
+        column_mins, valid = _reduce_columns(mins, block_frames, start_frame, end_frame, width, np.minimum)
+        column_maxs, _ = _reduce_columns(maxs, block_frames, start_frame, end_frame, width, np.maximum)
+        return column_mins / 32768.0, column_maxs / 32768.0, valid
+
+    def activity(self, start_frame, end_frame, width):
+        """Highest vocal activity within each of `width` pixel columns"""
+        with self._lock:
+            activity = self._joined_array('activity', self._activity)
+        values, _ = _reduce_columns(activity, ACTIVITY_BLOCK_FRAMES, start_frame, end_frame, width, np.maximum)
+        return values
+
+    def activity_blocks(self):
+        """The full-resolution vocal activity analyzed so far, one value per ACTIVITY_BLOCK_FRAMES"""
+        with self._lock:
+            return self._joined_array('activity', self._activity)
+
+    def _load(self, path):
+        try:
+            with np.load(path) as cached:
+                if int(cached['format']) != WAVEFORM_FORMAT:
+                    return False
+                mins, maxs = cached['mins'], cached['maxs']
+                activity = cached['activity']
+                frames = int(cached['frames'])
+        except (OSError, ValueError, KeyError):
+            return False
+
+        # Coarser levels are cheap to rebuild, so only the finest one is stored
+        with self._lock:
+            for level_mins, level_maxs in self._levels:
+                level_mins.append(mins)
+                level_maxs.append(maxs)
+                mins, maxs = _halve(mins, maxs)
+            self._activity.append(activity)
+            self._joined.clear()
+            self.frames = frames
+            self.complete = True
+            self.version += 1
+        return True
+
+    def _save(self, path):
+        with self._lock:
+            mins = self._joined_array(('min', 0), self._levels[0][0])
+            maxs = self._joined_array(('max', 0), self._levels[0][1])
+            activity = self._joined_array('activity', self._activity)
+            frames = self.frames
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        temp_path = os.path.join(self.cache_dir, f".{uuid.uuid4().hex}.tmp")
+        try:
+            with open(temp_path, 'wb') as f:
+                np.savez(f, format=WAVEFORM_FORMAT, mins=mins, maxs=maxs, activity=activity, frames=frames)
+            # Atomic so a crash never leaves a truncated overview behind
+            os.replace(temp_path, path)
+        except OSError:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
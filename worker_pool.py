@@ -0,0 +1,468 @@
+import time
+import queue
+import threading
+import traceback
+import os
+import multiprocessing
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+
+import numpy as np
+import torch
+
+import tracing
+from model_registry import model_registry
+from separation import JobCancelled, separate_batch
+from settings import PerformanceSettings
+
+try:
+    import psutil
+except ImportError:  # Only needed to lower the background worker's priority on Windows
+    psutil = None
+
+# How often the GUI side checks on a worker, and how long a cancelled worker
+# gets to stop on its own before its process is killed
+POLL_SECONDS = 0.1
+CANCEL_GRACE_SECONDS = 1.0
+# How much the background worker's priority is lowered (POSIX nice increment),
+# and the share of the torch threads it gets
+BACKGROUND_NICE = 10
+BACKGROUND_THREAD_SHARE = 0.5
+
+
+class ModelInfo:
+    """The parts of a model the GUI process needs, without loading its weights"""
+
+    def __init__(self, name, samplerate, audio_channels, sources, max_allowed_segment=None):
+        self.name = name
+        self.samplerate = samplerate
+        self.audio_channels = audio_channels
+        self.sources = list(sources)
+        self.max_allowed_segment = max_allowed_segment
+
+    @classmethod
+    def from_model(cls, name, model):
+        return cls(
+            name, model.samplerate, model.audio_channels, model.sources,
+            getattr(model, 'max_allowed_segment', None),
+        )
+
+
+def _allocate(shapes):
+    size = sum(int(np.prod(shape)) for shape in shapes) * 4
+    # Zero-sized blocks aren't allowed
+    return shared_memory.SharedMemory(create=True, size=max(1, size))
+
+
+def _tensor_views(buf, shapes):
+    """float32 tensors laid out back to back in a shared memory buffer"""
+    views = []
+    offset = 0
+    for shape in shapes:
+        count = int(np.prod(shape))
+        array = np.ndarray(shape, dtype=np.float32, buffer=buf, offset=offset * 4)
+        views.append(torch.from_numpy(array))
+        offset += count
+    return views
+
+
+def _release(shm):
+    try:
+        shm.close()
+    except BufferError:
+        # A failed task's traceback still holds views; the mapping goes with the process
+        pass
+
+
+def _write_tensors(buf, shapes, tensors):
+    for view, tensor in zip(_tensor_views(buf, shapes), tensors):
+        view.copy_(tensor)
+
+
+def _read_tensors(buf, shapes):
+    # Copies, so the block can be released as soon as the results are read
+    return [view.clone() for view in _tensor_views(buf, shapes)]
+
+
+def _separate_task(conn, cancel_event, model_name, settings_data, overrides, batch_size,
+                   in_name, out_name, in_shapes, out_shapes):
+    """Separate the audio in one shared memory block into another; returns the worker's trace"""
+    tracer = tracing.Tracer(process=f"worker {os.getpid()}")
+    with tracer.activate():
+        _separate_shared(
+            conn, cancel_event, model_name, settings_data, overrides, batch_size,
+            in_name, out_name, in_shapes, out_shapes
+        )
+    return {'started': tracer.started, 'events': tracer.events}
+
+
+def _separate_shared(conn, cancel_event, model_name, settings_data, overrides, batch_size,
+                     in_name, out_name, in_shapes, out_shapes):
+    settings = PerformanceSettings.from_dict(settings_data)
+    settings.apply_torch_threads()
+    model_registry.set_max_resident(settings.max_resident_models)
+    with tracing.stage('load_model', model=model_name):
+        model = model_registry.get(model_name)
+
+    kwargs = settings.apply_model_kwargs(model)
+    kwargs.update(overrides)
+
+    # Progress arrives from apply_model's chunk threads, so sends are serialized
+    send_lock = threading.Lock()
+
+    def send(kind, payload):
+        with send_lock:
+            conn.send((kind, payload))
+
+    in_shm = shared_memory.SharedMemory(name=in_name)
+    out_shm = shared_memory.SharedMemory(name=out_name)
+    try:
+        wavs = _tensor_views(in_shm.buf, in_shapes)
+        results = separate_batch(
+            model, wavs, batch_size, lambda message: send('status', message), cancel_event,
+            lambda progress: send('progress', progress), **kwargs
+        )
+        _write_tensors(out_shm.buf, out_shapes, results)
+        # Views must be gone before the blocks can be closed
+        del wavs
+    finally:
+        _release(in_shm)
+        _release(out_shm)
+
+
+def _lower_priority():
+    """Run this process below normal priority, so it only gets CPU time nothing else wants"""
+    try:
+        if hasattr(os, 'nice'):
+            os.nice(BACKGROUND_NICE)
+        elif psutil is not None:
+            psutil.Process().nice(psutil.BELOW_NORMAL_PRIORITY_CLASS)
+    except OSError:
+        pass
+
+
+def _worker_main(conn, cancel_event, background=False):
+    """Entry point of a separation worker process"""
+    if background:
+        _lower_priority()
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+
+        kind, args = task[0], task[1:]
+        try:
+            if kind == 'info':
+                model = model_registry.get(args[0])
+                conn.send(('result', ModelInfo.from_model(args[0], model)))
+            elif kind == 'separate':
+                conn.send(('result', _separate_task(conn, cancel_event, *args)))
+            else:
+                raise ValueError(f"Unknown task: {kind}")
+        except JobCancelled:
+            conn.send(('cancelled', None))
+        except Exception as e:
+            conn.send(('error', (f"{type(e).__name__}: {e}", traceback.format_exc())))
+        finally:
+            model_registry.relieve_memory_pressure()
+
+
+class _Worker:
+    """One separation process and the pipe and cancel flag used to talk to it"""
+
+    def __init__(self, context, background=False):
+        self.background = background
+        self.conn, child_conn = context.Pipe()
+        self.cancel_event = context.Event()
+        self.process = context.Process(
+            target=_worker_main, args=(child_conn, self.cancel_event, background), daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+
+    @property
+    def alive(self):
+        return self.process.is_alive()
+
+    def stop(self, timeout=5):
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.kill()
+
+    def kill(self):
+        # Safe even mid-inference: nothing in this process is shared with the GUI
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class SeparationPool:
+    """Runs separation in worker processes, away from the GUI's interpreter
+
+    Each worker keeps its own resident model. Audio goes to and from the
+    workers through shared memory blocks, so only small messages are
+    pickled. Cancelling asks the worker to stop at its next checkpoint and
+    kills the process if it hasn't after a short grace period; a crashed or
+    killed worker is replaced on the next request.
+
+    Background work (the pre-separation) runs in one more worker of its
+    own at reduced OS priority and with fewer torch threads. It keeps a
+    model of its own, and it only starts a task while no foreground job
+    is running (see `foreground`).
+    """
+
+    def __init__(self, processes=1):
+        self._context = multiprocessing.get_context('spawn')
+        self._lock = threading.Lock()
+        self._idle = queue.Queue()
+        self._workers = []
+        self._size = 0
+        self._excess = 0
+        self._closed = False
+        self._infos = {}
+        self._background = None
+        self._background_lock = threading.Lock()
+        self._foreground = 0
+        self._foreground_idle = threading.Event()
+        self._foreground_idle.set()
+        self.resize(processes)
+
+    def resize(self, processes):
+        """Change the number of worker processes; busy workers are retired after their task"""
+        processes = max(1, int(processes))
+        with self._lock:
+            if processes > self._size:
+                grow = processes - self._size
+                absorbed = min(grow, self._excess)
+                self._excess -= absorbed
+                # Workers start lazily, on their first task
+                for _ in range(grow - absorbed):
+                    self._idle.put(None)
+            else:
+                self._excess += self._size - processes
+            self._size = processes
+        self._retire_idle()
+
+    def _retire_idle(self):
+        while True:
+            with self._lock:
+                if not self._excess:
+                    return
+                try:
+                    worker = self._idle.get_nowait()
+                except queue.Empty:
+                    return
+                self._excess -= 1
+            if worker is not None:
+                self._discard(worker)
+
+    def _discard(self, worker):
+        with self._lock:
+            if worker in self._workers:
+                self._workers.remove(worker)
+        worker.stop()
+
+    @contextmanager
+    def foreground(self):
+        """Hold background tasks back while the block runs (e.g. for the whole of a job)"""
+        with self._lock:
+            self._foreground += 1
+            self._foreground_idle.clear()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._foreground -= 1
+                if not self._foreground:
+                    self._foreground_idle.set()
+
+    def _checkout_background(self, cancel_event):
+        # Waits until no foreground job is running and the background worker is free
+        while True:
+            if cancel_event is not None and cancel_event.is_set():
+                raise JobCancelled()
+            if self._closed:
+                raise RuntimeError("Separation pool has been shut down")
+            if not self._foreground_idle.wait(POLL_SECONDS):
+                continue
+            if not self._background_lock.acquire(timeout=POLL_SECONDS):
+                continue
+            with self._lock:
+                if self._foreground or self._closed:
+                    self._background_lock.release()
+                    continue
+                if self._background is None or not self._background.alive:
+                    self._background = _Worker(self._context, background=True)
+                    self._workers.append(self._background)
+                return self._background
+
+    def _checkout(self, cancel_event):
+        while True:
+            if cancel_event is not None and cancel_event.is_set():
+                raise JobCancelled()
+            if self._closed:
+                raise RuntimeError("Separation pool has been shut down")
+            try:
+                worker = self._idle.get(timeout=POLL_SECONDS)
+            except queue.Empty:
+                continue
+            with self._lock:
+                if self._closed:
+                    self._idle.put(worker)
+                    raise RuntimeError("Separation pool has been shut down")
+                if worker is None or not worker.alive:
+                    worker = _Worker(self._context)
+                    self._workers.append(worker)
+            return worker
+
+    def _checkin(self, worker):
+        if worker.background:
+            with self._lock:
+                if not worker.alive and worker in self._workers:
+                    self._workers.remove(worker)
+            self._background_lock.release()
+            return
+        with self._lock:
+            if not worker.alive and worker in self._workers:
+                self._workers.remove(worker)
+            retire = self._closed or self._excess > 0
+            if retire and not self._closed:
+                self._excess -= 1
+            if not retire:
+                self._idle.put(worker if worker.alive else None)
+        if retire:
+            self._discard(worker)
+
+    def _call(self, task, status_callback=None, cancel_event=None, progress_callback=None,
+              background=False):
+        report = status_callback or (lambda message: None)
+        report_progress = progress_callback or (lambda progress: None)
+        if background:
+            worker = self._checkout_background(cancel_event)
+        else:
+            worker = self._checkout(cancel_event)
+        # Only a worker whose task ended with a final message can take the next one
+        finished = False
+        try:
+            worker.cancel_event.clear()
+            worker.conn.send(task)
+            deadline = None
+            while True:
+                if deadline is None and cancel_event is not None and cancel_event.is_set():
+                    worker.cancel_event.set()
+                    deadline = time.monotonic() + CANCEL_GRACE_SECONDS
+                if deadline is not None and time.monotonic() > deadline:
+                    worker.kill()
+                    raise JobCancelled()
+
+                try:
+                    if not worker.conn.poll(POLL_SECONDS):
+                        if not worker.alive:
+                            raise EOFError()
+                        continue
+                    kind, payload = worker.conn.recv()
+                except (EOFError, OSError):
+                    worker.kill()
+                    if cancel_event is not None and cancel_event.is_set():
+                        raise JobCancelled()
+                    raise RuntimeError(
+                        f"Separation worker stopped unexpectedly (exit code {worker.process.exitcode})"
+                    )
+
+                if kind == 'status':
+                    report(payload)
+                elif kind == 'progress':
+                    report_progress(payload)
+                elif kind == 'result':
+                    finished = True
+                    return payload
+                elif kind == 'cancelled':
+                    finished = True
+                    raise JobCancelled()
+                else:
+                    finished = True
+                    raise RuntimeError(payload[0])
+        finally:
+            if not finished:
+                # e.g. a callback raised while the task was still running; its leftover
+                # messages and unwritten results must never reach the next task
+                worker.kill()
+            self._checkin(worker)
+
+    def model_info(self, model_name, cancel_event=None):
+        """Metadata of a model, loading it in a worker on first use"""
+        info = self._infos.get(model_name)
+        if info is None:
+            info = self._call(('info', model_name), cancel_event=cancel_event)
+            self._infos[model_name] = info
+        return info
+
+    def cached_model_info(self, model_name):
+        """Metadata of a model some worker has already loaded, without waiting; else None"""
+        return self._infos.get(model_name)
+
+    def warm(self, model_name):
+        """Load a model in a worker in the background"""
+        def load():
+            try:
+                self.model_info(model_name)
+            except Exception:
+                # The first job reports the error
+                pass
+        threading.Thread(target=load, daemon=True).start()
+
+    def _worker_settings(self, settings, background=False):
+        """Settings for one worker, with the torch threads shared out between the workers"""
+        data = settings.to_dict()
+        if background:
+            data['threads'] = max(1, int(settings.resolved_threads() * BACKGROUND_THREAD_SHARE))
+        else:
+            data['threads'] = max(1, settings.resolved_threads() // max(1, self._size))
+        return data
+
+    def separate(self, model, wavs, settings, batch_size, status_callback=None,
+                 cancel_event=None, progress_callback=None, background=False, **overrides):
+        """Same as separate_batch, run in a worker process; `model` is a ModelInfo
+
+        With `background`, it runs in the low priority background worker
+        once no foreground job is running.
+        """
+        in_shapes = [tuple(wav.shape) for wav in wavs]
+        out_shapes = [(len(model.sources),) + shape for shape in in_shapes]
+        in_shm = _allocate(in_shapes)
+        out_shm = _allocate(out_shapes)
+        try:
+            _write_tensors(in_shm.buf, in_shapes, wavs)
+            with tracing.stage('separate', sections=len(wavs)):
+                trace = self._call(
+                    ('separate', model.name, self._worker_settings(settings, background), overrides,
+                     batch_size, in_shm.name, out_shm.name, in_shapes, out_shapes),
+                    status_callback, cancel_event, progress_callback, background,
+                )
+            # Show the worker's stages alongside this process's
+            tracer = tracing.current()
+            if tracer is not None:
+                tracer.merge(trace['events'], trace['started'])
+            with tracing.stage('read_results'):
+                return _read_tensors(out_shm.buf, out_shapes)
+        finally:
+            for shm in (in_shm, out_shm):
+                shm.close()
+                shm.unlink()
+
+    def shutdown(self):
+        """Stop every worker, killing those still busy"""
+        with self._lock:
+            self._closed = True
+            workers = list(self._workers)
+            self._workers.clear()
+        for worker in workers:
+            worker.kill()